@@ -2,6 +2,8 @@ from fastapi import Depends, HTTPException, status, Header
 from fastapi.security import OAuth2PasswordBearer
 from typing import Optional
 
+from app.core.profiling import is_admin_token
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
@@ -40,3 +42,14 @@ async def verify_api_key(api_key: Optional[str] = Header(None, alias="X-API-Key"
         )
     
     return api_key
+
+async def verify_admin_token(admin_token: Optional[str] = Header(None, alias="X-Admin-Token")):
+    """
+    Restrict operational endpoints to holders of ADMIN_TOKEN
+    """
+    if not is_admin_token(admin_token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="A valid X-Admin-Token is required"
+        )
+    return admin_token
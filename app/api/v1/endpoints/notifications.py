@@ -7,6 +7,7 @@ from uuid import UUID
 from datetime import datetime
 
 from app.db.database import get_db
+from app.db.replicas import get_read_db
 from app.db.models import NotificationStatus
 from app.schemas.notification import NotificationCreate, NotificationResponse
 from app.services.notification_service import create_notification, get_notification_by_id
@@ -41,7 +42,7 @@ async def send_notification(
 @router.get("/{notification_id}", response_model=dict)
 async def get_notification_status(
     notification_id: UUID = Path(..., description="The ID of the notification to get"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get a specific notification by ID
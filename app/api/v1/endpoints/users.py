@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Path
+from fastapi import APIRouter, Depends, HTTPException, Query, Path, Request, Response
 from sqlalchemy.orm import Session
 from typing import Optional
 from uuid import UUID
 
-from app.db.database import get_db
+from app.db.replicas import get_read_db
 from app.schemas.notification import UserNotificationsResponse, NotificationStatus, NotificationType
+from app.services.content_service import get_notifications_content
 from app.services.notification_service import get_user_notifications
+from app.services.version_service import etag_matches, user_notifications_etag
 
 router = APIRouter()
 
@@ -16,10 +18,14 @@ async def get_user_notifications_endpoint(
     type: Optional[str] = Query("all", description="Filter by notification type"),
     page: int = Query(1, ge=1, description="Page number"),
     limit: int = Query(20, ge=1, le=100, description="Items per page"),
-    db: Session = Depends(get_db)
+    request: Request = None,
+    response: Response = None,
+    db: Session = Depends(get_read_db)
 ):
     """
     Get all notifications for a specific user with pagination and filtering options
+
+    Answers If-None-Match with 304 while the user's notifications are unchanged.
     """
     # Validate status if provided
     if status != "all" and status not in [s.value for s in NotificationStatus]:
@@ -29,19 +35,28 @@ async def get_user_notifications_endpoint(
     if type != "all" and type not in [t.value for t in NotificationType]:
         raise HTTPException(status_code=400, detail="Invalid notification type filter")
     
+    # Unchanged since the client's copy: one Redis round trip, no database query
+    etag = user_notifications_etag(user_id, request)
+    if etag:
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+    
     notifications, total, pages = get_user_notifications(
         db, user_id, status, type, page, limit
     )
     
     # Convert SQLAlchemy models to Pydantic compatible format
     notification_list = []
-    for notification in notifications:
+    contents = get_notifications_content(db, notifications)
+    for notification, (subject, body) in zip(notifications, contents):
         notification_list.append({
             "notification_id": notification.id,
             "type": notification.type,
             "message": {
-                "subject": notification.subject,
-                "body": notification.body
+                "subject": subject,
+                "body": body
             },
             "status": notification.status,
             "created_at": notification.created_at,
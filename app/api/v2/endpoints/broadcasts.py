@@ -0,0 +1,112 @@
+from fastapi import APIRouter, Depends, HTTPException, Path
+from sqlalchemy.orm import Session
+from uuid import UUID
+
+from app.db.database import get_db
+from app.db.models import Broadcast
+from app.db.replicas import get_read_db
+from app.schemas.broadcast import BroadcastCreate, BroadcastResponse
+from app.services.broadcast_service import (
+    cancel_broadcast as cancel_broadcast_service,
+    change_broadcast_status,
+    create_broadcast,
+    get_broadcast,
+)
+
+router = APIRouter()
+
+def _broadcast_response(broadcast: Broadcast) -> dict:
+    return {
+        "broadcast_id": broadcast.id,
+        "status": broadcast.status,
+        "segment": broadcast.segment,
+        "channels": broadcast.channels,
+        "recipients_processed": broadcast.recipients_processed,
+        "notifications_created": broadcast.notifications_created,
+        "created_at": broadcast.created_at,
+        "updated_at": broadcast.updated_at,
+        "completed_at": broadcast.completed_at,
+        "version": "v2"
+    }
+
+@router.post("/", response_model=BroadcastResponse)
+async def create_broadcast_v2(
+    broadcast: BroadcastCreate,
+    db: Session = Depends(get_db)
+):
+    """
+    V2: Send a message to every user matching a segment
+    """
+    try:
+        return _broadcast_response(create_broadcast(db, broadcast))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to create broadcast: {str(e)}"
+        )
+
+@router.get("/{broadcast_id}", response_model=BroadcastResponse)
+async def get_broadcast_progress(
+    broadcast_id: UUID = Path(..., description="The ID of the broadcast"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    V2: Get the status and fan-out progress of a broadcast
+    """
+    broadcast = get_broadcast(db, broadcast_id)
+    if not broadcast:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    return _broadcast_response(broadcast)
+
+def _change_status(db: Session, broadcast_id: UUID, action: str) -> dict:
+    broadcast = get_broadcast(db, broadcast_id)
+    if not broadcast:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    try:
+        return _broadcast_response(change_broadcast_status(db, broadcast, action))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/{broadcast_id}/pause", response_model=BroadcastResponse)
+async def pause_broadcast(
+    broadcast_id: UUID = Path(..., description="The ID of the broadcast to pause"),
+    db: Session = Depends(get_db)
+):
+    """
+    V2: Pause the fan-out of a running broadcast
+    """
+    return _change_status(db, broadcast_id, "pause")
+
+@router.post("/{broadcast_id}/resume", response_model=BroadcastResponse)
+async def resume_broadcast(
+    broadcast_id: UUID = Path(..., description="The ID of the broadcast to resume"),
+    db: Session = Depends(get_db)
+):
+    """
+    V2: Resume a paused broadcast from where it stopped
+    """
+    return _change_status(db, broadcast_id, "resume")
+
+@router.post("/{broadcast_id}/cancel", response_model=BroadcastResponse)
+async def cancel_broadcast(
+    broadcast_id: UUID = Path(..., description="The ID of the broadcast to cancel"),
+    db: Session = Depends(get_db)
+):
+    """
+    V2: Stop a broadcast from reaching any further recipients
+
+    Deliveries already queued or scheduled are cancelled too; workers drop them unsent. A
+    completed broadcast can be cancelled as well, for the deliveries it still has queued.
+    """
+    broadcast = get_broadcast(db, broadcast_id)
+    if not broadcast:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    try:
+        cancel_broadcast_service(db, broadcast)
+    except Exception as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Its queued deliveries could not be cancelled: {str(e)}"
+        )
+    db.refresh(broadcast)
+    return _broadcast_response(broadcast)
@@ -0,0 +1,78 @@
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.api.dependencies import verify_admin_token
+from app.db.database import get_db
+from app.db.models import NotificationType
+from app.db.replicas import get_read_db
+from app.schemas.dead_letter import DeadLetterList, DeadLetterReplayRequest, DeadLetterReplayResponse
+from app.schemas.notification import NotificationType as ChannelParam
+from app.services.dead_letter_service import count_pending_dead_letters, list_dead_letters
+from app.services.tasks.dead_letter_tasks import replay_dead_letters
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(dependencies=[Depends(verify_admin_token)])
+
+def _channel(channel: Optional[ChannelParam]) -> Optional[NotificationType]:
+    return NotificationType(channel.value) if channel is not None else None
+
+@router.get("/", response_model=DeadLetterList)
+def get_dead_letters(
+    channel: Optional[ChannelParam] = Query(None, description="Filter by channel"),
+    error_class: Optional[str] = Query(None, description="Filter by exception class, e.g. HttpError"),
+    from_date: Optional[datetime] = Query(None, description="Failed at or after"),
+    to_date: Optional[datetime] = Query(None, description="Failed before"),
+    include_replayed: bool = Query(False, description="Also list entries already replayed"),
+    limit: int = Query(50, ge=1, le=500, description="Entries per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    V2: Deliveries that used up their retries, most recent failure first (admin only)
+    """
+    try:
+        entries, next_cursor = list_dead_letters(
+            db, _channel(channel), error_class, from_date, to_date, include_replayed, limit, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"dead_letters": entries, "next_cursor": next_cursor, "version": "v2"}
+
+@router.post("/replay", response_model=DeadLetterReplayResponse)
+def replay_dead_letters_v2(
+    request: DeadLetterReplayRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    V2: Queue every pending dead letter matching the filters for delivery again (admin only)
+
+    Returns at once; a background task publishes the notifications in rate-limited batches.
+    Entries that fail after this call are not part of the replay.
+    """
+    until = datetime.now(timezone.utc)
+    filters = {
+        "channel": _channel(request.channel),
+        "error_class": request.error_class,
+        "from_date": request.from_date,
+        "to_date": request.to_date,
+    }
+    matched = count_pending_dead_letters(db, until, **filters)
+    replay_task_id = None
+    if matched:
+        try:
+            replay_task_id = replay_dead_letters.delay({
+                "channel": request.channel.value if request.channel else None,
+                "error_class": request.error_class,
+                "from_date": request.from_date.isoformat() if request.from_date else None,
+                "to_date": request.to_date.isoformat() if request.to_date else None,
+            }, until.isoformat()).id
+        except Exception as e:
+            logger.error(f"Failed to start dead letter replay: {str(e)}")
+            raise HTTPException(status_code=503, detail="Replay could not be started")
+        logger.info(f"Started replay of {matched} dead letters ({replay_task_id})")
+    return {"matched": matched, "replay_task_id": replay_task_id, "until": until, "version": "v2"}
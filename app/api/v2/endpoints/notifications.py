@@ -1,13 +1,31 @@
 from fastapi import APIRouter, Depends, HTTPException, Path, Query, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import Optional, List, Dict
+from typing import Iterable, Iterator, Optional, List, Dict, Set
 from uuid import UUID
 from datetime import datetime
+import json
 
+from app.core.config import settings
 from app.db.database import get_db
+from app.db.replicas import get_read_db
 from app.db.models import NotificationStatus, NotificationPriority
-from app.schemas.notification import NotificationCreate, NotificationResponse
-from app.services.notification_service import create_notification, get_notification_by_id
+from app.schemas.notification import (
+    NotificationCancelBatchRequest,
+    NotificationCancelBatchResponse,
+    NotificationCreate,
+    NotificationResponse,
+    NotificationStatusBatchRequest,
+)
+from app.services.broadcast_service import cancel_broadcast, get_broadcast
+from app.services.content_service import get_notification_content
+from app.services.notification_service import (
+    cancel_notifications,
+    create_notification,
+    get_notification_by_id,
+    get_notification_statuses,
+    iter_broadcast_statuses,
+)
 
 router = APIRouter()
 
@@ -35,17 +53,122 @@ async def send_notification_v2(
             "priority": priority,
             "version": "v2"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to send notification: {str(e)}"
         )
 
+# Status rows serialized per chunk of the streamed batch response
+STATUS_CHUNK_SIZE = 500
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+def _stream_statuses(rows: Iterable, requested: Optional[Set[UUID]] = None) -> Iterator[str]:
+    """
+    Serialize status rows as one JSON document, written in chunks as rows arrive
+    """
+    yield '{"notifications":['
+    separator = ""
+    chunk = []
+    for notification_id, type_, status, created_at, delivered_at, read_at, cancelled_at in rows:
+        if requested is not None:
+            requested.discard(notification_id)
+        chunk.append(json.dumps({
+            "notification_id": str(notification_id),
+            "type": type_.value,
+            "status": status.value,
+            "created_at": _iso(created_at),
+            "delivered_at": _iso(delivered_at),
+            "read_at": _iso(read_at),
+            "cancelled_at": _iso(cancelled_at),
+        }))
+        if len(chunk) >= STATUS_CHUNK_SIZE:
+            yield separator + ",".join(chunk)
+            separator, chunk = ",", []
+    if chunk:
+        yield separator + ",".join(chunk)
+    # IDs that matched no notification
+    missing = sorted(str(notification_id) for notification_id in requested or ())
+    yield f'],"missing":{json.dumps(missing)},"version":"v2"}}'
+
+@router.post("/status")
+async def get_notification_statuses_v2(
+    request: NotificationStatusBatchRequest,
+    db: Session = Depends(get_read_db)
+):
+    """
+    V2: Get the status of many notifications in one request
+
+    Pass up to STATUS_BATCH_MAX_IDS notification IDs, or a broadcast ID for every notification
+    of that broadcast. The response is streamed, so large broadcasts are never held in memory;
+    IDs that match nothing are listed under "missing".
+    """
+    if request.broadcast_id is not None:
+        rows = iter_broadcast_statuses(db, request.broadcast_id)
+        return StreamingResponse(_stream_statuses(rows), media_type="application/json")
+    
+    if len(request.notification_ids) > settings.STATUS_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.STATUS_BATCH_MAX_IDS} notification IDs per request"
+        )
+    rows = get_notification_statuses(db, request.notification_ids)
+    return StreamingResponse(
+        _stream_statuses(rows, set(request.notification_ids)),
+        media_type="application/json"
+    )
+
+@router.post("/cancel", response_model=NotificationCancelBatchResponse)
+async def cancel_notifications_v2(
+    request: NotificationCancelBatchRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    V2: Cancel many pending notifications, or every pending notification of a broadcast
+
+    Cancelled notifications are revoked in Redis, so workers drop their queued and scheduled
+    tasks unsent. Cancelling a broadcast also stops its fan-out. Notifications already
+    delivered or failed are left as they are and not counted.
+    """
+    try:
+        if request.broadcast_id is not None:
+            broadcast = get_broadcast(db, request.broadcast_id)
+            if not broadcast:
+                raise HTTPException(status_code=404, detail="Broadcast not found")
+            return {
+                "cancelled": cancel_broadcast(db, broadcast),
+                "broadcast_id": broadcast.id,
+                "version": "v2"
+            }
+        
+        if len(request.notification_ids) > settings.CANCEL_BATCH_MAX_IDS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"At most {settings.CANCEL_BATCH_MAX_IDS} notification IDs per request"
+            )
+        cancelled = cancel_notifications(db, request.notification_ids)
+        return {
+            "cancelled": len(cancelled),
+            "notification_ids": cancelled,
+            "version": "v2"
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Failed to cancel notifications: {str(e)}"
+        )
+
 @router.get("/{notification_id}", response_model=Dict)
 async def get_notification_status_v2(
     notification_id: UUID = Path(..., description="The ID of the notification to get"),
     include_body: bool = Query(False, description="Include notification body in response"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     V2: Get a specific notification by ID with option to include body
@@ -54,13 +177,15 @@ async def get_notification_status_v2(
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
     
+    subject, body = get_notification_content(db, notification)
     response = {
         "notification_id": notification.id,
         "status": notification.status,
         "type": notification.type,
-        "subject": notification.subject,
+        "subject": subject,
         "created_at": notification.created_at,
         "delivered_at": notification.delivered_at,
+        "cancelled_at": notification.cancelled_at,
         "task_id": notification.task_id,
         "priority": notification.priority,
         "version": "v2"
@@ -68,7 +193,7 @@ async def get_notification_status_v2(
     
     # Include body if requested
     if include_body:
-        response["body"] = notification.body
+        response["body"] = body
         
     return response
 
@@ -90,10 +215,14 @@ async def cancel_notification(
             detail=f"Cannot cancel notification with status '{notification.status}'"
         )
     
-    # Here you would implement the cancellation logic using the Celery task ID
-    # For simplicity, we'll just mark it as failed
-    notification.status = NotificationStatus.FAILED
-    db.commit()
+    # Revoked so the queued or scheduled task is dropped unsent; the row is marked failed
+    try:
+        cancelled = cancel_notifications(db, [notification.id])
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Failed to cancel notification: {str(e)}")
+    if not cancelled:
+        # Delivered or failed since it was read
+        raise HTTPException(status_code=409, detail="Notification is no longer pending")
     
     return {
         "notification_id": notification.id,
@@ -109,7 +238,7 @@ async def get_notifications_v2(
     to_date: Optional[datetime] = Query(None, description="Filter to date"),
     page: int = Query(1, ge=1, description="Page number"),
     limit: int = Query(20, ge=1, le=100, description="Items per page"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     V2: Get all notifications with advanced filtering options
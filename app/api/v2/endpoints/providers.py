@@ -0,0 +1,51 @@
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Path
+
+from app.api.dependencies import verify_admin_token
+from app.schemas.provider import CircuitState, CircuitStates
+from app.services.circuit_breaker import CIRCUIT_PROVIDERS, circuit_breaker
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(dependencies=[Depends(verify_admin_token)])
+
+def _check_provider(provider: str) -> None:
+    if provider not in CIRCUIT_PROVIDERS:
+        raise HTTPException(status_code=404, detail=f"Unknown provider, expected one of {', '.join(CIRCUIT_PROVIDERS)}")
+
+@router.get("/circuits", response_model=CircuitStates)
+def get_circuit_states():
+    """
+    V2: Circuit breaker state of every delivery provider (admin only)
+    """
+    try:
+        return {"circuits": circuit_breaker.states(), "version": "v2"}
+    except Exception as e:
+        logger.error(f"Failed to read circuit states: {str(e)}")
+        raise HTTPException(status_code=503, detail="Circuit state is temporarily unavailable")
+
+@router.get("/circuits/{provider}", response_model=CircuitState)
+def get_circuit_state(provider: str = Path(..., description="gmail, twilio or redis_pubsub")):
+    """
+    V2: Circuit breaker state of one provider (admin only)
+    """
+    _check_provider(provider)
+    try:
+        return circuit_breaker.state(provider)
+    except Exception as e:
+        logger.error(f"Failed to read the {provider} circuit state: {str(e)}")
+        raise HTTPException(status_code=503, detail="Circuit state is temporarily unavailable")
+
+@router.post("/circuits/{provider}/reset", response_model=CircuitState)
+def reset_circuit(provider: str = Path(..., description="gmail, twilio or redis_pubsub")):
+    """
+    V2: Force a provider's circuit closed, e.g. after a confirmed recovery (admin only)
+    """
+    _check_provider(provider)
+    try:
+        circuit_breaker.reset(provider)
+        return circuit_breaker.state(provider)
+    except Exception as e:
+        logger.error(f"Failed to reset the {provider} circuit: {str(e)}")
+        raise HTTPException(status_code=503, detail="Circuit state is temporarily unavailable")
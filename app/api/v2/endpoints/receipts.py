@@ -0,0 +1,46 @@
+import logging
+
+from fastapi import APIRouter, HTTPException, Path
+from fastapi.responses import Response
+
+from app.schemas.receipt import ReadReceiptBatch, ReceiptSource, ReceiptsAccepted
+from app.services.receipt_service import TRACKING_PIXEL, parse_open_tracking_token, record_receipts
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+@router.post("/", response_model=ReceiptsAccepted, status_code=202)
+def ingest_read_receipts(batch: ReadReceiptBatch):
+    """
+    V2: Accept read receipts, applied to notifications in batches within seconds
+
+    Receipts of notifications that are not delivered (or of another user) are ignored.
+    """
+    try:
+        accepted = record_receipts(
+            (receipt.notification_id, receipt.user_id, receipt.read_at, receipt.source.value)
+            for receipt in batch.receipts
+        )
+    except Exception as e:
+        logger.error(f"Failed to buffer read receipts: {str(e)}")
+        raise HTTPException(status_code=503, detail="Read receipts are temporarily unavailable")
+    return {"accepted": accepted, "version": "v2"}
+
+@router.get("/open/{token}.gif", include_in_schema=False)
+def email_open_pixel(token: str = Path(...)):
+    """
+    Open-tracking pixel embedded in emails, records a receipt for valid tokens
+    """
+    ids = parse_open_tracking_token(token)
+    if ids is not None:
+        try:
+            record_receipts([(ids[0], ids[1], None, ReceiptSource.EMAIL_OPEN.value)])
+        except Exception as e:
+            # The image is served regardless, a lost open is not worth a broken email
+            logger.warning(f"Failed to record email open: {str(e)}")
+    return Response(
+        content=TRACKING_PIXEL,
+        media_type="image/gif",
+        headers={"Cache-Control": "no-store, max-age=0"}
+    )
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.replicas import get_read_db
+from app.schemas.stats import LatencyReport
+from app.services.lifecycle_service import get_latency_report
+
+router = APIRouter()
+
+@router.get("/latency", response_model=LatencyReport)
+async def get_delivery_latency(
+    window: int = Query(3600, description="Rolling window in seconds, one of LATENCY_REPORT_WINDOWS"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    V2: Delivery latency percentiles per stage, channel and priority
+
+    Stages: dispatch (created to published), queue_wait, claim, provider, commit and total,
+    over notifications delivered within the window. Reports are refreshed by a beat job.
+    """
+    if window not in settings.LATENCY_REPORT_WINDOWS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"window must be one of {settings.LATENCY_REPORT_WINDOWS}"
+        )
+    return {**get_latency_report(db, window), "version": "v2"}
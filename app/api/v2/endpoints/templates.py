@@ -0,0 +1,75 @@
+from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.api.dependencies import verify_admin_token
+from app.db.database import get_db
+from app.db.models import MessageTemplate
+from app.db.replicas import get_read_db
+from app.schemas.notification import NotificationType
+from app.schemas.template import TemplateCreate, TemplatePreviewRequest, TemplatePreviewResponse, TemplateResponse
+from app.services.template_service import TemplateError, get_template, register_template, render_template
+
+router = APIRouter()
+
+def _template_response(template: MessageTemplate) -> dict:
+    return {
+        "template_id": template.id,
+        "version": template.version,
+        "subject": template.subject,
+        "body": template.body,
+        "html": template.html,
+        "variables": template.variables or [],
+        "created_at": template.created_at
+    }
+
+@router.put("/{template_id}", response_model=TemplateResponse, dependencies=[Depends(verify_admin_token)])
+async def register_template_v2(
+    template: TemplateCreate,
+    template_id: str = Path(..., description="Template ID, lowercase letters, digits, '_', '.' and '-'"),
+    db: Session = Depends(get_db)
+):
+    """
+    V2: Register a template, or a new version of an existing one
+
+    Notifications pin the latest version when they are created, so queued notifications
+    keep rendering the version they were sent with.
+    """
+    try:
+        return _template_response(register_template(db, template_id, template.subject, template.body, template.html))
+    except TemplateError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{template_id}", response_model=TemplateResponse)
+async def get_template_v2(
+    template_id: str = Path(..., description="The ID of the template"),
+    version: Optional[int] = Query(None, ge=1, description="Template version, latest by default"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    V2: Get a version of a template
+    """
+    template = get_template(db, template_id, version)
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+    return _template_response(template)
+
+@router.post("/{template_id}/preview", response_model=TemplatePreviewResponse)
+async def preview_template(
+    preview: TemplatePreviewRequest,
+    template_id: str = Path(..., description="The ID of the template"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    V2: Render a template with sample variables, as a worker would
+    """
+    template = get_template(db, template_id, preview.version)
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+    try:
+        subject, body = render_template(
+            db, template.id, template.version, preview.template_vars, html=preview.type == NotificationType.EMAIL
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to render template: {str(e)}")
+    return {"template_id": template.id, "version": template.version, "subject": subject, "body": body}
@@ -1,13 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Path
+from fastapi import APIRouter, Depends, HTTPException, Query, Path, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import Optional, Dict, List
 from uuid import UUID
 from datetime import datetime
 
+from app.core.config import settings
 from app.db.database import get_db
-from app.schemas.notification import UserNotificationsResponse, NotificationStatus, NotificationType
+from app.db.replicas import get_read_db, mark_recent_write
+from app.schemas.notification import (
+    BulkReadRequest,
+    BulkReadResponse,
+    NotificationStatus,
+    NotificationSearchResponse,
+    NotificationType,
+    ReadAllRequest,
+    UserNotificationsResponse,
+)
 from app.schemas.user import NotificationPreferences
-from app.services.notification_service import get_user_notifications
+from app.services.archive_service import ARCHIVE_FIELDS, iter_archived_notifications
+from app.services.content_service import get_notifications_content
+from app.services.export_service import (
+    EXPORT_FORMATS,
+    export_filename,
+    export_media_type,
+    iter_export_rows,
+    stream_export,
+)
+from app.services.notification_service import (
+    get_user_notifications,
+    mark_all_notifications_as_read,
+    mark_notifications_as_read,
+)
+from app.services.search_service import SEARCH_SORTS, search_user_notifications
+from app.services.version_service import bump_preference_version, etag_matches, user_notifications_etag
 
 router = APIRouter()
 
@@ -20,10 +46,14 @@ async def get_user_notifications_v2(
     to_date: Optional[datetime] = Query(None, description="Filter to date"),
     page: int = Query(1, ge=1, description="Page number"),
     limit: int = Query(20, ge=1, le=100, description="Items per page"),
-    db: Session = Depends(get_db)
+    request: Request = None,
+    response: Response = None,
+    db: Session = Depends(get_read_db)
 ):
     """
     V2: Get all notifications for a specific user with enhanced filtering
+
+    Answers If-None-Match with 304 while the user's notifications are unchanged.
     """
     # Validate status if provided
     if status != "all" and status not in [s.value for s in NotificationStatus]:
@@ -33,15 +63,37 @@ async def get_user_notifications_v2(
     if type != "all" and type not in [t.value for t in NotificationType]:
         raise HTTPException(status_code=400, detail="Invalid notification type filter")
     
-    # In V2, we would implement enhanced filtering including date range
-    # For now, we'll reuse the existing function but add version info
+    # Unchanged since the client's copy: one Redis round trip, no database query
+    etag = user_notifications_etag(user_id, request)
+    if etag:
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+    
     notifications, total, pages = get_user_notifications(
-        db, user_id, status, type, page, limit
+        db, user_id, status, type, page, limit, from_date, to_date
     )
     
+    notification_list = []
+    contents = get_notifications_content(db, notifications)
+    for notification, (subject, body) in zip(notifications, contents):
+        notification_list.append({
+            "notification_id": notification.id,
+            "type": notification.type,
+            "message": {
+                "subject": subject,
+                "body": body
+            },
+            "status": notification.status,
+            "created_at": notification.created_at,
+            "delivered_at": notification.delivered_at,
+            "task_id": notification.task_id
+        })
+    
     response = {
         "user_id": user_id,
-        "notifications": notifications,
+        "notifications": notification_list,
         "pagination": {
             "total": total,
             "page": page,
@@ -59,10 +111,147 @@ async def get_user_notifications_v2(
     
     return response
 
+@router.get("/{user_id}/notifications/search", response_model=NotificationSearchResponse)
+async def search_user_notifications_v2(
+    user_id: UUID = Path(..., description="The ID of the user to search notifications of"),
+    q: str = Query(..., min_length=1, max_length=256, description="Search terms, web search syntax"),
+    sort: str = Query("relevance", description="relevance or recent"),
+    type: Optional[str] = Query(None, description="Filter by notification type"),
+    limit: int = Query(20, ge=1, le=settings.SEARCH_MAX_RESULTS, description="Results per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    V2: Full-text search of a user's notifications, ranked and cursor-paginated
+    """
+    if sort not in SEARCH_SORTS:
+        raise HTTPException(status_code=400, detail=f"Invalid sort, expected one of {', '.join(SEARCH_SORTS)}")
+    if type is not None and type not in [t.value for t in NotificationType]:
+        raise HTTPException(status_code=400, detail="Invalid notification type filter")
+    
+    try:
+        results, next_cursor = search_user_notifications(db, user_id, q, sort, type, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    contents = get_notifications_content(db, [notification for notification, _ in results])
+    return {
+        "user_id": user_id,
+        "query": q,
+        "sort": sort,
+        "notifications": [
+            {
+                "notification_id": notification.id,
+                "type": notification.type,
+                "message": {
+                    "subject": subject,
+                    "body": body
+                },
+                "status": notification.status,
+                "created_at": notification.created_at,
+                "delivered_at": notification.delivered_at,
+                "task_id": notification.task_id,
+                "rank": rank
+            }
+            for (notification, rank), (subject, body) in zip(results, contents)
+        ],
+        "next_cursor": next_cursor,
+        "version": "v2"
+    }
+
+@router.get("/{user_id}/notifications/export")
+async def export_user_notifications(
+    user_id: UUID = Path(..., description="The ID of the user to export notifications for"),
+    format: str = Query("ndjson", description="ndjson or csv"),
+    type: Optional[str] = Query(None, description="Filter by notification type"),
+    from_date: Optional[datetime] = Query(None, description="Filter from date"),
+    to_date: Optional[datetime] = Query(None, description="Filter to date"),
+    gzip: bool = Query(False, description="Compress the export with gzip"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    V2: Stream a user's full notification history, oldest first
+
+    Rows are read through a server-side cursor and written as they arrive, so memory use is
+    constant whatever the size of the history.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format, expected one of {', '.join(EXPORT_FORMATS)}")
+    if type is not None and type not in [t.value for t in NotificationType]:
+        raise HTTPException(status_code=400, detail="Invalid notification type filter")
+    
+    rows = iter_export_rows(db, user_id, type, from_date, to_date)
+    return StreamingResponse(
+        stream_export(rows, format, compress=gzip),
+        media_type=export_media_type(format, gzip),
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(user_id, format, gzip)}"'}
+    )
+
+@router.get("/{user_id}/notifications/archived")
+async def export_archived_user_notifications(
+    user_id: UUID = Path(..., description="The ID of the user to read archived notifications for"),
+    format: str = Query("ndjson", description="ndjson or csv"),
+    type: Optional[str] = Query(None, description="Filter by notification type"),
+    from_date: Optional[datetime] = Query(None, description="Filter from date"),
+    to_date: Optional[datetime] = Query(None, description="Filter to date"),
+    gzip: bool = Query(False, description="Compress the export with gzip"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    V2: Stream a user's notifications moved to the cold-storage archive, oldest first
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format, expected one of {', '.join(EXPORT_FORMATS)}")
+    if type is not None and type not in [t.value for t in NotificationType]:
+        raise HTTPException(status_code=400, detail="Invalid notification type filter")
+    
+    rows = iter_archived_notifications(db, user_id, type, from_date, to_date)
+    return StreamingResponse(
+        stream_export(rows, format, compress=gzip, fields=ARCHIVE_FIELDS),
+        media_type=export_media_type(format, gzip),
+        headers={"Content-Disposition": f'attachment; filename="archived-{export_filename(user_id, format, gzip)}"'}
+    )
+
+@router.post("/{user_id}/notifications/read", response_model=BulkReadResponse)
+async def mark_notifications_read(
+    request: BulkReadRequest,
+    user_id: UUID = Path(..., description="The ID of the user"),
+    db: Session = Depends(get_db)
+):
+    """
+    V2: Mark up to 1000 delivered notifications of a user as read
+
+    Returns the IDs that changed; notifications already read, not delivered yet or of
+    another user are skipped.
+    """
+    updated = mark_notifications_as_read(db, user_id, request.notification_ids)
+    return {
+        "user_id": user_id,
+        "updated": len(updated),
+        "notification_ids": updated,
+        "version": "v2"
+    }
+
+@router.post("/{user_id}/notifications/read-all", response_model=BulkReadResponse)
+async def mark_all_notifications_read(
+    request: ReadAllRequest,
+    user_id: UUID = Path(..., description="The ID of the user"),
+    db: Session = Depends(get_db)
+):
+    """
+    V2: Mark every delivered notification of a user created before a timestamp as read
+    """
+    updated = mark_all_notifications_as_read(db, user_id, request.before or datetime.utcnow())
+    return {
+        "user_id": user_id,
+        "updated": updated,
+        "version": "v2"
+    }
+
 @router.get("/{user_id}/preferences", response_model=NotificationPreferences)
 async def get_user_preferences(
     user_id: UUID = Path(..., description="The ID of the user"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     V2: Get user notification preferences
@@ -100,6 +289,9 @@ async def update_user_preferences(
     user.in_app_enabled = preferences.in_app_enabled
     
     db.commit()
+    # Running broadcasts refresh their preference index before their next chunk
+    bump_preference_version()
+    mark_recent_write(user.id)
     
     return {
         "email_enabled": user.email_enabled,
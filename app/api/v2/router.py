@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v2.endpoints import notifications, users
+from app.api.v2.endpoints import broadcasts, dead_letters, notifications, providers, receipts, stats, templates, users
 
 # Initialize v2 API router
 api_router = APIRouter()
@@ -7,3 +7,9 @@ api_router = APIRouter()
 # Include endpoint routers
 api_router.include_router(notifications.router, prefix="/notifications", tags=["notifications-v2"])
 api_router.include_router(users.router, prefix="/users", tags=["users-v2"])
+api_router.include_router(broadcasts.router, prefix="/broadcasts", tags=["broadcasts-v2"])
+api_router.include_router(stats.router, prefix="/stats", tags=["stats-v2"])
+api_router.include_router(receipts.router, prefix="/receipts", tags=["receipts-v2"])
+api_router.include_router(templates.router, prefix="/templates", tags=["templates-v2"])
+api_router.include_router(providers.router, prefix="/providers", tags=["providers-v2"])
+api_router.include_router(dead_letters.router, prefix="/dead-letters", tags=["dead-letters-v2"])
@@ -1,5 +1,16 @@
+import logging
+from typing import Dict, List
+
 from celery import Celery
+from celery.signals import setup_logging
 from app.core.config import settings
+from app.core.logs import configure_logging
+from app.core.metrics import setup_task_metrics
+from app.core.serialization import MSGPACK_ZLIB, register_msgpack_zlib
+from app.db.database import SessionLocal
+from app.services.version_service import setup_version_tracking
+
+logger = logging.getLogger(__name__)
 
 # Initialize Celery app
 celery_app = Celery(
@@ -8,14 +19,19 @@ celery_app = Celery(
     backend=settings.CELERY_RESULT_BACKEND,
     include=[
         "app.services.tasks.notification_tasks",
-        "app.services.tasks.scheduled_tasks"
+        "app.services.tasks.scheduled_tasks",
+        "app.services.tasks.broadcast_tasks",
+        "app.services.tasks.dead_letter_tasks"
     ]
 )
 
+# Compact binary task payloads, accepted by every worker whatever the publishers use
+register_msgpack_zlib(settings.TASK_COMPRESSION_THRESHOLD, settings.TASK_COMPRESSION_LEVEL)
+
 # Configure Celery
 celery_app.conf.update(
-    task_serializer="json",
-    accept_content=["json"],
+    task_serializer=settings.TASK_SERIALIZER,
+    accept_content=["json", MSGPACK_ZLIB],
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
@@ -29,13 +45,29 @@ celery_app.conf.update(
 # Configure Celery Beat for scheduled tasks
 celery_app.conf.beat_schedule = {
     'scheduled-digests': {
-        'task': 'app.services.tasks.scheduled_tasks.send_daily_digest',
+        'task': 'send_daily_digest',
         'schedule': 3600.0 * 24,  # Run once per day
     },
     'cleanup-old-notifications': {
-        'task': 'app.services.tasks.scheduled_tasks.cleanup_old_notifications',
+        'task': 'cleanup_old_notifications',
         'schedule': 3600.0 * 24 * 7,  # Run once per week
     },
+    'maintain-notification-partitions': {
+        'task': 'maintain_notification_partitions',
+        'schedule': 3600.0 * 24,  # Run once per day
+    },
+    'report-delivery-latency': {
+        'task': 'report_delivery_latency',
+        'schedule': float(settings.LATENCY_REPORT_INTERVAL),
+    },
+    'flush-read-receipts': {
+        'task': 'flush_read_receipts',
+        'schedule': float(settings.READ_RECEIPT_FLUSH_INTERVAL),
+    },
+    'reap-notifications': {
+        'task': 'reap_notifications',
+        'schedule': float(settings.REAPER_INTERVAL),
+    },
 }
 
 # Set default queues
@@ -43,11 +75,58 @@ celery_app.conf.task_default_queue = 'default'
 celery_app.conf.task_queues = {
     'high': {'exchange': 'high', 'routing_key': 'high'},
     'default': {'exchange': 'default', 'routing_key': 'default'},
-    'low': {'exchange': 'low', 'routing_key': 'low'}
+    'low': {'exchange': 'low', 'routing_key': 'low'},
+    settings.BROADCAST_QUEUE: {'exchange': settings.BROADCAST_QUEUE, 'routing_key': settings.BROADCAST_QUEUE}
 }
+# Routes match the registered task names (tasks are registered with short explicit names)
 celery_app.conf.task_routes = {
-    'app.services.tasks.notification_tasks.send_email_notification': {'queue': 'high'},
-    'app.services.tasks.notification_tasks.send_sms_notification': {'queue': 'high'},
-    'app.services.tasks.notification_tasks.send_in_app_notification': {'queue': 'default'},
-    'app.services.tasks.scheduled_tasks.*': {'queue': 'low'},
+    'send_email_notification': {'queue': 'high'},
+    'send_sms_notification': {'queue': 'high'},
+    'send_in_app_notification': {'queue': 'default'},
+    'send_daily_digest': {'queue': 'low'},
+    'cleanup_old_notifications': {'queue': 'low'},
+    'maintain_notification_partitions': {'queue': 'low'},
+    'report_delivery_latency': {'queue': 'low'},
+    'flush_read_receipts': {'queue': 'default'},
+    'reap_notifications': {'queue': 'default'},
+    'run_broadcast': {'queue': 'low'},
+    'replay_dead_letters': {'queue': 'low'},
 }
+
+# Workers log like the API (JSON through a background thread) instead of through Celery's handlers
+setup_logging.connect(configure_logging)
+
+# Task counters by channel and priority, and the worker metrics exporter
+setup_task_metrics()
+
+# Status changes made by tasks invalidate the owners' notification list ETags
+setup_version_tracking(SessionLocal)
+
+def get_queue_depth(queue: str) -> int:
+    """
+    Get the number of ready messages in a broker queue
+    """
+    with celery_app.connection_for_read() as connection:
+        return connection.default_channel.queue_declare(queue=queue, passive=True).message_count
+
+def get_queue_depths(queues: List[str]) -> Dict[str, int]:
+    """
+    Get the number of ready messages of several queues over one broker connection
+
+    Queues that do not exist yet are left out.
+    """
+    depths = {}
+    with celery_app.connection_for_read() as connection:
+        for queue in queues:
+            # A failed passive declare closes its channel, so each queue gets its own
+            channel = connection.channel()
+            try:
+                depths[queue] = channel.queue_declare(queue=queue, passive=True).message_count
+            except Exception as e:
+                logger.debug(f"Queue {queue} not available: {str(e)}")
+            finally:
+                try:
+                    channel.close()
+                except Exception:
+                    pass
+    return depths
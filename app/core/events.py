@@ -1,20 +1,18 @@
 import logging
-from app.db.database import engine, Base
-from app.services.email_service import email_service
+from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
 async def startup_event():
     """
     Function to handle application startup events
+
+    Startup does no network I/O by default: the schema is managed by `python -m app.db.init_db`
+    and providers connect on first use, so the API is ready as soon as it is imported.
     """
-    # Create database tables
-    logger.info("Creating database tables")
-    Base.metadata.create_all(bind=engine)
-    
-    # Initialize Gmail API service
-    logger.info("Initializing Gmail API service")
-    await email_service.initialize()
+    if settings.AUTO_CREATE_SCHEMA:
+        from app.db.init_db import init_db
+        init_db()
     
     logger.info("Application startup complete")
 
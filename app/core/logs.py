@@ -0,0 +1,141 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import zlib
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional, TextIO
+
+from app.core.config import settings
+from app.core.metrics import LOG_RECORDS_DROPPED
+
+# Record attributes copied into JSON lines when a call site or adapter sets them
+CONTEXT_FIELDS = ("notification_id", "user_id", "task_id", "channel")
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger, message, context IDs and the traceback if any
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = str(value)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread as they are, so the caller never formats or writes
+
+    Messages are only formatted in the listener: pass immutable arguments (IDs, numbers), not ORM
+    objects. When the queue is full, records below WARNING are dropped and counted; warnings and
+    errors wait for room instead.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno < logging.WARNING:
+                LOG_RECORDS_DROPPED.inc()
+            else:
+                self.queue.put(record)
+
+class NotificationLogger(logging.LoggerAdapter):
+    """
+    Logger of one notification's delivery: adds its IDs to every record and samples success logs
+
+    Whether the notification's info and debug records are kept is decided once, from a hash of
+    its ID against LOG_SUCCESS_SAMPLE_RATES[channel], so a sampled notification is logged from
+    start to end and an unsampled one costs no record at all. Warnings and errors are always logged.
+    """
+    def __init__(
+        self,
+        logger: logging.Logger,
+        channel: str,
+        notification_id: str,
+        user_id: Optional[str] = None,
+        task_id: Optional[str] = None
+    ):
+        super().__init__(logger, {
+            "notification_id": notification_id,
+            "user_id": user_id,
+            "task_id": task_id,
+            "channel": channel,
+        })
+        rate = settings.LOG_SUCCESS_SAMPLE_RATES.get(channel, 1.0)
+        self.sampled = rate >= 1.0 or (zlib.crc32(str(notification_id).encode()) % 10000) < rate * 10000
+
+    def isEnabledFor(self, level: int) -> bool:
+        if level < logging.WARNING and not self.sampled:
+            return False
+        return self.logger.isEnabledFor(level)
+
+_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+def _start_listener(stream: TextIO) -> None:
+    global _listener
+    output = logging.StreamHandler(stream)
+    if settings.LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    _handler.queue = queue.Queue(settings.LOG_QUEUE_SIZE)
+    _listener = QueueListener(_handler.queue, output, respect_handler_level=False)
+    _listener.start()
+
+def _restart_after_fork() -> None:
+    # The listener thread does not survive fork, and the parent's queue may be locked mid-put
+    if _listener is not None:
+        _start_listener(_listener.handlers[0].stream)
+
+def stop_logging() -> None:
+    """
+    Write out the queued records and stop the listener thread
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def configure_logging(stream: Optional[TextIO] = None, loglevel=None, **kwargs) -> None:
+    """
+    Route all logging through a bounded queue to a background thread writing to stdout
+
+    Used by the API and, through Celery's setup_logging signal (hence **kwargs), by workers in
+    place of Celery's own logging setup; a worker's --loglevel overrides LOG_LEVEL. Calling it
+    again replaces the previous configuration.
+    """
+    global _handler
+    stop_logging()
+    # Skip gathering what neither format prints: caller location (a stack walk per record),
+    # thread and process names
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    root = logging.getLogger()
+    if _handler is not None:
+        root.removeHandler(_handler)
+    # Its queue comes with the listener
+    _handler = NonBlockingQueueHandler(None)
+    _start_listener(stream or sys.stdout)
+    root.addHandler(_handler)
+    root.setLevel(loglevel or settings.LOG_LEVEL.upper())
+
+os.register_at_fork(after_in_child=_restart_after_fork)
+atexit.register(stop_logging)
@@ -0,0 +1,300 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+from celery.signals import (
+    before_task_publish,
+    task_failure,
+    task_postrun,
+    task_prerun,
+    task_retry,
+    worker_init,
+    worker_process_shutdown,
+)
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Set by prometheus_client's documented environment variable; every process then writes its
+# samples to files in this directory and exporters merge them at scrape time
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+# Channel of each delivery task, other tasks are reported with channel "none"
+TASK_CHANNELS = {
+    "send_email_notification": "email",
+    "send_sms_notification": "sms",
+    "send_in_app_notification": "in-app",
+}
+
+# Message header carrying the notification priority from the publisher to the worker
+PRIORITY_HEADER = "notification_priority"
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "API request latency",
+    ["method", "route", "version", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent in database statements per API request",
+    ["route", "version"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+TASKS_ENQUEUED = Counter("celery_tasks_enqueued_total", "Tasks published", ["task", "channel", "priority"])
+TASKS_STARTED = Counter("celery_tasks_started_total", "Tasks started by a worker", ["task", "channel", "priority"])
+TASKS_SUCCEEDED = Counter("celery_tasks_succeeded_total", "Tasks finished successfully", ["task", "channel", "priority"])
+TASKS_FAILED = Counter("celery_tasks_failed_total", "Tasks that raised", ["task", "channel", "priority"])
+TASKS_RETRIED = Counter("celery_tasks_retried_total", "Tasks scheduled for a retry", ["task", "channel", "priority"])
+TASKS_DEFERRED = Counter("celery_tasks_deferred_total", "Tasks re-published for later without running", ["task", "reason"])
+LOG_RECORDS_DROPPED = Counter("log_records_dropped_total", "Info and debug log records dropped because the log queue was full")
+NOTIFICATIONS_DEAD_LETTERED = Counter("notifications_dead_lettered_total", "Deliveries that used up their retries", ["channel", "error_class"])
+PROVIDER_LATENCY = Histogram(
+    "provider_request_duration_seconds",
+    "Latency of calls to delivery providers, by outcome",
+    ["provider", "outcome"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+
+# Accumulated DB time of the current request: [total seconds, start of the running statement]
+_request_db_time: ContextVar[Optional[List[float]]] = ContextVar("request_db_time", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timer = _request_db_time.get()
+    if timer is not None:
+        timer[1] = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timer = _request_db_time.get()
+    if timer is not None:
+        timer[0] += time.perf_counter() - timer[1]
+
+def setup_db_timing() -> None:
+    """
+    Time database statements of every engine (primary and replicas) for the request metrics
+    """
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency and DB time of API requests
+
+    Routes are labelled by their path template (e.g. /api/v2/users/{user_id}/notifications) so
+    the label set stays bounded; requests that match no route are labelled "unmatched".
+    """
+    def __init__(self, app):
+        self.app = app
+        self._templates: Optional[Dict] = None
+
+    def _route_template(self, scope) -> str:
+        if self._templates is None:
+            # Built lazily, all routes are registered by the time the first request arrives
+            self._templates = {
+                route.endpoint: route.path
+                for route in scope["app"].routes if hasattr(route, "endpoint")
+            }
+        return self._templates.get(scope.get("endpoint"), "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        timer = [0.0, 0.0]
+        token = _request_db_time.set(timer)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_db_time.reset(token)
+            route = self._route_template(scope)
+            version = (
+                route[len(settings.API_PREFIX) + 1:].split("/", 1)[0]
+                if route.startswith(f"{settings.API_PREFIX}/v") else "none"
+            )
+            REQUEST_LATENCY.labels(scope["method"], route, version, str(status[0])).observe(elapsed)
+            REQUEST_DB_TIME.labels(route, version).observe(timer[0])
+
+@contextmanager
+def track_provider_call(provider: str) -> Iterator[None]:
+    """
+    Time a provider call; an exception escaping the block counts as an error
+    """
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    finally:
+        PROVIDER_LATENCY.labels(provider, outcome).observe(time.perf_counter() - started)
+
+def _priority(value) -> str:
+    return str(getattr(value, "value", value) or "none")
+
+def _task_labels(task) -> List[str]:
+    request = task.request
+    priority = getattr(request, PRIORITY_HEADER, None)
+    if priority is None:
+        priority = (getattr(request, "headers", None) or {}).get(PRIORITY_HEADER)
+    return [task.name, TASK_CHANNELS.get(task.name, "none"), _priority(priority)]
+
+def _on_task_publish(sender=None, headers=None, **kwargs):
+    headers = headers or {}
+    task = headers.get("task", sender)
+    TASKS_ENQUEUED.labels(task, TASK_CHANNELS.get(task, "none"), _priority(headers.get(PRIORITY_HEADER))).inc()
+
+def _on_task_prerun(task=None, **kwargs):
+    TASKS_STARTED.labels(*_task_labels(task)).inc()
+
+def _on_task_postrun(task=None, state=None, **kwargs):
+    if state == "SUCCESS":
+        TASKS_SUCCEEDED.labels(*_task_labels(task)).inc()
+
+def _on_task_failure(sender=None, **kwargs):
+    TASKS_FAILED.labels(*_task_labels(sender)).inc()
+
+def _on_task_retry(sender=None, **kwargs):
+    TASKS_RETRIED.labels(*_task_labels(sender)).inc()
+
+class BacklogCollector:
+    """
+    Scrape-time gauges for broker queue depth and the age of the oldest QUEUED notification
+
+    Both need a round trip (broker and database), so results are cached for
+    METRICS_BACKLOG_CACHE_SECONDS to keep frequent or duplicate scrapes cheap.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cached_at = 0.0
+        self._depths: Dict[str, int] = {}
+        self._oldest_age: Optional[float] = None
+
+    def _refresh(self) -> None:
+        from app.core.celery_app import celery_app, get_queue_depths
+        from app.db.database import engine
+        from app.db.models import Notification, NotificationStatus
+        from sqlalchemy import func, select
+
+        try:
+            self._depths = get_queue_depths(list(celery_app.conf.task_queues))
+        except Exception as e:
+            logger.warning(f"Could not read queue depths: {str(e)}")
+            self._depths = {}
+
+        try:
+            with engine.connect() as conn:
+                oldest = conn.execute(
+                    select(func.min(Notification.created_at)).where(
+                        Notification.status == NotificationStatus.QUEUED
+                    )
+                ).scalar()
+                now = conn.execute(select(func.now())).scalar()
+            self._oldest_age = (now - oldest).total_seconds() if oldest else 0.0
+        except Exception as e:
+            logger.warning(f"Could not read the oldest queued notification: {str(e)}")
+            self._oldest_age = None
+
+    def describe(self):
+        # Nothing to pre-register, and it avoids a broker/database call at registration
+        return []
+
+    def collect(self):
+        with self._lock:
+            if time.monotonic() - self._cached_at >= settings.METRICS_BACKLOG_CACHE_SECONDS:
+                self._refresh()
+                self._cached_at = time.monotonic()
+            depths, oldest_age = dict(self._depths), self._oldest_age
+
+        depth = GaugeMetricFamily("celery_queue_depth", "Messages ready in a broker queue", labels=["queue"])
+        for queue, count in depths.items():
+            depth.add_metric([queue], count)
+        yield depth
+
+        if oldest_age is not None:
+            yield GaugeMetricFamily(
+                "notifications_oldest_queued_age_seconds",
+                "Age of the oldest notification still in QUEUED status",
+                value=oldest_age
+            )
+
+backlog_collector = BacklogCollector()
+
+def _exporter_registry(include_backlog: bool) -> CollectorRegistry:
+    if not MULTIPROCESS:
+        registry = REGISTRY
+    else:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    if include_backlog:
+        registry.register(backlog_collector)
+    return registry
+
+_api_registry: Optional[CollectorRegistry] = None
+
+def render_metrics():
+    """
+    Serialize the API's metrics (all processes in multiprocess mode) plus the backlog gauges
+    """
+    global _api_registry
+    if _api_registry is None:
+        _api_registry = _exporter_registry(include_backlog=True)
+    return generate_latest(_api_registry), CONTENT_TYPE_LATEST
+
+def _start_worker_exporter(**kwargs):
+    """
+    Serve the metrics of all pool processes from the worker's main process
+    """
+    if not settings.METRICS_WORKER_PORT:
+        return
+    try:
+        start_http_server(settings.METRICS_WORKER_PORT, registry=_exporter_registry(include_backlog=False))
+        logger.info(f"Worker metrics exporter listening on port {settings.METRICS_WORKER_PORT}")
+    except OSError as e:
+        # Several workers on one host: only the first one binds the port
+        logger.warning(f"Worker metrics exporter not started: {str(e)}")
+
+def _on_worker_process_shutdown(pid=None, **kwargs):
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid or os.getpid())
+
+def setup_task_metrics() -> None:
+    """
+    Connect the Celery signal handlers: publishing in the API, execution and exporter in workers
+    """
+    if not settings.METRICS_ENABLED:
+        return
+    before_task_publish.connect(_on_task_publish)
+    task_prerun.connect(_on_task_prerun)
+    task_postrun.connect(_on_task_postrun)
+    task_failure.connect(_on_task_failure)
+    task_retry.connect(_on_task_retry)
+    worker_init.connect(_start_worker_exporter)
+    worker_process_shutdown.connect(_on_worker_process_shutdown)
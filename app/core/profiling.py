@@ -0,0 +1,145 @@
+import cProfile
+import hmac
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from typing import Optional
+from urllib.parse import parse_qs
+
+from celery import Task
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Request header or query flag asking for a profile of one API request
+PROFILE_FLAG = "profile"
+PROFILE_HEADER = b"x-profile"
+ADMIN_TOKEN_HEADER = b"x-admin-token"
+
+# Message header forcing a profile of one task execution, e.g. apply_async(headers={"profile": True})
+TASK_PROFILE_HEADER = "profile"
+
+SORT_KEYS = ("cumulative", "tottime", "calls")
+
+# cProfile supports a single active profiler per thread
+_profiler_lock = threading.Lock()
+
+def is_admin_token(token: Optional[str]) -> bool:
+    return bool(settings.ADMIN_TOKEN and token) and hmac.compare_digest(token, settings.ADMIN_TOKEN)
+
+def format_stats(profiler: cProfile.Profile, sort: str, limit: int) -> str:
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware returning a cProfile report instead of the response of flagged requests
+
+    A request is profiled when it carries `X-Profile: <sort>` or `?profile=<sort>` (sort is
+    cumulative, tottime or calls; any other value means cumulative) together with a valid
+    X-Admin-Token. The original status is returned in X-Profiled-Status. The profile covers the
+    event loop thread, so coroutines of concurrent requests can show up in it. Only installed
+    when PROFILING_ENABLED is set.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _requested_sort(scope) -> Optional[str]:
+        headers = dict(scope["headers"])
+        flag = headers.get(PROFILE_HEADER, b"").decode("latin-1")
+        if not flag and scope.get("query_string") and PROFILE_FLAG.encode() in scope["query_string"]:
+            flag = parse_qs(scope["query_string"].decode("latin-1")).get(PROFILE_FLAG, [""])[0]
+        if not flag or not is_admin_token(headers.get(ADMIN_TOKEN_HEADER, b"").decode("latin-1")):
+            return None
+        return flag if flag in SORT_KEYS else "cumulative"
+
+    async def __call__(self, scope, receive, send):
+        sort = self._requested_sort(scope) if scope["type"] == "http" else None
+        if sort is None or not _profiler_lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def capture(message):
+            # The original response is replaced by the report
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                await self.app(scope, receive, capture)
+            finally:
+                profiler.disable()
+        finally:
+            _profiler_lock.release()
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        report = format_stats(profiler, sort, settings.PROFILING_REPORT_LINES).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(report)).encode()),
+                (b"x-profiled-status", str(status[0]).encode()),
+                (b"x-profile-duration-ms", f"{elapsed_ms:.1f}".encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": report})
+
+class ProfiledTask(Task):
+    """
+    Task base profiling a sampled fraction of executions into TASK_PROFILE_DIR
+
+    TASK_PROFILE_SAMPLE_RATE sets the fraction (0 disables sampling, leaving one comparison per
+    execution); a message header {"profile": True} profiles that execution regardless. Reports
+    are pstats dumps named <task>-<task id>-<timestamp>.prof, readable with pstats or snakeviz.
+    """
+    def _should_profile(self) -> bool:
+        if settings.TASK_PROFILE_SAMPLE_RATE > 0 and random.random() < settings.TASK_PROFILE_SAMPLE_RATE:
+            return True
+        request = self.request
+        flag = getattr(request, TASK_PROFILE_HEADER, None)
+        if flag is None:
+            flag = (getattr(request, "headers", None) or {}).get(TASK_PROFILE_HEADER)
+        return bool(flag)
+
+    def _call(self, *args, **kwargs):
+        # Under a worker the tracer has already pushed the real request. Task.__call__ would
+        # push a bare one over it (no ID, headers or retry count), so only direct calls use it.
+        if self.request_stack.top is not None:
+            return self.run(*args, **kwargs)
+        return super().__call__(*args, **kwargs)
+
+    def __call__(self, *args, **kwargs):
+        if not self._should_profile() or not _profiler_lock.acquire(blocking=False):
+            return self._call(*args, **kwargs)
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            return profiler.runcall(self._call, *args, **kwargs)
+        finally:
+            _profiler_lock.release()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            try:
+                os.makedirs(settings.TASK_PROFILE_DIR, exist_ok=True)
+                path = os.path.join(
+                    settings.TASK_PROFILE_DIR,
+                    f"{self.name}-{self.request.id}-{int(time.time() * 1000)}.prof"
+                )
+                profiler.dump_stats(path)
+                logger.info(f"Profiled {self.name} {self.request.id} ({elapsed_ms:.1f} ms) to {path}")
+            except Exception as e:
+                logger.warning(f"Failed to write task profile: {str(e)}")
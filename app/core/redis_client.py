@@ -0,0 +1,17 @@
+import redis
+from app.core.config import settings
+
+_redis_client = None
+
+def get_redis() -> redis.Redis:
+    """
+    Get the shared synchronous Redis client for the current process
+    """
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=1,
+            socket_connect_timeout=1
+        )
+    return _redis_client
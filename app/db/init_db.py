@@ -0,0 +1,56 @@
+import logging
+
+from app.core.config import settings
+from app.db.database import Base, SessionLocal, engine
+from app.db.leases import ensure_lease_column
+from app.db.partitions import ensure_notification_partitions
+from app.db.search import ensure_search_index
+from app.db.upgrades import (
+    ensure_broadcast_column,
+    ensure_cancelled_column,
+    ensure_content_columns,
+    ensure_notification_indexes,
+    ensure_stage_timings_column,
+    ensure_template_columns,
+    ensure_user_updated_at,
+)
+
+logger = logging.getLogger(__name__)
+
+def init_db() -> None:
+    """
+    Create missing tables and indexes, the columns added since a table was created, the
+    upcoming notification partitions, the lease column and the search index
+    """
+    # Import the models so they are registered on Base.metadata
+    import app.db.models  # noqa: F401
+
+    logger.info("Creating database tables")
+    Base.metadata.create_all(bind=engine)
+    
+    db = SessionLocal()
+    try:
+        logger.info("Adding columns and indexes missing from existing tables")
+        ensure_content_columns(db)
+        ensure_broadcast_column(db)
+        ensure_user_updated_at(db)
+        ensure_stage_timings_column(db)
+        ensure_template_columns(db)
+        ensure_cancelled_column(db)
+        ensure_notification_indexes(db)
+        
+        if settings.NOTIFICATIONS_PARTITIONED:
+            logger.info("Ensuring notification partitions exist")
+            ensure_notification_partitions(db)
+        
+        logger.info("Ensuring the notification lease column and reaper indexes exist")
+        ensure_lease_column(db)
+        
+        logger.info("Ensuring the notification search index exists")
+        ensure_search_index(db)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    init_db()
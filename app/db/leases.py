@@ -0,0 +1,135 @@
+import logging
+from datetime import timedelta
+from typing import List, Optional, Sequence
+
+from sqlalchemy import String, and_, case, cast, func, or_, select, text, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import Notification, NotificationStatus
+
+logger = logging.getLogger(__name__)
+
+# Columns returned for re-queued rows, what queue_notification reads
+REQUEUE_COLUMNS = (
+    Notification.id,
+    Notification.user_id,
+    Notification.type,
+    Notification.status,
+    Notification.priority,
+    Notification.message_id,
+    Notification.template_id,
+    Notification.task_id,
+    Notification.broadcast_id,
+)
+
+def ensure_lease_column(db: Session) -> None:
+    """
+    Add the claimed_until column and the reaper's partial indexes to an existing notifications table
+
+    Idempotent; create_all already covers new databases. Both indexes only hold the rows the
+    reaper looks for, so they stay small however large the table grows.
+    """
+    db.execute(text("ALTER TABLE notifications ADD COLUMN IF NOT EXISTS claimed_until timestamptz"))
+    db.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_notifications_sending_claimed_until "
+        "ON notifications (claimed_until) WHERE status = 'SENDING'"
+    ))
+    db.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_notifications_unqueued_created_at "
+        "ON notifications (created_at) WHERE status = 'QUEUED' AND task_id IS NULL"
+    ))
+    db.commit()
+
+def claim_notification(db: Session, notification_id, task_id: Optional[str] = None) -> bool:
+    """
+    Atomically take a notification for sending, leased for CLAIM_LEASE_SECONDS
+
+    Queued and failed (retried) notifications can be claimed, as can sending ones whose lease
+    expired; cancelled ones never. With a task_id, only the task the row was last queued with
+    may claim it: the reaper and dead-letter replays queue rows under a new task ID, which
+    retires any older copy still in the broker. False means another worker holds it, it was
+    already delivered or read, it was cancelled, or it belongs to another task.
+    """
+    conditions = [Notification.id == notification_id, Notification.cancelled_at.is_(None)]
+    if task_id is not None:
+        # A row without a task ID had its publish reported failed; a task that went out anyway may send it
+        conditions.append(or_(Notification.task_id.is_(None), Notification.task_id == task_id))
+    result = db.execute(
+        update(Notification.__table__).where(
+            *conditions,
+            or_(
+                Notification.status.in_((NotificationStatus.QUEUED, NotificationStatus.FAILED)),
+                and_(Notification.status == NotificationStatus.SENDING, Notification.claimed_until < func.now())
+            )
+        ).values(
+            status=NotificationStatus.SENDING,
+            claimed_until=func.now() + timedelta(seconds=settings.CLAIM_LEASE_SECONDS)
+        )
+    )
+    db.commit()
+    return result.rowcount == 1
+
+def requeue_expired_claims(db: Session, batch_size: int) -> List:
+    """
+    Put one batch of sending notifications whose lease expired back to queued, and return them
+
+    Their worker died mid-send (a crash or kill under task_acks_late). Each expiry counts in
+    retry_count; past REAPER_MAX_REQUEUES the notification is failed instead, so a message that
+    keeps killing workers is not sent forever. Returned rows keep their task ID.
+    """
+    expired = select(Notification.id).where(
+        Notification.status == NotificationStatus.SENDING,
+        Notification.claimed_until < func.now()
+    ).order_by(Notification.claimed_until).limit(batch_size).with_for_update(skip_locked=True)
+    rows = db.execute(
+        update(Notification.__table__).where(Notification.id.in_(expired)).values(
+            status=case(
+                (
+                    func.coalesce(Notification.retry_count, 0) >= settings.REAPER_MAX_REQUEUES,
+                    cast(NotificationStatus.FAILED, Notification.status.type)
+                ),
+                else_=cast(NotificationStatus.QUEUED, Notification.status.type)
+            ),
+            claimed_until=None,
+            retry_count=func.coalesce(Notification.retry_count, 0) + 1
+        ).returning(*REQUEUE_COLUMNS)
+    ).fetchall()
+    db.commit()
+    return rows
+
+def requeue_unqueued(db: Session, batch_size: int) -> List:
+    """
+    Give one batch of queued notifications whose task was never published a new task ID, and return them
+
+    Publishing failures leave task_id empty (see create_notification); rows younger than
+    ORPHAN_GRACE_SECONDS may still be on their way and are left alone. Rows older than
+    ORPHAN_MAX_AGE_SECONDS are stale, sending them now would do more harm than good.
+    """
+    orphaned = select(Notification.id).where(
+        Notification.status == NotificationStatus.QUEUED,
+        Notification.task_id.is_(None),
+        Notification.created_at < func.now() - timedelta(seconds=settings.ORPHAN_GRACE_SECONDS),
+        Notification.created_at >= func.now() - timedelta(seconds=settings.ORPHAN_MAX_AGE_SECONDS)
+    ).order_by(Notification.created_at).limit(batch_size).with_for_update(skip_locked=True)
+    rows = db.execute(
+        update(Notification.__table__).where(Notification.id.in_(orphaned)).values(
+            task_id=cast(func.gen_random_uuid(), String)
+        ).returning(*REQUEUE_COLUMNS)
+    ).fetchall()
+    db.commit()
+    return rows
+
+def clear_task_ids(db: Session, notification_ids: Sequence) -> None:
+    """
+    Forget the task IDs of notifications whose task could not be published, so the reaper retries them
+    """
+    if not notification_ids:
+        return
+    db.execute(
+        update(Notification.__table__).where(
+            Notification.id.in_(list(notification_ids)),
+            Notification.status == NotificationStatus.QUEUED
+        ).values(task_id=None)
+    )
+    db.commit()
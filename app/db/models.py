@@ -1,10 +1,11 @@
-from sqlalchemy import Boolean, Column, DateTime, Enum, ForeignKey, Integer, String, Text
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import BigInteger, Boolean, Column, Date, DateTime, Enum, ForeignKey, Index, Integer, String, Text, text
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TSVECTOR, UUID
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 import uuid
 import enum
 
+from app.core.config import settings
 from app.db.database import Base
 
 class NotificationType(str, enum.Enum):
@@ -24,6 +25,13 @@ class NotificationPriority(str, enum.Enum):
     MEDIUM = "medium"
     HIGH = "high"
 
+class BroadcastStatus(str, enum.Enum):
+    RUNNING = "running"
+    PAUSED = "paused"
+    CANCELLED = "cancelled"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
 class User(Base):
     __tablename__ = "users"
 
@@ -31,7 +39,8 @@ class User(Base):
     email = Column(String, unique=True, index=True)
     phone = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Also set on insert so the preference index can load changes incrementally
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
     
     # Notification preferences
     email_enabled = Column(Boolean, default=True)
@@ -41,22 +50,149 @@ class User(Base):
     # Relationships
     notifications = relationship("Notification", back_populates="user")
 
+class NotificationMessage(Base):
+    __tablename__ = "notification_messages"
+
+    # SHA-256 of subject and body, so identical content is stored once
+    id = Column(String(64), primary_key=True)
+    subject = Column(String)
+    body = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Content for full-text search, computed once per message by a trigger (app/db/search.py)
+    search_vector = deferred(Column(TSVECTOR, nullable=True))
+
+class MessageTemplate(Base):
+    __tablename__ = "message_templates"
+
+    # Versions are immutable: registering a template again adds the next version
+    id = Column(String(100), primary_key=True)
+    version = Column(Integer, primary_key=True)
+    subject = Column(String)
+    body = Column(Text)
+    html = Column(Boolean, default=True)  # autoescape variables in the body
+    variables = Column(JSONB)  # names referenced by subject and body
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class Notification(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        # Leading user_id serves per-user lookups, created_at lets date ranges prune partitions
+        Index("ix_notifications_user_id_created_at", "user_id", "created_at"),
+        # Time-window scans: daily digest and retention cleanup
+        Index("ix_notifications_created_at", "created_at"),
+        # Small index of the backlog, for the oldest-queued-notification metric
+        Index("ix_notifications_queued_created_at", "created_at", postgresql_where=text("status = 'QUEUED'")),
+        Index("ix_notifications_broadcast_id", "broadcast_id", postgresql_where=text("broadcast_id IS NOT NULL")),
+        # Reaper lookups (app/db/leases.py): expired claims, and queued rows whose task was never published
+        Index("ix_notifications_sending_claimed_until", "claimed_until", postgresql_where=text("status = 'SENDING'")),
+        Index("ix_notifications_unqueued_created_at", "created_at", postgresql_where=text("status = 'QUEUED' AND task_id IS NULL")),
+        {"postgresql_partition_by": "RANGE (created_at)"} if settings.NOTIFICATIONS_PARTITIONED else {},
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), index=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
     type = Column(Enum(NotificationType))
-    subject = Column(String)
-    body = Column(Text)
+    # Shared content plus optional per-recipient variables substituted at send time
+    message_id = Column(String(64), ForeignKey("notification_messages.id"), nullable=True)
+    template_vars = Column(JSONB, nullable=True)
+    # Or a registered template rendered at send time; no foreign key, system templates live in code
+    template_id = Column(String(100), nullable=True)
+    template_version = Column(Integer, nullable=True)
+    # Inline content, only set on rows created before content deduplication
+    subject = Column(String, nullable=True)
+    body = Column(Text, nullable=True)
     status = Column(Enum(NotificationStatus), default=NotificationStatus.QUEUED)
     priority = Column(Enum(NotificationPriority), default=NotificationPriority.MEDIUM)
     retry_count = Column(Integer, default=0)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Partitioned tables need the partition key in the primary key
+    created_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        primary_key=settings.NOTIFICATIONS_PARTITIONED,
+        nullable=not settings.NOTIFICATIONS_PARTITIONED
+    )
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     delivered_at = Column(DateTime(timezone=True), nullable=True)
     read_at = Column(DateTime(timezone=True), nullable=True)
     task_id = Column(String, nullable=True)  # To store Celery task ID
+    # End of the sending worker's lease, past it the reaper queues the notification again
+    claimed_until = Column(DateTime(timezone=True), nullable=True)
+    # Set when cancelled; the row is FAILED as well, but is never claimed or replayed again
+    cancelled_at = Column(DateTime(timezone=True), nullable=True)
+    # Millisecond offsets from created_at of each delivery stage, see lifecycle_service.LIFECYCLE_STAGES
+    stage_timings = Column(ARRAY(Integer), nullable=True)
+    broadcast_id = Column(UUID(as_uuid=True), nullable=True)  # Set when created by a broadcast
+    # Inline or template content and variable values for full-text search, kept up to date by a
+    # trigger (app/db/search.py); deduplicated messages are searched through their own vector
+    search_vector = deferred(Column(TSVECTOR, nullable=True))
     
     # Relationships
     user = relationship("User", back_populates="notifications")
+
+class Broadcast(Base):
+    __tablename__ = "broadcasts"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    segment = Column(JSONB)  # Filters over User attributes
+    channels = Column(JSONB)  # List of NotificationType values
+    message_id = Column(String(64), ForeignKey("notification_messages.id"))
+    priority = Column(Enum(NotificationPriority), default=NotificationPriority.LOW)
+    status = Column(Enum(BroadcastStatus), default=BroadcastStatus.RUNNING)
+    cursor_user_id = Column(UUID(as_uuid=True), nullable=True)  # Last user fanned out to
+    recipients_processed = Column(Integer, default=0)
+    notifications_created = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+class ArchiveSegment(Base):
+    __tablename__ = "notification_archive_segments"
+
+    # One gzip JSONL file of archived notifications for a month and user shard
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    path = Column(String, nullable=False)  # key relative to ARCHIVE_URL
+    month = Column(Date, nullable=False, index=True)
+    shard = Column(Integer, nullable=False)
+    row_count = Column(Integer, nullable=False)
+    size_bytes = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ArchiveUserRange(Base):
+    __tablename__ = "notification_archive_index"
+    __table_args__ = (
+        Index("ix_notification_archive_index_user_id_last_created_at", "user_id", "last_created_at"),
+    )
+
+    # Where a user's rows sit in a segment: one self-contained gzip member, read with a range request
+    segment_id = Column(UUID(as_uuid=True), ForeignKey("notification_archive_segments.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), primary_key=True)
+    offset = Column(BigInteger, nullable=False)
+    length = Column(Integer, nullable=False)
+    row_count = Column(Integer, nullable=False)
+    first_created_at = Column(DateTime(timezone=True), nullable=False)
+    last_created_at = Column(DateTime(timezone=True), nullable=False)
+
+class DeadLetter(Base):
+    __tablename__ = "dead_letters"
+    __table_args__ = (
+        # Pending entries by channel, error class or time: what listing and replay filter on
+        Index("ix_dead_letters_pending_channel_failed_at", "channel", "failed_at", postgresql_where=text("replayed_at IS NULL")),
+        Index("ix_dead_letters_pending_error_class_failed_at", "error_class", "failed_at", postgresql_where=text("replayed_at IS NULL")),
+        Index("ix_dead_letters_failed_at", "failed_at"),
+    )
+
+    # A delivery that used up its retries; one entry per notification, updated when it dies again
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    notification_id = Column(UUID(as_uuid=True), nullable=False, unique=True)  # no foreign key, retention removes notifications
+    user_id = Column(UUID(as_uuid=True), nullable=True)
+    channel = Column(Enum(NotificationType), nullable=False)
+    task_name = Column(String(100), nullable=False)
+    task_id = Column(String, nullable=True)  # of the last failed run
+    error_class = Column(String(200), nullable=False)
+    error_message = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False)  # executions of the last run, retries included
+    # Every failed attempt, oldest first and across replays: [{"at", "attempt", "error_class", "error"}]
+    attempt_history = Column(JSONB, nullable=False)
+    failed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    replayed_at = Column(DateTime(timezone=True), nullable=True)  # set while a replay is out
+    replay_count = Column(Integer, default=0, nullable=False)
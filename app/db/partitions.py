@@ -0,0 +1,93 @@
+import logging
+import re
+from datetime import date, datetime
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "notifications"
+PARTITION_NAME_RE = re.compile(r"^notifications_p(\d{4})(\d{2})$")
+
+def _month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+def _add_months(value: date, months: int) -> date:
+    month_index = value.year * 12 + value.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    """
+    Name of the partition holding the given month, e.g. notifications_p202605
+    """
+    return f"{PARENT_TABLE}_p{month:%Y%m}"
+
+def list_notification_partitions(db: Session) -> List[str]:
+    """
+    List the monthly partitions currently attached to the notifications table
+    """
+    rows = db.execute(text("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = :parent
+        ORDER BY child.relname
+    """), {"parent": PARENT_TABLE})
+    return [row[0] for row in rows if PARTITION_NAME_RE.match(row[0])]
+
+def ensure_notification_partitions(
+    db: Session,
+    months_ahead: Optional[int] = None,
+    today: Optional[date] = None
+) -> List[str]:
+    """
+    Create the partitions for the current month and the next `months_ahead` months
+    """
+    if months_ahead is None:
+        months_ahead = settings.PARTITION_PREMAKE_MONTHS
+    current = _month_start(today or datetime.utcnow().date())
+
+    existing = set(list_notification_partitions(db))
+    created = []
+    for offset in range(months_ahead + 1):
+        lower = _add_months(current, offset)
+        upper = _add_months(lower, 1)
+        name = partition_name(lower)
+        if name in existing:
+            continue
+        db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} "
+            f"FOR VALUES FROM ('{lower.isoformat()} 00:00:00+00') TO ('{upper.isoformat()} 00:00:00+00')"
+        ))
+        created.append(name)
+
+    db.commit()
+    if created:
+        logger.info(f"Created notification partitions: {', '.join(created)}")
+    return created
+
+def drop_expired_notification_partitions(db: Session, cutoff: datetime) -> List[str]:
+    """
+    Drop every monthly partition whose whole range lies before the cutoff
+
+    Rows in the month containing the cutoff are kept until that month fully expires,
+    so effective retention is between the configured days and one month more.
+    """
+    cutoff_date = cutoff.date()
+    dropped = []
+    for name in list_notification_partitions(db):
+        match = PARTITION_NAME_RE.match(name)
+        upper = _add_months(date(int(match.group(1)), int(match.group(2)), 1), 1)
+        if upper <= cutoff_date:
+            db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            dropped.append(name)
+
+    db.commit()
+    if dropped:
+        logger.info(f"Dropped expired notification partitions: {', '.join(dropped)}")
+    return dropped
@@ -0,0 +1,149 @@
+import itertools
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from fastapi import Request
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.db.database import engine, SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Path parameters that identify the owner of a recent write
+READ_YOUR_WRITES_PARAMS = ("user_id", "notification_id")
+
+class ReplicaRouter:
+    """
+    Round-robin selection over read replicas with cached health checks
+    """
+    def __init__(self, urls: List[str], check_interval: int, max_lag: int):
+        self.engines = [
+            create_engine(url, pool_pre_ping=True, connect_args={"connect_timeout": 2})
+            for url in urls
+        ]
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        # index -> (healthy, last checked at)
+        self._health: Dict[int, Tuple[bool, float]] = {
+            index: (True, 0.0) for index in range(len(self.engines))
+        }
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def _check(self, index: int) -> bool:
+        """
+        Run a health check against a replica, including replication lag if configured
+        """
+        try:
+            with self.engines[index].connect() as conn:
+                lag = conn.execute(text(
+                    "SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+                )).scalar()
+            if self.max_lag and lag > self.max_lag:
+                logger.warning(f"Replica {index} is lagging by {lag:.1f}s, routing reads to primary")
+                return False
+            return True
+        except Exception as e:
+            logger.warning(f"Replica {index} failed health check: {str(e)}")
+            return False
+
+    def is_healthy(self, index: int) -> bool:
+        healthy, checked_at = self._health[index]
+        now = time.monotonic()
+        if now - checked_at < self.check_interval:
+            return healthy
+
+        # Only one thread re-checks a replica; the others keep using the cached result
+        with self._lock:
+            healthy, checked_at = self._health[index]
+            if now - checked_at < self.check_interval:
+                return healthy
+            self._health[index] = (healthy, now)
+
+        healthy = self._check(index)
+        self._health[index] = (healthy, time.monotonic())
+        return healthy
+
+    def get_engine(self) -> Optional[Engine]:
+        """
+        Get the next healthy replica engine, or None if every replica is down
+        """
+        count = len(self.engines)
+        start = next(self._counter)
+        for offset in range(count):
+            index = (start + offset) % count
+            if self.is_healthy(index):
+                return self.engines[index]
+        return None
+
+replica_router = ReplicaRouter(
+    settings.DATABASE_REPLICA_URLS,
+    settings.REPLICA_HEALTH_CHECK_INTERVAL,
+    settings.REPLICA_MAX_LAG_SECONDS
+) if settings.DATABASE_REPLICA_URLS else None
+
+def _read_your_writes_enabled() -> bool:
+    return replica_router is not None and settings.READ_YOUR_WRITES_WINDOW > 0
+
+def _recent_write_key(id_) -> str:
+    # Canonical form, so upper-case or unhyphenated IDs in a path find the marker
+    try:
+        id_ = UUID(str(id_))
+    except ValueError:
+        pass
+    return f"ryw:{id_}"
+
+def mark_recent_write(*ids) -> None:
+    """
+    Pin reads for the given user/notification IDs to the primary for a short window
+    """
+    if not _read_your_writes_enabled() or not ids:
+        return
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for id_ in ids:
+            pipe.set(_recent_write_key(id_), 1, ex=settings.READ_YOUR_WRITES_WINDOW)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to record recent write: {str(e)}")
+
+def has_recent_write(*ids) -> bool:
+    """
+    Check whether any of the given IDs was written within the read-your-writes window
+    """
+    try:
+        return get_redis().exists(*[_recent_write_key(id_) for id_ in ids]) > 0
+    except Exception as e:
+        # Without the marker we cannot prove the replica is fresh enough
+        logger.warning(f"Failed to check recent writes: {str(e)}")
+        return True
+
+def get_read_engine(request: Request) -> Engine:
+    """
+    Choose the engine for a read-only request
+    """
+    if replica_router is None:
+        return engine
+
+    if _read_your_writes_enabled():
+        ids = [request.path_params[name] for name in READ_YOUR_WRITES_PARAMS if name in request.path_params]
+        if ids and has_recent_write(*ids):
+            return engine
+
+    return replica_router.get_engine() or engine
+
+def get_read_db(request: Request):
+    """
+    Dependency for a read-only database session, served from a replica when possible
+    """
+    db = SessionLocal(bind=get_read_engine(request))
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,175 @@
+import logging
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_NAME = "ix_notifications_user_id_search_vector"
+MESSAGE_SEARCH_INDEX_NAME = "ix_notification_messages_search_vector"
+# Rows of a user sharing one of the deduplicated messages a query matched
+MESSAGE_ROWS_INDEX_NAME = "ix_notifications_user_id_message_id"
+
+def _search_vector_functions() -> str:
+    # A deduplicated message is indexed once, on notification_messages; its recipients' rows
+    # only index their variable values, which is what differs between them. Rows with a
+    # template version or inline content index that content as well.
+    config = settings.SEARCH_TEXT_CONFIG
+    return f"""
+        CREATE OR REPLACE FUNCTION message_search_vector(p_subject text, p_body text)
+        RETURNS tsvector LANGUAGE sql IMMUTABLE AS $$
+            SELECT setweight(to_tsvector('{config}', coalesce(p_subject, '')), 'A')
+                || setweight(to_tsvector('{config}', coalesce(p_body, '')), 'B')
+        $$;
+
+        CREATE OR REPLACE FUNCTION notification_search_vector(
+            p_subject text, p_body text, p_message_id varchar,
+            p_template_id varchar, p_template_version integer, p_vars jsonb
+        ) RETURNS tsvector LANGUAGE plpgsql STABLE AS $$
+        DECLARE
+            v_content tsvector := ''::tsvector;
+            v_subject text := p_subject;
+            v_body text := p_body;
+        BEGIN
+            IF p_message_id IS NULL THEN
+                IF p_template_id IS NOT NULL THEN
+                    SELECT subject, body INTO v_subject, v_body FROM message_templates
+                    WHERE id = p_template_id AND version = p_template_version;
+                END IF;
+                v_content := message_search_vector(v_subject, v_body);
+            END IF;
+            RETURN v_content
+                || setweight(coalesce(jsonb_to_tsvector('{config}', p_vars, '["string", "numeric"]'), ''::tsvector), 'C');
+        END
+        $$
+    """
+
+_TRIGGER_FUNCTIONS = """
+    CREATE OR REPLACE FUNCTION notifications_search_vector_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.search_vector := notification_search_vector(
+            NEW.subject, NEW.body, NEW.message_id, NEW.template_id, NEW.template_version, NEW.template_vars
+        );
+        RETURN NEW;
+    END
+    $$;
+
+    CREATE OR REPLACE FUNCTION notification_messages_search_vector_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.search_vector := message_search_vector(NEW.subject, NEW.body);
+        RETURN NEW;
+    END
+    $$
+"""
+
+def ensure_search_index(db: Session) -> None:
+    """
+    Create the full-text search columns, the triggers maintaining them and their GIN indexes
+
+    Idempotent. The notifications index leads with user_id (btree_gin) so a search only visits
+    the user's own postings; without the extension it falls back to a GIN index on the vector
+    alone. Message vectors are computed once per distinct content by store_messages inserts
+    (conflicting ones included, a BEFORE trigger runs ahead of ON CONFLICT), not per recipient.
+    """
+    db.execute(text("ALTER TABLE notifications ADD COLUMN IF NOT EXISTS search_vector tsvector"))
+    db.execute(text("ALTER TABLE notification_messages ADD COLUMN IF NOT EXISTS search_vector tsvector"))
+    db.execute(text(_search_vector_functions()))
+    db.execute(text(_TRIGGER_FUNCTIONS))
+    db.execute(text("DROP TRIGGER IF EXISTS notifications_search_vector ON notifications"))
+    db.execute(text("""
+        CREATE TRIGGER notifications_search_vector
+        BEFORE INSERT OR UPDATE OF subject, body, message_id, template_id, template_version, template_vars
+        ON notifications FOR EACH ROW EXECUTE PROCEDURE notifications_search_vector_trigger()
+    """))
+    db.execute(text("DROP TRIGGER IF EXISTS notification_messages_search_vector ON notification_messages"))
+    db.execute(text("""
+        CREATE TRIGGER notification_messages_search_vector
+        BEFORE INSERT OR UPDATE OF subject, body
+        ON notification_messages FOR EACH ROW EXECUTE PROCEDURE notification_messages_search_vector_trigger()
+    """))
+    db.execute(text(
+        f"CREATE INDEX IF NOT EXISTS {MESSAGE_SEARCH_INDEX_NAME} ON notification_messages USING gin (search_vector)"
+    ))
+    db.execute(text(
+        f"CREATE INDEX IF NOT EXISTS {MESSAGE_ROWS_INDEX_NAME} "
+        "ON notifications (user_id, message_id) WHERE message_id IS NOT NULL"
+    ))
+    db.commit()
+
+    try:
+        db.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gin"))
+        columns = "user_id, search_vector"
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"btree_gin is unavailable, indexing search vectors without user_id: {str(e).splitlines()[0]}")
+        columns = "search_vector"
+    db.execute(text(f"CREATE INDEX IF NOT EXISTS {SEARCH_INDEX_NAME} ON notifications USING gin ({columns})"))
+    db.commit()
+
+def backfill_search_vectors(db: Session, batch_size: int = 5000) -> int:
+    """
+    Compute search vectors that are missing or out of date, one batch per commit
+
+    Covers rows created before the triggers existed, rows of deduplicated messages that still
+    hold a full copy of the message content, and every row after SEARCH_TEXT_CONFIG changed.
+    """
+    updated = 0
+    last_id: Optional[str] = None
+    while True:
+        ids = [row[0] for row in db.execute(text("""
+            SELECT id FROM notification_messages
+            WHERE CAST(:last_id AS varchar) IS NULL OR id > CAST(:last_id AS varchar)
+            ORDER BY id
+            LIMIT :batch_size
+        """), {"last_id": last_id, "batch_size": batch_size})]
+        if not ids:
+            break
+        result = db.execute(text("""
+            UPDATE notification_messages
+            SET search_vector = message_search_vector(subject, body)
+            WHERE id = ANY(CAST(:ids AS varchar[]))
+                AND search_vector IS DISTINCT FROM message_search_vector(subject, body)
+        """), {"ids": ids})
+        db.commit()
+        updated += result.rowcount
+        last_id = ids[-1]
+        logger.info(f"Backfilled {updated} search vectors")
+
+    last_id = None
+    while True:
+        ids = [str(row[0]) for row in db.execute(text("""
+            SELECT id FROM notifications
+            WHERE CAST(:last_id AS uuid) IS NULL OR id > CAST(:last_id AS uuid)
+            ORDER BY id
+            LIMIT :batch_size
+        """), {"last_id": last_id, "batch_size": batch_size})]
+        if not ids:
+            break
+        result = db.execute(text("""
+            UPDATE notifications
+            SET search_vector = notification_search_vector(
+                subject, body, message_id, template_id, template_version, template_vars
+            )
+            WHERE id = ANY(CAST(:ids AS uuid[]))
+                AND search_vector IS DISTINCT FROM notification_search_vector(
+                    subject, body, message_id, template_id, template_version, template_vars
+                )
+        """), {"ids": ids})
+        db.commit()
+        updated += result.rowcount
+        last_id = ids[-1]
+        logger.info(f"Backfilled {updated} search vectors")
+    return updated
+
+if __name__ == "__main__":
+    from app.db.database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    session = SessionLocal()
+    try:
+        backfill_search_vectors(session)
+    finally:
+        session.close()
@@ -0,0 +1,86 @@
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Columns and indexes added to tables that existing deployments already have; create_all skips those
+# tables, so each step adds what is missing. All of them are idempotent.
+
+def ensure_content_columns(db: Session) -> None:
+    """
+    Add the deduplicated content reference and per-recipient variables to notifications
+    """
+    db.execute(text(
+        "ALTER TABLE notifications ADD COLUMN IF NOT EXISTS message_id varchar(64) "
+        "REFERENCES notification_messages(id)"
+    ))
+    db.execute(text("ALTER TABLE notifications ADD COLUMN IF NOT EXISTS template_vars jsonb"))
+    db.commit()
+
+def ensure_broadcast_column(db: Session) -> None:
+    """
+    Add the broadcast reference of notifications and its partial index
+    """
+    db.execute(text("ALTER TABLE notifications ADD COLUMN IF NOT EXISTS broadcast_id uuid"))
+    db.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_notifications_broadcast_id "
+        "ON notifications (broadcast_id) WHERE broadcast_id IS NOT NULL"
+    ))
+    db.commit()
+
+def ensure_user_updated_at(db: Session) -> None:
+    """
+    Give every user an updated_at, backfilled from created_at, defaulting to now() and indexed
+
+    The preference index loads users changed since its last refresh by this column. Older
+    schemas had it nullable and only set on update, so new and never-updated users lacked it.
+    """
+    db.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS updated_at timestamptz"))
+    db.execute(text("ALTER TABLE users ALTER COLUMN updated_at SET DEFAULT now()"))
+    # Created first, so the backfill check is an index lookup once there is nothing left to fill
+    db.execute(text("CREATE INDEX IF NOT EXISTS ix_users_updated_at ON users (updated_at)"))
+    db.execute(text("UPDATE users SET updated_at = created_at WHERE updated_at IS NULL"))
+    db.commit()
+
+def ensure_stage_timings_column(db: Session) -> None:
+    """
+    Add the per-stage delivery timings of notifications
+    """
+    db.execute(text("ALTER TABLE notifications ADD COLUMN IF NOT EXISTS stage_timings integer[]"))
+    db.commit()
+
+def ensure_template_columns(db: Session) -> None:
+    """
+    Add the registered template reference of notifications
+    """
+    db.execute(text("ALTER TABLE notifications ADD COLUMN IF NOT EXISTS template_id varchar(100)"))
+    db.execute(text("ALTER TABLE notifications ADD COLUMN IF NOT EXISTS template_version integer"))
+    db.commit()
+
+def ensure_cancelled_column(db: Session) -> None:
+    """
+    Add the cancellation time of notifications
+    """
+    db.execute(text("ALTER TABLE notifications ADD COLUMN IF NOT EXISTS cancelled_at timestamptz"))
+    db.commit()
+
+def ensure_notification_indexes(db: Session) -> None:
+    """
+    Create the notification indexes declared after the table was created
+
+    The composite index replaces the single-column user_id index of older schemas, which its
+    leading column already covers.
+    """
+    db.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_notifications_user_id_created_at "
+        "ON notifications (user_id, created_at)"
+    ))
+    db.execute(text("CREATE INDEX IF NOT EXISTS ix_notifications_created_at ON notifications (created_at)"))
+    db.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_notifications_queued_created_at "
+        "ON notifications (created_at) WHERE status = 'QUEUED'"
+    ))
+    db.execute(text("DROP INDEX IF EXISTS ix_notifications_user_id"))
+    db.commit()
@@ -1,13 +1,21 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.api_router import api_router
 from app.core.events import startup_event, shutdown_event
 from app.core.config import settings
+from app.core.logs import configure_logging
+from app.core.metrics import MetricsMiddleware, render_metrics, setup_db_timing
+from app.core.profiling import ProfilingMiddleware
+from app.db.database import SessionLocal
+from app.services.version_service import setup_version_tracking
 
 def create_application() -> FastAPI:
     """
     Create and configure the FastAPI application
     """
+    # JSON logs written by a background thread, off the request path
+    configure_logging()
+
     application = FastAPI(
         title=settings.PROJECT_NAME,
         description="An API for sending and managing notifications across multiple channels",
@@ -25,6 +33,18 @@ def create_application() -> FastAPI:
         allow_headers=["*"],
     )
 
+    # Request latency and DB time per route
+    if settings.METRICS_ENABLED:
+        setup_db_timing()
+        application.add_middleware(MetricsMiddleware)
+
+    # Per-user versions behind the notification list ETags
+    setup_version_tracking(SessionLocal)
+
+    # Per-request cProfile reports for admins, not installed at all unless enabled
+    if settings.PROFILING_ENABLED and settings.ADMIN_TOKEN:
+        application.add_middleware(ProfilingMiddleware)
+
     # Register event handlers
     application.add_event_handler("startup", startup_event)
     application.add_event_handler("shutdown", shutdown_event)
@@ -40,6 +60,13 @@ def create_application() -> FastAPI:
             "version": settings.VERSION
         }
 
+    if settings.METRICS_ENABLED:
+        @application.get("/metrics", include_in_schema=False)
+        def metrics():
+            # Sync handler: the backlog gauges query the broker and database off the event loop
+            content, content_type = render_metrics()
+            return Response(content=content, media_type=content_type)
+
     return application
 
 app = create_application()
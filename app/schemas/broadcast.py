@@ -0,0 +1,43 @@
+from pydantic import BaseModel, Field, UUID4
+from typing import List, Optional
+from datetime import datetime
+from enum import Enum
+
+from app.schemas.notification import NotificationMessage, NotificationPriority, NotificationType
+
+class BroadcastStatus(str, Enum):
+    RUNNING = "running"
+    PAUSED = "paused"
+    CANCELLED = "cancelled"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class SegmentDefinition(BaseModel):
+    """
+    Audience filters over User attributes; unset filters match every user
+    """
+    email_enabled: Optional[bool] = None
+    sms_enabled: Optional[bool] = None
+    in_app_enabled: Optional[bool] = None
+    has_phone: Optional[bool] = None
+    email_domain: Optional[str] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+
+class BroadcastCreate(BaseModel):
+    segment: SegmentDefinition = Field(default_factory=SegmentDefinition)
+    channels: List[NotificationType]
+    message: NotificationMessage
+    priority: NotificationPriority = NotificationPriority.LOW
+
+class BroadcastResponse(BaseModel):
+    broadcast_id: UUID4
+    status: BroadcastStatus
+    segment: SegmentDefinition
+    channels: List[NotificationType]
+    recipients_processed: int
+    notifications_created: int
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    version: Optional[str] = None
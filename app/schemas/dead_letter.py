@@ -0,0 +1,41 @@
+from pydantic import BaseModel, UUID4
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+
+from app.schemas.notification import NotificationType
+
+class DeadLetterEntry(BaseModel):
+    id: UUID4
+    notification_id: UUID4
+    user_id: Optional[UUID4] = None
+    channel: NotificationType
+    task_name: str
+    task_id: Optional[str] = None
+    error_class: str
+    error_message: Optional[str] = None
+    attempts: int
+    attempt_history: List[Dict[str, Any]]
+    failed_at: datetime
+    replayed_at: Optional[datetime] = None
+    replay_count: int
+
+    class Config:
+        orm_mode = True
+
+class DeadLetterList(BaseModel):
+    dead_letters: List[DeadLetterEntry]
+    next_cursor: Optional[str] = None
+    version: Optional[str] = None
+
+class DeadLetterReplayRequest(BaseModel):
+    # Every pending dead letter when no filter is given
+    channel: Optional[NotificationType] = None
+    error_class: Optional[str] = None
+    from_date: Optional[datetime] = None
+    to_date: Optional[datetime] = None
+
+class DeadLetterReplayResponse(BaseModel):
+    matched: int  # pending dead letters the replay covers
+    replay_task_id: Optional[str] = None
+    until: datetime  # later failures are left for another replay
+    version: Optional[str] = None
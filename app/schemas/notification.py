@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field, UUID4
-from typing import List, Optional, Dict
+from pydantic import BaseModel, Field, UUID4, conlist, root_validator
+from typing import Any, List, Optional, Dict
 from datetime import datetime
 from enum import Enum
 
@@ -27,9 +27,18 @@ class NotificationMessage(BaseModel):
 class NotificationCreate(BaseModel):
     user_id: UUID4
     channels: List[NotificationType]
-    message: NotificationMessage
+    message: Optional[NotificationMessage] = None
+    template_id: Optional[str] = None  # registered template rendered by workers, instead of message
     metadata: Optional[Dict] = {}
     schedule_time: Optional[datetime] = None
+    # Substituted into $placeholders of a message, or the variables of a template
+    template_vars: Optional[Dict[str, Any]] = None
+
+    @root_validator(skip_on_failure=True)
+    def check_content(cls, values):
+        if (values.get("message") is None) == (values.get("template_id") is None):
+            raise ValueError("Provide either message or template_id")
+        return values
 
 class NotificationResponse(BaseModel):
     notification_id: UUID4
@@ -62,3 +71,52 @@ class UserNotificationsResponse(BaseModel):
 
     class Config:
         orm_mode = True
+
+class NotificationSearchResult(NotificationDetail):
+    rank: float
+
+class NotificationSearchResponse(BaseModel):
+    user_id: UUID4
+    query: str
+    sort: str
+    notifications: List[NotificationSearchResult]
+    next_cursor: Optional[str] = None  # pass back as cursor for the next page
+    version: Optional[str] = None
+
+class BulkReadRequest(BaseModel):
+    notification_ids: conlist(UUID4, min_items=1, max_items=1000)
+
+class ReadAllRequest(BaseModel):
+    before: Optional[datetime] = None  # defaults to now
+
+class BulkReadResponse(BaseModel):
+    user_id: UUID4
+    updated: int
+    notification_ids: Optional[List[UUID4]] = None
+    version: Optional[str] = None
+
+class NotificationStatusBatchRequest(BaseModel):
+    notification_ids: Optional[List[UUID4]] = None  # up to STATUS_BATCH_MAX_IDS
+    broadcast_id: Optional[UUID4] = None  # every notification of a broadcast
+
+    @root_validator(skip_on_failure=True)
+    def check_selector(cls, values):
+        if (values.get("notification_ids") is None) == (values.get("broadcast_id") is None):
+            raise ValueError("Provide either notification_ids or broadcast_id")
+        return values
+
+class NotificationCancelBatchRequest(BaseModel):
+    notification_ids: Optional[List[UUID4]] = None  # up to CANCEL_BATCH_MAX_IDS
+    broadcast_id: Optional[UUID4] = None  # every pending notification of a broadcast
+
+    @root_validator(skip_on_failure=True)
+    def check_selector(cls, values):
+        if (values.get("notification_ids") is None) == (values.get("broadcast_id") is None):
+            raise ValueError("Provide either notification_ids or broadcast_id")
+        return values
+
+class NotificationCancelBatchResponse(BaseModel):
+    cancelled: int
+    notification_ids: Optional[List[UUID4]] = None  # not listed for broadcasts
+    broadcast_id: Optional[UUID4] = None
+    version: Optional[str] = None
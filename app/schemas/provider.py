@@ -0,0 +1,22 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from enum import Enum
+
+class CircuitStateName(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+class CircuitState(BaseModel):
+    provider: str
+    state: CircuitStateName
+    calls: int  # in the current failure window
+    failures: int
+    opened_at: Optional[float] = None  # Unix time
+    retry_after: Optional[float] = None  # seconds until half-open probing, when open
+    probes: Optional[int] = None  # in-flight probes, when half-open
+    successes: Optional[int] = None  # successful probes, when half-open
+
+class CircuitStates(BaseModel):
+    circuits: List[CircuitState]
+    version: Optional[str] = None
@@ -0,0 +1,21 @@
+from pydantic import BaseModel, UUID4, conlist
+from typing import Optional
+from datetime import datetime
+from enum import Enum
+
+class ReceiptSource(str, Enum):
+    IN_APP = "in-app"
+    EMAIL_OPEN = "email-open"
+
+class ReadReceipt(BaseModel):
+    notification_id: UUID4
+    user_id: UUID4
+    read_at: Optional[datetime] = None  # defaults to the time it is received
+    source: ReceiptSource = ReceiptSource.IN_APP
+
+class ReadReceiptBatch(BaseModel):
+    receipts: conlist(ReadReceipt, min_items=1, max_items=1000)
+
+class ReceiptsAccepted(BaseModel):
+    accepted: int
+    version: Optional[str] = None
@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+from datetime import datetime
+
+class StagePercentiles(BaseModel):
+    """
+    Latency percentiles of one stage, in milliseconds
+    """
+    p50: Optional[float] = None
+    p95: Optional[float] = None
+    p99: Optional[float] = None
+
+class LatencyGroup(BaseModel):
+    channel: str
+    priority: str
+    count: int
+    stages: Dict[str, StagePercentiles]
+
+class LatencyReport(BaseModel):
+    window_seconds: int
+    generated_at: datetime
+    groups: List[LatencyGroup]
+    version: Optional[str] = None
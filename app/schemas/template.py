@@ -0,0 +1,30 @@
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+
+from app.schemas.notification import NotificationType
+
+class TemplateCreate(BaseModel):
+    subject: str
+    body: str
+    html: bool = True  # escape variables in email bodies, other channels are never escaped
+
+class TemplateResponse(BaseModel):
+    template_id: str
+    version: int  # template version, every registration adds one
+    subject: str
+    body: str
+    html: bool
+    variables: List[str]
+    created_at: Optional[datetime] = None
+
+class TemplatePreviewRequest(BaseModel):
+    template_vars: Dict[str, Any] = {}
+    version: Optional[int] = None  # latest by default
+    type: NotificationType = NotificationType.EMAIL  # channel to render for
+
+class TemplatePreviewResponse(BaseModel):
+    template_id: str
+    version: int
+    subject: str
+    body: str
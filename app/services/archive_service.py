@@ -0,0 +1,312 @@
+import gzip
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import date, datetime, timezone
+from itertools import groupby
+from typing import BinaryIO, Dict, Iterator, List, Optional
+from uuid import UUID
+
+from sqlalchemy import String, cast, func, insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import ArchiveSegment, ArchiveUserRange, Notification, NotificationMessage
+from app.db.partitions import _add_months, _month_start
+from app.services.content_service import render_content
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FIELDS = (
+    "notification_id", "user_id", "type", "status", "priority", "subject", "body",
+    "template_id", "template_version", "broadcast_id", "retry_count",
+    "created_at", "updated_at", "delivered_at", "read_at",
+)
+
+# Rows fetched per round trip of the server-side cursor
+ARCHIVE_BATCH_SIZE = 1000
+
+class LocalArchiveStore:
+    """
+    Archive files in a local (or mounted network) directory
+    """
+    def __init__(self, root: str):
+        self.root = root
+
+    def put(self, key: str, fileobj: BinaryIO) -> None:
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written aside and renamed, so a crash never leaves a truncated segment under its key
+        with open(f"{path}.tmp", "wb") as output:
+            shutil.copyfileobj(fileobj, output)
+        os.replace(f"{path}.tmp", path)
+
+    def read(self, key: str, offset: int, length: int) -> bytes:
+        with open(os.path.join(self.root, key), "rb") as segment:
+            segment.seek(offset)
+            return segment.read(length)
+
+class S3ArchiveStore:
+    """
+    Archive files in an S3-compatible bucket, read back with range requests
+    """
+    def __init__(self, bucket: str, prefix: str = ""):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("s3:// archive URLs need boto3, install it with `pip install boto3`")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.client = boto3.client("s3", endpoint_url=settings.ARCHIVE_S3_ENDPOINT_URL)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def put(self, key: str, fileobj: BinaryIO) -> None:
+        self.client.upload_fileobj(fileobj, self.bucket, self._key(key))
+
+    def read(self, key: str, offset: int, length: int) -> bytes:
+        response = self.client.get_object(
+            Bucket=self.bucket, Key=self._key(key), Range=f"bytes={offset}-{offset + length - 1}"
+        )
+        return response["Body"].read()
+
+_archive_store = None
+
+def get_archive_store():
+    """
+    Get the archive store configured by ARCHIVE_URL for the current process
+    """
+    global _archive_store
+    if _archive_store is None:
+        if settings.ARCHIVE_URL.startswith("s3://"):
+            bucket, _, prefix = settings.ARCHIVE_URL[len("s3://"):].partition("/")
+            _archive_store = S3ArchiveStore(bucket, prefix)
+        else:
+            _archive_store = LocalArchiveStore(settings.ARCHIVE_URL)
+    return _archive_store
+
+def _utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def _month_bound(month: date) -> datetime:
+    return datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+class _SegmentWriter:
+    """
+    Builds one segment file: a gzip member per user, so each user's rows decompress on their own
+    """
+    def __init__(self, month: date, shard: int):
+        self.id = uuid.uuid4()
+        self.month = month
+        self.shard = shard
+        self.file = tempfile.TemporaryFile()
+        self.row_count = 0
+        self.ranges: List[Dict] = []
+
+    @property
+    def key(self) -> str:
+        return f"month={self.month:%Y-%m}/shard={self.shard:03d}/{self.id}.jsonl.gz"
+
+    def add_user(self, user_id: UUID, rows: List[Dict], first_created_at: datetime, last_created_at: datetime) -> None:
+        member = gzip.compress(
+            "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8"),
+            mtime=0
+        )
+        self.ranges.append({
+            "segment_id": self.id,
+            "user_id": user_id,
+            "offset": self.file.tell(),
+            "length": len(member),
+            "row_count": len(rows),
+            "first_created_at": first_created_at,
+            "last_created_at": last_created_at,
+        })
+        self.file.write(member)
+        self.row_count += len(rows)
+
+    def finish(self, db: Session, store) -> None:
+        """
+        Upload the file and record it in the index, in the caller's transaction
+        """
+        size = self.file.tell()
+        self.file.seek(0)
+        try:
+            store.put(self.key, self.file)
+        finally:
+            self.file.close()
+        db.execute(insert(ArchiveSegment.__table__).values(
+            id=self.id, path=self.key, month=self.month, shard=self.shard,
+            row_count=self.row_count, size_bytes=size
+        ))
+        db.execute(insert(ArchiveUserRange.__table__), self.ranges)
+
+def _archive_range(db: Session, store, month: date, lower: datetime, upper: datetime) -> Dict[str, int]:
+    # Stable per-user shard; the mask keeps hashtext's signed int non-negative
+    shard = func.hashtext(cast(Notification.user_id, String)).op("&")(0x7FFFFFFF) % settings.ARCHIVE_USER_SHARDS
+    rows = db.query(
+        shard,
+        Notification.user_id,
+        Notification.id,
+        Notification.type,
+        Notification.status,
+        Notification.priority,
+        func.coalesce(NotificationMessage.subject, Notification.subject),
+        func.coalesce(NotificationMessage.body, Notification.body),
+        Notification.template_vars,
+        Notification.template_id,
+        Notification.template_version,
+        Notification.broadcast_id,
+        Notification.retry_count,
+        Notification.created_at,
+        Notification.updated_at,
+        Notification.delivered_at,
+        Notification.read_at
+    ).outerjoin(
+        NotificationMessage, NotificationMessage.id == Notification.message_id
+    ).filter(
+        Notification.created_at >= lower,
+        Notification.created_at < upper
+    ).order_by(
+        shard, Notification.user_id, Notification.created_at
+    ).execution_options(stream_results=True).yield_per(ARCHIVE_BATCH_SIZE)
+
+    archived = segments = 0
+    for shard_number, shard_rows in groupby(rows, key=lambda row: row[0]):
+        writer = _SegmentWriter(month, shard_number)
+        for user_id, user_rows in groupby(shard_rows, key=lambda row: row[1]):
+            records, created = [], []
+            for (_, _, notification_id, type_, status, priority, subject, body, template_vars, template_id,
+                 template_version, broadcast_id, retry_count, created_at, updated_at, delivered_at, read_at) in user_rows:
+                try:
+                    subject, body = render_content(db, subject, body, template_vars, template_id, template_version, type_)
+                except Exception as e:
+                    logger.warning(f"Archiving notification {notification_id} unrendered: {str(e)}")
+                records.append({
+                    "notification_id": str(notification_id),
+                    "user_id": str(user_id),
+                    "type": type_.value if type_ else None,
+                    "status": status.value if status else None,
+                    "priority": priority.value if priority else None,
+                    "subject": subject,
+                    "body": body,
+                    "template_id": template_id,
+                    "template_version": template_version,
+                    "broadcast_id": str(broadcast_id) if broadcast_id else None,
+                    "retry_count": retry_count,
+                    "created_at": _iso(created_at),
+                    "updated_at": _iso(updated_at),
+                    "delivered_at": _iso(delivered_at),
+                    "read_at": _iso(read_at),
+                })
+                created.append(created_at)
+            writer.add_user(user_id, records, created[0], created[-1])
+            # Split at user boundaries only, a user's rows of the month stay in one member
+            if writer.row_count >= settings.ARCHIVE_SEGMENT_MAX_ROWS:
+                archived += writer.row_count
+                segments += 1
+                writer.finish(db, store)
+                writer = _SegmentWriter(month, shard_number)
+        if writer.ranges:
+            archived += writer.row_count
+            segments += 1
+            writer.finish(db, store)
+        else:
+            writer.file.close()
+    return {"rows": archived, "segments": segments}
+
+def archive_notifications(
+    db: Session,
+    before: datetime,
+    delete: bool = True,
+    skip_archived_months: bool = False
+) -> Dict[str, int]:
+    """
+    Move notifications created before a date into the archive, one month per transaction
+
+    Each month's files are uploaded first, then the index rows are inserted and (with delete)
+    the archived rows removed in a single commit. A failure leaves the month in the hot table,
+    at worst with unreferenced files in the store. With skip_archived_months, months that
+    already have segments are left alone (partitioned tables, whose months are dropped later).
+    """
+    before = _utc(before)
+    oldest = db.query(func.min(Notification.created_at)).filter(Notification.created_at < before).scalar()
+    result = {"rows": 0, "segments": 0, "months": 0}
+    if oldest is None:
+        return result
+
+    store = get_archive_store()
+    archived_months = set()
+    if skip_archived_months:
+        archived_months = {row[0] for row in db.query(ArchiveSegment.month).distinct()}
+
+    month = _month_start(oldest.astimezone(timezone.utc).date())
+    while _month_bound(month) < before:
+        next_month = _add_months(month, 1)
+        if month not in archived_months:
+            lower, upper = _month_bound(month), min(_month_bound(next_month), before)
+            try:
+                archived = _archive_range(db, store, month, lower, upper)
+                if delete:
+                    db.query(Notification).filter(
+                        Notification.created_at >= lower,
+                        Notification.created_at < upper
+                    ).delete(synchronize_session=False)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            logger.info(f"Archived {archived['rows']} notifications of {month:%Y-%m} in {archived['segments']} segments")
+            result["rows"] += archived["rows"]
+            result["segments"] += archived["segments"]
+            result["months"] += 1
+        month = next_month
+    return result
+
+def iter_archived_notifications(
+    db: Session,
+    user_id: UUID,
+    type_filter: Optional[str] = None,
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None
+) -> Iterator[dict]:
+    """
+    Yield a user's archived notifications, oldest first
+
+    The index narrows the read to the user's own gzip members of the overlapping months,
+    fetched by byte range, so nothing else in the archive is touched.
+    """
+    from_date = _utc(from_date) if from_date else None
+    to_date = _utc(to_date) if to_date else None
+
+    query = db.query(
+        ArchiveSegment.path, ArchiveUserRange.offset, ArchiveUserRange.length
+    ).join(
+        ArchiveSegment, ArchiveSegment.id == ArchiveUserRange.segment_id
+    ).filter(ArchiveUserRange.user_id == user_id)
+    if from_date:
+        query = query.filter(ArchiveUserRange.last_created_at >= from_date)
+    if to_date:
+        query = query.filter(ArchiveUserRange.first_created_at < to_date)
+    ranges = query.order_by(ArchiveUserRange.first_created_at).all()
+
+    store = get_archive_store()
+    for path, offset, length in ranges:
+        data = gzip.decompress(store.read(path, offset, length)).decode("utf-8")
+        # json.dumps escapes newlines, so "\n" only ever separates records
+        for line in data.split("\n"):
+            if not line:
+                continue
+            row = json.loads(line)
+            if type_filter and row["type"] != type_filter:
+                continue
+            created_at = datetime.fromisoformat(row["created_at"])
+            if (from_date and created_at < from_date) or (to_date and created_at >= to_date):
+                continue
+            yield row
@@ -0,0 +1,243 @@
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.db.models import NotificationType, User
+from app.services.version_service import PREFERENCE_VERSION_KEY
+
+logger = logging.getLogger(__name__)
+
+FLAGS = ("email_enabled", "sms_enabled", "in_app_enabled", "has_phone")
+
+# Flags a user needs for a channel to be deliverable
+CHANNEL_FLAGS = {
+    NotificationType.EMAIL: ("email_enabled",),
+    NotificationType.SMS: ("sms_enabled", "has_phone"),
+    NotificationType.IN_APP: ("in_app_enabled",),
+}
+
+_ONE = np.uint64(1)
+
+class Bitset:
+    """
+    Growable bitset backed by a uint64 NumPy array
+    """
+    def __init__(self):
+        self.words = np.zeros(0, dtype=np.uint64)
+
+    def grow(self, size: int) -> None:
+        needed = (size + 63) // 64
+        if needed > len(self.words):
+            words = np.zeros(max(needed, len(self.words) * 2), dtype=np.uint64)
+            words[:len(self.words)] = self.words
+            self.words = words
+
+    def assign(self, ordinals: np.ndarray, values: np.ndarray) -> None:
+        words = ordinals >> 6
+        masks = np.left_shift(_ONE, (ordinals & 63).astype(np.uint64))
+        np.bitwise_or.at(self.words, words[values], masks[values])
+        np.bitwise_and.at(self.words, words[~values], ~masks[~values])
+
+    def test(self, ordinals: np.ndarray) -> np.ndarray:
+        shifts = (ordinals & 63).astype(np.uint64)
+        return (np.right_shift(self.words[ordinals >> 6], shifts) & _ONE).astype(bool)
+
+class PreferenceIndex:
+    """
+    In-memory index of user preference flags for vectorized audience filtering
+
+    Each user gets a dense ordinal; every flag is a bitset over those ordinals. UUIDs are kept
+    as 16-byte keys in a sorted array (plus a small overlay of recent additions) so a chunk of
+    IDs is resolved to ordinals with one searchsorted call.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._ids = np.empty(0, dtype="S16")
+        self._size = 0
+        self._bits = {flag: Bitset() for flag in FLAGS}
+        self._sorted_ids = np.empty(0, dtype="S16")
+        self._sorted_ordinals = np.empty(0, dtype=np.int64)
+        self._pending: Dict[bytes, int] = {}
+        self._watermark: Optional[datetime] = None
+        self._refreshed_at = 0.0
+        self._version: Optional[bytes] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def loaded(self) -> bool:
+        return self._refreshed_at > 0
+
+    @staticmethod
+    def _keys(user_ids: Iterable) -> np.ndarray:
+        return np.array(
+            [(user_id if isinstance(user_id, uuid.UUID) else uuid.UUID(str(user_id))).bytes for user_id in user_ids],
+            dtype="S16"
+        )
+
+    def _lookup(self, keys: np.ndarray) -> np.ndarray:
+        ordinals = np.full(len(keys), -1, dtype=np.int64)
+        if len(self._sorted_ids) and len(keys):
+            positions = np.minimum(np.searchsorted(self._sorted_ids, keys), len(self._sorted_ids) - 1)
+            hits = self._sorted_ids[positions] == keys
+            ordinals[hits] = self._sorted_ordinals[positions[hits]]
+        if self._pending:
+            for i in np.flatnonzero(ordinals < 0):
+                ordinals[i] = self._pending.get(keys[i], -1)
+        return ordinals
+
+    def _rebuild(self) -> None:
+        order = np.argsort(self._ids[:self._size], kind="stable")
+        self._sorted_ids = self._ids[:self._size][order]
+        self._sorted_ordinals = order.astype(np.int64)
+        self._pending.clear()
+
+    def _upsert(self, rows: Sequence) -> None:
+        """
+        Insert or update (user_id, email_enabled, sms_enabled, in_app_enabled, has_phone) rows
+        """
+        if not rows:
+            return
+        keys = self._keys(row[0] for row in rows)
+        ordinals = self._lookup(keys)
+
+        new = np.flatnonzero(ordinals < 0)
+        if len(new):
+            start = self._size
+            self._size += len(new)
+            if self._size > len(self._ids):
+                ids = np.empty(max(self._size, len(self._ids) * 2), dtype="S16")
+                ids[:start] = self._ids[:start]
+                self._ids = ids
+            ordinals[new] = np.arange(start, self._size)
+            self._ids[start:self._size] = keys[new]
+            self._pending.update(zip(keys[new].tolist(), range(start, self._size)))
+            for bitset in self._bits.values():
+                bitset.grow(self._size)
+
+        for column, flag in enumerate(FLAGS, start=1):
+            values = np.fromiter((bool(row[column]) for row in rows), dtype=bool, count=len(rows))
+            self._bits[flag].assign(ordinals, values)
+
+        if len(self._pending) > max(10000, self._size // 10):
+            self._rebuild()
+
+    def _user_query(self, db: Session):
+        return db.query(
+            User.id, User.email_enabled, User.sms_enabled, User.in_app_enabled,
+            User.phone.isnot(None), func.coalesce(User.updated_at, User.created_at)
+        )
+
+    def refresh(self, db: Session) -> int:
+        """
+        Load users changed since the last refresh (all users on the first call)
+        """
+        with self._lock:
+            query = self._user_query(db)
+            if self._watermark is not None:
+                # updated_at is the writing transaction's start time, so a row can commit after a
+                # refresh already read past it. Re-reading a margin behind the watermark catches
+                # those; upserts are idempotent.
+                query = query.filter(
+                    User.updated_at >= self._watermark - timedelta(seconds=settings.PREFERENCE_INDEX_LAG_SECONDS)
+                )
+
+            watermark = self._watermark
+            loaded = 0
+            batch = []
+            for row in query.yield_per(settings.PREFERENCE_INDEX_BATCH_SIZE):
+                batch.append(row)
+                if row[5] is not None and (watermark is None or row[5] > watermark):
+                    watermark = row[5]
+                if len(batch) >= settings.PREFERENCE_INDEX_BATCH_SIZE:
+                    self._upsert(batch)
+                    loaded += len(batch)
+                    batch = []
+            self._upsert(batch)
+            loaded += len(batch)
+
+            self._rebuild()
+            self._watermark = watermark
+            self._refreshed_at = time.monotonic()
+            logger.info(f"Preference index refreshed with {loaded} users ({self._size} total)")
+            return loaded
+
+    def refresh_if_stale(self, db: Session) -> None:
+        """
+        Refresh when a preference change was published since the last refresh, or when the
+        refresh interval elapsed
+
+        Without Redis only the interval applies, so preferences are then at most
+        PREFERENCE_INDEX_REFRESH_SECONDS stale.
+        """
+        try:
+            version = get_redis().get(PREFERENCE_VERSION_KEY)
+        except Exception as e:
+            logger.warning(f"Failed to read the preference version: {str(e)}")
+            version = self._version
+        if version != self._version or time.monotonic() - self._refreshed_at >= settings.PREFERENCE_INDEX_REFRESH_SECONDS:
+            # Recorded before reading, so a change committed during the refresh triggers another
+            self._version = version
+            self.refresh(db)
+
+    def ensure_users(self, db: Session, user_ids: Sequence) -> None:
+        """
+        Load any of the given users that the index does not know yet
+        """
+        with self._lock:
+            missing = list({user_ids[i] for i in np.flatnonzero(self._lookup(self._keys(user_ids)) < 0)})
+            if missing:
+                self._upsert(self._user_query(db).filter(User.id.in_(missing)).all())
+
+    def matches(self, user_ids: Sequence, flags: Iterable[str]) -> np.ndarray:
+        """
+        Boolean mask of the users that have every given flag set; unknown users never match
+        """
+        with self._lock:
+            ordinals = self._lookup(self._keys(user_ids))
+            known = ordinals >= 0
+            mask = known.copy()
+            for flag in flags:
+                mask[known] &= self._bits[flag].test(ordinals[known])
+            return mask
+
+    def channel_mask(self, user_ids: Sequence, channel: NotificationType) -> np.ndarray:
+        """
+        Boolean mask of the users a channel can be delivered to
+        """
+        return self.matches(user_ids, CHANNEL_FLAGS[channel])
+
+    def filter(self, user_ids: Sequence, flags: Iterable[str]) -> List:
+        """
+        Keep the users that have every given flag set
+        """
+        mask = self.matches(user_ids, flags)
+        return [user_ids[i] for i in np.flatnonzero(mask)]
+
+    def members(self, flags: Iterable[str]) -> List[uuid.UUID]:
+        """
+        All indexed users that have every given flag set, using whole-word bitwise ANDs
+        """
+        with self._lock:
+            flags = list(flags)
+            if not flags:
+                return [uuid.UUID(bytes=key.ljust(16, b"\0")) for key in self._ids[:self._size].tolist()]
+            words = self._bits[flags[0]].words.copy()
+            for flag in flags[1:]:
+                words &= self._bits[flag].words
+            ordinals = np.flatnonzero(np.unpackbits(words.view(np.uint8), bitorder="little"))
+            ordinals = ordinals[ordinals < self._size]
+            return [uuid.UUID(bytes=key.ljust(16, b"\0")) for key in self._ids[ordinals].tolist()]
+
+# Create a singleton instance
+preference_index = PreferenceIndex()
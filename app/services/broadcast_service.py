@@ -0,0 +1,108 @@
+import json
+import logging
+import uuid
+from typing import Optional
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from app.db.models import Broadcast, BroadcastStatus, Notification, NotificationStatus
+from app.schemas.broadcast import BroadcastCreate
+from app.services.content_service import store_message
+from app.services.notification_service import CANCELLABLE_STATUSES
+from app.services.revocation_service import revocation_set
+from app.services.tasks.broadcast_tasks import run_broadcast
+from app.services.version_service import bump_global_version
+
+logger = logging.getLogger(__name__)
+
+# Allowed status changes: action -> (statuses it applies to, resulting status)
+BROADCAST_TRANSITIONS = {
+    "pause": ((BroadcastStatus.RUNNING,), BroadcastStatus.PAUSED),
+    "resume": ((BroadcastStatus.PAUSED,), BroadcastStatus.RUNNING),
+    "cancel": ((BroadcastStatus.RUNNING, BroadcastStatus.PAUSED), BroadcastStatus.CANCELLED),
+}
+
+def create_broadcast(db: Session, broadcast_data: BroadcastCreate) -> Broadcast:
+    """
+    Store a broadcast and start its fan-out
+    """
+    message_id = store_message(db, broadcast_data.message.subject, broadcast_data.message.body)
+    broadcast = Broadcast(
+        id=uuid.uuid4(),
+        segment=json.loads(broadcast_data.segment.json()),
+        channels=[channel.value for channel in broadcast_data.channels],
+        message_id=message_id,
+        priority=broadcast_data.priority,
+        status=BroadcastStatus.RUNNING,
+        recipients_processed=0,
+        notifications_created=0,
+    )
+    db.add(broadcast)
+    db.commit()
+
+    run_broadcast.delay(str(broadcast.id))
+    logger.info(f"Started broadcast {broadcast.id} to channels {broadcast.channels}")
+    return broadcast
+
+def get_broadcast(db: Session, broadcast_id: uuid.UUID) -> Optional[Broadcast]:
+    """
+    Get a broadcast by ID
+    """
+    return db.query(Broadcast).filter(Broadcast.id == broadcast_id).first()
+
+def change_broadcast_status(db: Session, broadcast: Broadcast, action: str) -> Broadcast:
+    """
+    Pause, resume or cancel a broadcast
+
+    Raises ValueError if the action does not apply to the broadcast's current status.
+    """
+    allowed_from, new_status = BROADCAST_TRANSITIONS[action]
+    # Lock the row so the change does not interleave with a fan-out chunk
+    db.refresh(broadcast, with_for_update=True)
+    if broadcast.status not in allowed_from:
+        db.rollback()
+        raise ValueError(f"Cannot {action} broadcast with status '{broadcast.status.value}'")
+
+    broadcast.status = new_status
+    db.commit()
+
+    if action == "resume":
+        # Continues from the saved cursor
+        run_broadcast.delay(str(broadcast.id))
+    logger.info(f"Broadcast {broadcast.id} is now {new_status.value}")
+    return broadcast
+
+def cancel_broadcast_deliveries(db: Session, broadcast_id: uuid.UUID) -> int:
+    """
+    Cancel every queued or sending notification of a broadcast, and return how many there were
+
+    Only the broadcast ID is revoked: its delivery tasks carry it, so workers drop all of them
+    with one lookup, however many are queued. Does not stop the fan-out, see cancel_broadcast.
+    """
+    revocation_set.revoke([broadcast_id])
+    result = db.execute(
+        update(Notification.__table__).where(
+            Notification.broadcast_id == broadcast_id,
+            Notification.status.in_(CANCELLABLE_STATUSES)
+        ).values(status=NotificationStatus.FAILED, cancelled_at=func.now(), updated_at=func.now())
+    )
+    db.commit()
+    # Too many users to bump one by one
+    bump_global_version()
+    logger.info(f"Cancelled {result.rowcount} notifications of broadcast {broadcast_id}")
+    return result.rowcount
+
+def cancel_broadcast(db: Session, broadcast: Broadcast) -> int:
+    """
+    Stop a broadcast's fan-out if it is still going and cancel its pending deliveries
+
+    Returns the number of notifications cancelled.
+    """
+    if broadcast.status in BROADCAST_TRANSITIONS["cancel"][0]:
+        try:
+            change_broadcast_status(db, broadcast, "cancel")
+        except ValueError:
+            # Completed or cancelled in the meantime
+            pass
+    return cancel_broadcast_deliveries(db, broadcast.id)
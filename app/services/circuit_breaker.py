@@ -0,0 +1,251 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Providers behind a breaker, named as in track_provider_call
+CIRCUIT_PROVIDERS = ("gmail", "twilio", "redis_pubsub")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Hash holding one provider's breaker, shared by every worker
+CIRCUIT_KEY = "circuit:{}"
+
+# Returns {allowed, milliseconds to wait}. An open circuit turns half-open once its open time
+# has passed; half-open admits a limited number of concurrent probes. Probes whose outcome never
+# came back (worker killed mid-call) are written off after another open period.
+_ALLOW = """
+local now, open_seconds, max_probes = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+if state == 'closed' then
+    return {1, 0}
+end
+if state == 'open' then
+    local wait = tonumber(redis.call('HGET', KEYS[1], 'opened_at') or '0') + open_seconds - now
+    if wait > 0 then
+        return {0, math.ceil(wait * 1000)}
+    end
+    redis.call('HSET', KEYS[1], 'state', 'half_open', 'probes', 0, 'successes', 0, 'probe_at', now)
+end
+local probes = tonumber(redis.call('HGET', KEYS[1], 'probes') or '0')
+local probe_at = tonumber(redis.call('HGET', KEYS[1], 'probe_at') or '0')
+if probes >= max_probes and now - probe_at >= open_seconds then
+    probes = 0
+end
+if probes < max_probes then
+    redis.call('HSET', KEYS[1], 'probes', probes + 1, 'probe_at', now)
+    return {1, 0}
+end
+return {0, math.ceil(math.max(probe_at + open_seconds - now, 1) * 1000)}
+"""
+
+# Gives back a half-open probe slot taken by a call that never reached the provider
+_RELEASE = """
+if redis.call('HGET', KEYS[1], 'state') == 'half_open' and tonumber(redis.call('HGET', KEYS[1], 'probes') or '0') > 0 then
+    redis.call('HINCRBY', KEYS[1], 'probes', -1)
+end
+return 1
+"""
+
+# Records a call outcome and returns the resulting state. Closed circuits count calls and
+# failures in a fixed window and open when both the failure count and rate thresholds are met.
+_RECORD = """
+local now, success = tonumber(ARGV[1]), ARGV[2] == '1'
+local threshold, rate, window, close_after = tonumber(ARGV[3]), tonumber(ARGV[4]), tonumber(ARGV[5]), tonumber(ARGV[6])
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+if state == 'half_open' then
+    if not success then
+        redis.call('HSET', KEYS[1], 'state', 'open', 'opened_at', now)
+        return 'open'
+    end
+    if redis.call('HINCRBY', KEYS[1], 'successes', 1) >= close_after then
+        redis.call('DEL', KEYS[1])
+        return 'closed'
+    end
+    if tonumber(redis.call('HGET', KEYS[1], 'probes') or '0') > 0 then
+        redis.call('HINCRBY', KEYS[1], 'probes', -1)
+    end
+    return 'half_open'
+end
+if state == 'open' then
+    return 'open'
+end
+if now - tonumber(redis.call('HGET', KEYS[1], 'window_start') or '0') > window then
+    redis.call('HSET', KEYS[1], 'window_start', now, 'calls', 0, 'failures', 0)
+end
+local calls = redis.call('HINCRBY', KEYS[1], 'calls', 1)
+if success then
+    return 'closed'
+end
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+if failures >= threshold and failures >= rate * calls then
+    redis.call('HSET', KEYS[1], 'state', 'open', 'opened_at', now)
+    return 'open'
+end
+return 'closed'
+"""
+
+def is_provider_outage(error: Exception) -> bool:
+    """
+    Whether an error points at the provider rather than at the request
+
+    Client errors (4xx other than 429, e.g. an invalid address) are the caller's problem and must
+    not open the circuit; timeouts, connection errors, 429 and 5xx responses are.
+    """
+    status = getattr(error, "status", None) or getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "resp", None), "status", None)
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return True
+    return not (400 <= status < 500 and status != 429)
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breakers with their state in Redis, so all workers trip and recover together
+
+    Redis errors never block deliveries: the breaker then lets every call through.
+    """
+    def __init__(self):
+        self._allow = None
+        self._record = None
+        self._release = None
+        # Providers whose call outcome this thread recorded since its last allow()
+        self._calls = threading.local()
+
+    def _recorded(self) -> set:
+        if not hasattr(self._calls, "providers"):
+            self._calls.providers = set()
+        return self._calls.providers
+
+    def _scripts(self):
+        if self._allow is None:
+            redis_client = get_redis()
+            self._record = redis_client.register_script(_RECORD)
+            self._release = redis_client.register_script(_RELEASE)
+            self._allow = redis_client.register_script(_ALLOW)
+        return self._allow, self._record
+
+    def allow(self, provider: str) -> Tuple[bool, float]:
+        """
+        Whether a call to the provider may go ahead, and if not the seconds until it may be retried
+        """
+        if not settings.CIRCUIT_BREAKER_ENABLED:
+            return True, 0.0
+        try:
+            allow, _ = self._scripts()
+            allowed, wait_ms = allow(
+                keys=[CIRCUIT_KEY.format(provider)],
+                args=[time.time(), settings.CIRCUIT_OPEN_SECONDS, settings.CIRCUIT_HALF_OPEN_PROBES]
+            )
+        except Exception as e:
+            logger.warning(f"Circuit breaker unavailable for {provider}, allowing the call: {str(e)}")
+            return True, 0.0
+        self._recorded().discard(provider)
+        return bool(allowed), int(wait_ms) / 1000
+
+    def release(self, provider: str) -> None:
+        """
+        Undo an allowed call that did not reach the provider after all (deferred, skipped), so
+        a half-open circuit does not wait out the open period for a probe that never runs
+        """
+        if not settings.CIRCUIT_BREAKER_ENABLED:
+            return
+        try:
+            self._scripts()
+            self._release(keys=[CIRCUIT_KEY.format(provider)])
+        except Exception as e:
+            logger.warning(f"Failed to release {provider} probe: {str(e)}")
+
+    def release_unless_called(self, provider: str) -> None:
+        """
+        Release the call allowed last in this thread if its provider call never happened
+
+        For the `finally` of a delivery: every exit before the provider call (missing rows,
+        lost claims, errors) then gives back its half-open probe slot.
+        """
+        if provider not in self._recorded():
+            self.release(provider)
+
+    def record(self, provider: str, success: bool) -> Optional[str]:
+        """
+        Record the outcome of a provider call and return the circuit state after it
+        """
+        if not settings.CIRCUIT_BREAKER_ENABLED:
+            return None
+        self._recorded().add(provider)
+        try:
+            _, record = self._scripts()
+            state = record(
+                keys=[CIRCUIT_KEY.format(provider)],
+                args=[
+                    time.time(), 1 if success else 0,
+                    settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_FAILURE_RATE,
+                    settings.CIRCUIT_WINDOW_SECONDS, settings.CIRCUIT_HALF_OPEN_PROBES,
+                ]
+            )
+        except Exception as e:
+            logger.warning(f"Failed to record {provider} call outcome: {str(e)}")
+            return None
+        state = state.decode() if isinstance(state, bytes) else state
+        if state == OPEN and not success:
+            logger.warning(f"Circuit for {provider} is open, calls fail fast for {settings.CIRCUIT_OPEN_SECONDS}s")
+        return state
+
+    @contextmanager
+    def track(self, provider: str) -> Iterator[None]:
+        """
+        Record the outcome of the provider call in the block; request errors count as successes
+        """
+        try:
+            yield
+        except Exception as e:
+            self.record(provider, not is_provider_outage(e))
+            raise
+        self.record(provider, True)
+
+    def state(self, provider: str) -> Dict:
+        """
+        Current state of a provider's circuit
+        """
+        values = {
+            key.decode(): value.decode()
+            for key, value in get_redis().hgetall(CIRCUIT_KEY.format(provider)).items()
+        }
+        state = values.get("state", CLOSED)
+        result = {
+            "provider": provider,
+            "state": state,
+            "calls": int(values.get("calls", 0)),
+            "failures": int(values.get("failures", 0)),
+            "opened_at": float(values["opened_at"]) if "opened_at" in values else None,
+            "retry_after": None,
+        }
+        if state == OPEN:
+            result["retry_after"] = max(result["opened_at"] + settings.CIRCUIT_OPEN_SECONDS - time.time(), 0.0)
+        elif state == HALF_OPEN:
+            result["probes"] = int(values.get("probes", 0))
+            result["successes"] = int(values.get("successes", 0))
+        return result
+
+    def states(self) -> List[Dict]:
+        return [self.state(provider) for provider in CIRCUIT_PROVIDERS]
+
+    def reset(self, provider: str) -> None:
+        """
+        Force a provider's circuit closed
+        """
+        get_redis().delete(CIRCUIT_KEY.format(provider))
+        logger.info(f"Circuit for {provider} reset to closed")
+
+# Create a singleton instance
+circuit_breaker = CircuitBreaker()
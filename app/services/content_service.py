@@ -0,0 +1,158 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from string import Template
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import Notification, NotificationMessage, NotificationType
+
+logger = logging.getLogger(__name__)
+
+class MessageCache:
+    """
+    Per-process LRU cache of message content, safe because messages are immutable
+
+    Also holds compiled template versions, which are immutable as well.
+    """
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, message_id: Hashable) -> Optional[Any]:
+        with self._lock:
+            content = self._items.get(message_id)
+            if content is not None:
+                self._items.move_to_end(message_id)
+            return content
+
+    def put(self, message_id: Hashable, content: Any) -> None:
+        with self._lock:
+            self._items[message_id] = content
+            self._items.move_to_end(message_id)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+message_cache = MessageCache(settings.MESSAGE_CACHE_SIZE)
+
+def message_hash(subject: str, body: str) -> str:
+    """
+    Content address of a message
+    """
+    digest = hashlib.sha256()
+    digest.update(subject.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(body.encode("utf-8"))
+    return digest.hexdigest()
+
+def store_message(db: Session, subject: str, body: str) -> str:
+    """
+    Store message content once and return its ID
+
+    Inserting content that already exists is a no-op, so a campaign writes its body a single time.
+    The row becomes visible with the caller's transaction.
+    """
+    return store_messages(db, [(subject, body)])[0]
+
+def store_messages(db: Session, contents: Iterable[Tuple[str, str]], batch_size: int = 500) -> List[str]:
+    """
+    Store many (subject, body) pairs with multi-row inserts and return their IDs in order
+    """
+    message_ids = []
+    rows = {}
+    for subject, body in contents:
+        message_id = message_hash(subject, body)
+        message_ids.append(message_id)
+        rows.setdefault(message_id, {"id": message_id, "subject": subject, "body": body})
+
+    rows = list(rows.values())
+    for start in range(0, len(rows), batch_size):
+        db.execute(
+            insert(NotificationMessage.__table__)
+            .values(rows[start:start + batch_size])
+            .on_conflict_do_nothing(index_elements=["id"])
+        )
+    return message_ids
+
+def prefetch_messages(db: Session, message_ids: Iterable[str]) -> None:
+    """
+    Load every uncached message of the given IDs with a single query
+    """
+    missing = {message_id for message_id in message_ids if message_id and message_cache.get(message_id) is None}
+    if not missing:
+        return
+    rows = db.query(
+        NotificationMessage.id, NotificationMessage.subject, NotificationMessage.body
+    ).filter(NotificationMessage.id.in_(missing)).all()
+    for message_id, subject, body in rows:
+        message_cache.put(message_id, (subject, body))
+
+def get_message_content(db: Session, message_id: str) -> Tuple[str, str]:
+    """
+    Get the (subject, body) of a stored message, served from the process cache when possible
+    """
+    content = message_cache.get(message_id)
+    if content is None:
+        prefetch_messages(db, [message_id])
+        content = message_cache.get(message_id)
+        if content is None:
+            raise LookupError(f"Message {message_id} not found")
+    return content
+
+def render_text(text: Optional[str], template_vars: Optional[Dict]) -> Optional[str]:
+    """
+    Substitute per-recipient $variables, leaving unknown placeholders untouched
+    """
+    if not text or not template_vars:
+        return text
+    return Template(text).safe_substitute(template_vars)
+
+def render_content(
+    db: Session,
+    subject: Optional[str],
+    body: Optional[str],
+    template_vars: Optional[Dict],
+    template_id: Optional[str] = None,
+    template_version: Optional[int] = None,
+    channel: Optional[NotificationType] = None
+) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Render content columns read in bulk, with notification_messages already joined in
+    """
+    if template_id is not None:
+        from app.services.template_service import render_template
+        return render_template(db, template_id, template_version, template_vars, html=channel == NotificationType.EMAIL)
+    return render_text(subject, template_vars), render_text(body, template_vars)
+
+def get_notification_content(db: Session, notification: Notification) -> Tuple[str, str]:
+    """
+    Get the rendered (subject, body) of a notification: templated, deduplicated or stored inline
+    """
+    if notification.template_id is not None:
+        # Imported here, template_service builds on this module's cache
+        from app.services.template_service import render_template
+        return render_template(
+            db, notification.template_id, notification.template_version, notification.template_vars,
+            html=notification.type == NotificationType.EMAIL
+        )
+    if notification.message_id is None:
+        return notification.subject, notification.body
+    subject, body = get_message_content(db, notification.message_id)
+    return (
+        render_text(subject, notification.template_vars),
+        render_text(body, notification.template_vars)
+    )
+
+def get_notifications_content(db: Session, notifications: List[Notification]) -> List[Tuple[str, str]]:
+    """
+    Get the rendered content of several notifications without a query per row
+    """
+    from app.services.template_service import prefetch_templates
+    prefetch_messages(db, [notification.message_id for notification in notifications])
+    prefetch_templates(db, [(notification.template_id, notification.template_version) for notification in notifications])
+    return [get_notification_content(db, notification) for notification in notifications]
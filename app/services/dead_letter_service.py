@@ -0,0 +1,251 @@
+import base64
+import json
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import String, any_, cast, func, select, tuple_, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import NOTIFICATIONS_DEAD_LETTERED
+from app.core.profiling import ProfiledTask
+from app.core.redis_client import get_redis
+from app.db.database import SessionLocal
+from app.db.leases import REQUEUE_COLUMNS
+from app.db.models import DeadLetter, Notification, NotificationStatus, NotificationType
+
+logger = logging.getLogger(__name__)
+
+# Failed attempts of one task run, buffered until it either succeeds or is dead-lettered
+ATTEMPTS_KEY = "task_attempts:{}"
+
+# Channel of each delivery task, by registered task name
+DELIVERY_CHANNELS = {
+    "send_email_notification": NotificationType.EMAIL,
+    "send_sms_notification": NotificationType.SMS,
+    "send_in_app_notification": NotificationType.IN_APP,
+}
+
+MAX_ERROR_LENGTH = 1000
+
+def _attempt(exc: BaseException, attempt: int) -> Dict:
+    return {
+        "at": datetime.utcnow().isoformat(),
+        "attempt": attempt,
+        "error_class": type(exc).__name__,
+        "error": str(exc)[:MAX_ERROR_LENGTH],
+    }
+
+class DeliveryTask(ProfiledTask):
+    """
+    Task base of the deliveries: profiled, and dead-lettered once its retries are used up
+
+    Each failed attempt is buffered in Redis under the task ID; the final failure stores the whole
+    history with the dead letter. Redis errors only cost the history of earlier attempts.
+    """
+    def on_retry(self, exc, task_id, args, kwargs, einfo):
+        try:
+            key = ATTEMPTS_KEY.format(task_id)
+            pipe = get_redis().pipeline(transaction=False)
+            pipe.rpush(key, json.dumps(_attempt(exc, self.request.retries + 1)))
+            pipe.expire(key, settings.TASK_ATTEMPT_HISTORY_TTL)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to record attempt of task {task_id}: {str(e)}")
+
+    def on_success(self, retval, task_id, args, kwargs):
+        # Only runs that were retried have a buffered history
+        if self.request.retries:
+            try:
+                get_redis().delete(ATTEMPTS_KEY.format(task_id))
+            except Exception as e:
+                logger.warning(f"Failed to drop attempts of task {task_id}: {str(e)}")
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        history = []
+        try:
+            key = ATTEMPTS_KEY.format(task_id)
+            pipe = get_redis().pipeline(transaction=False)
+            pipe.lrange(key, 0, -1)
+            pipe.delete(key)
+            history = [json.loads(entry) for entry in pipe.execute()[0]]
+        except Exception as e:
+            logger.warning(f"Failed to read attempts of task {task_id}: {str(e)}")
+        history.append(_attempt(exc, self.request.retries + 1))
+
+        notification_id = args[0] if args else kwargs.get("notification_id")
+        user_id = args[1] if len(args) > 1 else kwargs.get("user_id")
+        db = SessionLocal()
+        try:
+            record_dead_letter(db, self.name, task_id, notification_id, user_id, exc, history)
+        except Exception as e:
+            logger.error(f"Failed to dead-letter notification {notification_id}: {str(e)}")
+        finally:
+            db.close()
+
+def record_dead_letter(
+    db: Session,
+    task_name: str,
+    task_id: str,
+    notification_id: str,
+    user_id: Optional[str],
+    exc: BaseException,
+    history: List[Dict]
+) -> None:
+    """
+    Store or update the dead letter of a notification whose delivery used up its retries
+    """
+    channel = DELIVERY_CHANNELS[task_name]
+    error_class = type(exc).__name__
+    statement = insert(DeadLetter.__table__).values(
+        notification_id=UUID(str(notification_id)),
+        user_id=UUID(str(user_id)) if user_id else None,
+        channel=channel,
+        task_name=task_name,
+        task_id=task_id,
+        error_class=error_class,
+        error_message=str(exc)[:MAX_ERROR_LENGTH],
+        attempts=len(history),
+        attempt_history=history,
+        replay_count=0,
+    )
+    # A notification that dies again after a replay keeps one entry, with the new attempts appended
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[DeadLetter.notification_id],
+        set_={
+            "task_id": statement.excluded.task_id,
+            "error_class": statement.excluded.error_class,
+            "error_message": statement.excluded.error_message,
+            "attempts": statement.excluded.attempts,
+            "attempt_history": DeadLetter.attempt_history.op("||")(statement.excluded.attempt_history),
+            "failed_at": func.now(),
+            "replayed_at": None,
+        }
+    ))
+    db.commit()
+    NOTIFICATIONS_DEAD_LETTERED.labels(channel.value, error_class).inc()
+    logger.warning(f"Notification {notification_id} dead-lettered after {len(history)} attempts: {error_class}")
+
+def _filters(
+    channel: Optional[NotificationType] = None,
+    error_class: Optional[str] = None,
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+    include_replayed: bool = False
+) -> List:
+    filters = []
+    if not include_replayed:
+        filters.append(DeadLetter.replayed_at.is_(None))
+    if channel is not None:
+        filters.append(DeadLetter.channel == channel)
+    if error_class:
+        filters.append(DeadLetter.error_class == error_class)
+    if from_date:
+        filters.append(DeadLetter.failed_at >= from_date)
+    if to_date:
+        filters.append(DeadLetter.failed_at < to_date)
+    return filters
+
+def encode_dead_letter_cursor(failed_at: datetime, dead_letter_id: UUID) -> str:
+    return base64.urlsafe_b64encode(json.dumps([failed_at.isoformat(), str(dead_letter_id)]).encode()).decode()
+
+def decode_dead_letter_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """
+    Keyset values of a cursor, ValueError when it is malformed
+    """
+    try:
+        failed_at, dead_letter_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(failed_at), UUID(dead_letter_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid dead letter cursor: {str(e)}")
+
+def list_dead_letters(
+    db: Session,
+    channel: Optional[NotificationType] = None,
+    error_class: Optional[str] = None,
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+    include_replayed: bool = False,
+    limit: int = 50,
+    cursor: Optional[str] = None
+) -> Tuple[List[DeadLetter], Optional[str]]:
+    """
+    Dead letters matching the filters, most recent failure first, and the next page's cursor
+    """
+    query = db.query(DeadLetter).filter(*_filters(channel, error_class, from_date, to_date, include_replayed))
+    if cursor:
+        failed_at, dead_letter_id = decode_dead_letter_cursor(cursor)
+        query = query.filter(tuple_(DeadLetter.failed_at, DeadLetter.id) < tuple_(failed_at, dead_letter_id))
+    # One extra row tells whether there is a next page
+    entries = query.order_by(DeadLetter.failed_at.desc(), DeadLetter.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = encode_dead_letter_cursor(entries[-1].failed_at, entries[-1].id)
+    return entries, next_cursor
+
+def count_pending_dead_letters(db: Session, until: datetime, **filters) -> int:
+    """
+    Number of dead letters not yet replayed that match the filters and failed before `until`
+    """
+    return db.query(func.count(DeadLetter.id)).filter(*_filters(**filters), DeadLetter.failed_at <= until).scalar()
+
+def take_replay_batch(db: Session, until: datetime, batch_size: int, **filters) -> Tuple[int, List]:
+    """
+    Mark one batch of pending dead letters replayed and queue their notifications again
+
+    Returns the number of dead letters taken and the notification rows to publish, each with
+    a new task ID. Notifications that are no longer failed (delivered since, or removed by
+    retention) or were cancelled are not re-queued. Entries that failed after `until` are left for another replay,
+    so a replay never chases the failures it causes.
+    """
+    pending = select(DeadLetter.id).where(
+        *_filters(**filters), DeadLetter.failed_at <= until
+    ).order_by(DeadLetter.failed_at).limit(batch_size).with_for_update(skip_locked=True)
+    notification_ids = [row[0] for row in db.execute(
+        update(DeadLetter.__table__).where(DeadLetter.id.in_(pending)).values(
+            replayed_at=func.now(),
+            replay_count=DeadLetter.replay_count + 1
+        ).returning(DeadLetter.notification_id)
+    )]
+    rows = []
+    if notification_ids:
+        rows = db.execute(
+            update(Notification.__table__).where(
+                Notification.id == any_(cast(notification_ids, ARRAY(PG_UUID(as_uuid=True)))),
+                Notification.status == NotificationStatus.FAILED,
+                Notification.cancelled_at.is_(None)
+            ).values(
+                status=NotificationStatus.QUEUED,
+                task_id=cast(func.gen_random_uuid(), String),
+                claimed_until=None,
+                retry_count=0
+            ).returning(*REQUEUE_COLUMNS)
+        ).fetchall()
+    db.commit()
+    return len(notification_ids), rows
+
+def restore_dead_letters(db: Session, notification_ids: List[UUID]) -> None:
+    """
+    Undo take_replay_batch for notifications whose tasks could not be published
+    """
+    if not notification_ids:
+        return
+    ids = cast(list(notification_ids), ARRAY(PG_UUID(as_uuid=True)))
+    db.execute(
+        update(Notification.__table__).where(
+            Notification.id == any_(ids),
+            Notification.status == NotificationStatus.QUEUED
+        ).values(status=NotificationStatus.FAILED, task_id=None)
+    )
+    db.execute(
+        update(DeadLetter.__table__).where(DeadLetter.notification_id == any_(ids)).values(
+            replayed_at=None,
+            replay_count=DeadLetter.replay_count - 1
+        )
+    )
+    db.commit()
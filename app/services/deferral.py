@@ -0,0 +1,42 @@
+import logging
+import random
+
+from celery import Task
+
+from app.core.metrics import PRIORITY_HEADER, TASKS_DEFERRED
+from app.services.lifecycle_service import ENQUEUED_AT_HEADER
+
+logger = logging.getLogger(__name__)
+
+# Spread of re-published tasks, so deferred work does not return in one burst
+DEFER_JITTER = 0.2
+# Longer waits are re-checked instead: brokers cap how long a delivered message may stay
+# unacknowledged, and ETA tasks wait unacknowledged in the worker
+MAX_DEFER_SECONDS = 300
+
+def defer_task(task: Task, countdown: float, reason: str) -> str:
+    """
+    Publish the running task again to run after `countdown` seconds, and return its ID
+
+    The copy keeps the task ID, arguments, queue, headers and retry count, so deferring is
+    neither a retry nor a new notification. The current execution should return right after,
+    freeing the worker slot instead of sleeping in it.
+    """
+    request = task.request
+    headers = {}
+    for name in (PRIORITY_HEADER, ENQUEUED_AT_HEADER):
+        value = getattr(request, name, None)
+        if value is None:
+            value = (request.headers or {}).get(name)
+        if value is not None:
+            headers[name] = value
+
+    countdown = min(max(countdown, 0.1), MAX_DEFER_SECONDS) * (1 + random.uniform(0, DEFER_JITTER))
+    task.signature_from_request(
+        request,
+        countdown=countdown,
+        retries=request.retries,
+        headers=headers
+    ).apply_async()
+    TASKS_DEFERRED.labels(task.name, reason).inc()
+    return request.id
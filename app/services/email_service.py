@@ -2,12 +2,11 @@ import os
 import base64
 import logging
 import json
+import threading
 from email.mime.text import MIMEText
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
 from app.core.config import settings
+from app.core.metrics import track_provider_call
+from app.services.circuit_breaker import circuit_breaker
 
 logger = logging.getLogger(__name__)
 
@@ -15,44 +14,85 @@ logger = logging.getLogger(__name__)
 SCOPES = ['https://www.googleapis.com/auth/gmail.send']
 
 class EmailService:
+    """
+    Gmail API client, built on first use in the process that sends email
+
+    Boot does no network I/O: the client is created from the discovery document bundled with
+    google-api-python-client, and credentials come from GOOGLE_TOKEN_FILE. Creating that file
+    is an interactive step run once with `python -m app.services.email_service`.
+    """
     def __init__(self):
-        self.service = None
+        self._service = None
+        self._lock = threading.Lock()
         self.sender = settings.GMAIL_SENDER
 
+    def _load_credentials(self):
+        # Google client libraries are imported here, they are slow to import and only needed to send
+        from google.oauth2.credentials import Credentials
+        from google.auth.transport.requests import Request
+
+        if not os.path.exists(settings.GOOGLE_TOKEN_FILE):
+            raise RuntimeError(
+                f"{os.path.abspath(settings.GOOGLE_TOKEN_FILE)} not found, "
+                f"run `python -m app.services.email_service` to authorize Gmail"
+            )
+        with open(settings.GOOGLE_TOKEN_FILE) as token_file:
+            creds = Credentials.from_authorized_user_info(json.load(token_file), SCOPES)
+
+        if not creds.valid:
+            if not (creds.expired and creds.refresh_token):
+                raise RuntimeError(
+                    "Stored Gmail credentials are invalid, run `python -m app.services.email_service` to authorize"
+                )
+            creds.refresh(Request())
+            # Save the refreshed credentials for the next run
+            with open(settings.GOOGLE_TOKEN_FILE, 'w') as token:
+                token.write(creds.to_json())
+        return creds
+
+    @property
+    def service(self):
+        """
+        The Gmail API service, built on first access
+        """
+        if self._service is None:
+            with self._lock:
+                if self._service is None:
+                    from googleapiclient.discovery import build
+
+                    client_options = {"api_endpoint": settings.GMAIL_API_ENDPOINT} if settings.GMAIL_API_ENDPOINT else None
+                    self._service = build(
+                        'gmail', 'v1',
+                        credentials=self._load_credentials(),
+                        client_options=client_options,
+                        static_discovery=True,  # bundled document, no discovery request
+                        cache_discovery=False
+                    )
+                    logger.info("Gmail API service initialized successfully")
+        return self._service
+
     async def initialize(self):
         """
-        Initialize Gmail API service with OAuth2 credentials
+        Build the Gmail API service now instead of on the first send
         """
         try:
-            creds = None
-            # Check if token.json file exists with stored credentials
-            if os.path.exists(settings.GOOGLE_TOKEN_FILE):
-                creds = Credentials.from_authorized_user_info(
-                    json.load(open(settings.GOOGLE_TOKEN_FILE)), SCOPES)
-            else:
-                logger.warning(f"token.json not found. {os.path.abspath(settings.GOOGLE_TOKEN_FILE)}")
-            
-            # If no valid credentials available, let the user log in
-            if not creds or not creds.valid:
-                if creds and creds.expired and creds.refresh_token:
-                    creds.refresh(Request())
-                else:
-                    flow = InstalledAppFlow.from_client_secrets_file(
-                        settings.GOOGLE_CLIENT_SECRET_FILE, SCOPES)
-                    creds = flow.run_local_server(port=0)
-                
-                # Save the credentials for the next run
-                with open(settings.GOOGLE_TOKEN_FILE, 'w') as token:
-                    token.write(creds.to_json())
-            
-            # Build the Gmail API service
-            self.service = build('gmail', 'v1', credentials=creds)
-            logger.info("Gmail API service initialized successfully")
-            
+            self.service
         except Exception as e:
             logger.error(f"Error initializing Gmail API service: {str(e)}")
             raise
 
+    def authorize(self):
+        """
+        Run the interactive OAuth flow and store the credentials in GOOGLE_TOKEN_FILE
+        """
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
+        flow = InstalledAppFlow.from_client_secrets_file(settings.GOOGLE_CLIENT_SECRET_FILE, SCOPES)
+        creds = flow.run_local_server(port=0)
+        with open(settings.GOOGLE_TOKEN_FILE, 'w') as token:
+            token.write(creds.to_json())
+        logger.info(f"Stored Gmail credentials in {os.path.abspath(settings.GOOGLE_TOKEN_FILE)}")
+
     def send_email(self, to_email: str, subject: str, body: str) -> bool:
         """
         Send an email notification using Gmail API
@@ -66,8 +106,10 @@ class EmailService:
             bool: True if email was sent successfully, False otherwise
         """
         try:
-            if not self.service:
-                logger.error("Gmail API service not initialized")
+            try:
+                service = self.service
+            except Exception as e:
+                logger.error(f"Gmail API service not initialized: {str(e)}")
                 return False
                 
             # Create message
@@ -83,8 +125,9 @@ class EmailService:
             message_body = {'raw': encoded_message}
             
             # Send message
-            sent_message = self.service.users().messages().send(
-                userId='me', body=message_body).execute()
+            with track_provider_call("gmail"), circuit_breaker.track("gmail"):
+                sent_message = service.users().messages().send(
+                    userId='me', body=message_body).execute()
             
             logger.info(f"Email sent to {to_email}, Message ID: {sent_message['id']}")
             return True
@@ -95,3 +138,7 @@ class EmailService:
 
 # Create a singleton instance
 email_service = EmailService()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    email_service.authorize()
@@ -1,8 +1,10 @@
 import logging
 from typing import Dict, Any
 import json
-import aioredis  # For WebSocket broadcasting via Redis
 from app.core.config import settings
+from app.core.metrics import track_provider_call
+from app.services.circuit_breaker import circuit_breaker
+from app.core.redis_client import get_redis
 
 logger = logging.getLogger(__name__)
 
@@ -13,7 +15,9 @@ class InAppNotificationService:
     async def initialize(self):
         """Initialize Redis connection for pub/sub"""
         if not self.redis:
-            self.redis = await aioredis.create_redis_pool("redis://redis:6379")
+            # For WebSocket broadcasting via Redis; imported here as it is slow to import
+            import aioredis
+            self.redis = await aioredis.create_redis_pool(settings.REDIS_URL)
     
     def send_in_app_notification(self, user_id: str, notification: Dict[str, Any]) -> bool:
         """
@@ -27,18 +31,18 @@ class InAppNotificationService:
             bool: True if notification was published successfully, False otherwise
         """
         try:
-            import redis
-            # Use synchronous Redis client for Celery tasks
-            r = redis.Redis(host='redis', port=6379, db=0)
+            # Use the shared synchronous Redis client for Celery tasks
+            r = get_redis()
             
             # Channel name for the specific user
             channel_name = f"user:{user_id}:notifications"
             
             # Publish notification
-            r.publish(
-                channel_name, 
-                json.dumps(notification)
-            )
+            with track_provider_call("redis_pubsub"), circuit_breaker.track("redis_pubsub"):
+                r.publish(
+                    channel_name, 
+                    json.dumps(notification)
+                )
             
             logger.info(f"In-app notification sent to user {user_id}")
             return True
@@ -0,0 +1,160 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import array
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.db.models import Notification, NotificationStatus
+
+logger = logging.getLogger(__name__)
+
+# Message header with the publish time (epoch seconds) of a delivery task
+ENQUEUED_AT_HEADER = "enqueued_at"
+
+# Order of the millisecond offsets (from created_at) stored in Notification.stage_timings
+LIFECYCLE_STAGES = ("enqueued", "picked_up", "provider_start", "provider_end", "committed")
+
+# Reported spans as (from, to) stage positions; 0 is created_at itself
+STAGE_SPANS = {
+    "dispatch": (0, 1),  # created -> published to the broker
+    "queue_wait": (1, 2),  # published -> picked up by a worker
+    "claim": (2, 3),  # row loads and SENDING commit before the provider call
+    "provider": (3, 4),  # provider request
+    "commit": (4, 5),  # provider response -> final status written
+    "total": (0, 5),
+}
+
+PERCENTILES = (0.5, 0.95, 0.99)
+
+_MAX_OFFSET_MS = 2 ** 31 - 1  # int4 bound, reached by notifications scheduled weeks ahead
+
+class DeliveryTimer:
+    """
+    Collects the lifecycle timestamps of one delivery task execution
+    """
+    def __init__(self, request):
+        self.times: Dict[str, Optional[float]] = dict.fromkeys(LIFECYCLE_STAGES)
+        self.times["picked_up"] = time.time()
+        enqueued_at = getattr(request, ENQUEUED_AT_HEADER, None)
+        if enqueued_at is None:
+            enqueued_at = (getattr(request, "headers", None) or {}).get(ENQUEUED_AT_HEADER)
+        self.times["enqueued"] = float(enqueued_at) if enqueued_at is not None else None
+
+    @property
+    def provider_called(self) -> bool:
+        return self.times["provider_start"] is not None
+
+    @contextmanager
+    def provider_call(self) -> Iterator[None]:
+        self.times["provider_start"] = time.time()
+        try:
+            yield
+        finally:
+            self.times["provider_end"] = time.time()
+
+    def stamp(self, notification: Notification) -> None:
+        """
+        Store the offsets on the notification, right before its final status commit
+        """
+        self.times["committed"] = time.time()
+        created = notification.created_at.timestamp() if notification.created_at else None
+        notification.stage_timings = [
+            min(int((self.times[stage] - created) * 1000), _MAX_OFFSET_MS)
+            if created is not None and self.times[stage] is not None else None
+            for stage in LIFECYCLE_STAGES
+        ]
+
+def _span(start: int, end: int):
+    end_offset = Notification.stage_timings[end]
+    return end_offset if start == 0 else end_offset - Notification.stage_timings[start]
+
+def compute_latency_report(db: Session, window_seconds: int) -> Dict:
+    """
+    Percentiles of every stage span per channel and priority, over delivered notifications
+    created in the last `window_seconds`
+    """
+    columns = [Notification.type, Notification.priority, func.count()]
+    for start, end in STAGE_SPANS.values():
+        columns.append(func.percentile_cont(array(PERCENTILES)).within_group(_span(start, end)))
+
+    rows = db.query(*columns).filter(
+        Notification.created_at >= datetime.utcnow() - timedelta(seconds=window_seconds),
+        Notification.stage_timings.isnot(None),
+        Notification.status.in_([NotificationStatus.DELIVERED, NotificationStatus.READ])
+    ).group_by(Notification.type, Notification.priority).all()
+
+    groups = []
+    for channel, priority, count, *values in rows:
+        groups.append({
+            "channel": getattr(channel, "value", channel),
+            "priority": getattr(priority, "value", priority),
+            "count": count,
+            "stages": {
+                stage: dict(zip(("p50", "p95", "p99"), [round(v, 1) for v in value] if value else [None] * 3))
+                for stage, value in zip(STAGE_SPANS, values)
+            },
+        })
+
+    return {
+        "window_seconds": window_seconds,
+        "generated_at": datetime.utcnow().isoformat(),
+        "groups": groups,
+    }
+
+def _cache_key(window_seconds: int) -> str:
+    return f"latency_report:{window_seconds}"
+
+def _refresh_interval(window_seconds: int) -> float:
+    # Long windows barely move between runs: a day's report is recomputed every 72 minutes by default
+    return max(settings.LATENCY_REPORT_INTERVAL, window_seconds * settings.LATENCY_REPORT_REFRESH_FRACTION)
+
+def _is_fresh(window_seconds: int, now: datetime) -> bool:
+    try:
+        cached = get_redis().get(_cache_key(window_seconds))
+    except Exception as e:
+        logger.warning(f"Failed to read cached latency report: {str(e)}")
+        return False
+    if not cached:
+        return False
+    age = now - datetime.fromisoformat(json.loads(cached)["generated_at"])
+    # Half a beat interval of slack, so a run landing just early does not postpone the refresh by a whole interval
+    return age < timedelta(seconds=_refresh_interval(window_seconds) - settings.LATENCY_REPORT_INTERVAL / 2)
+
+def refresh_latency_reports(db: Session) -> List[Dict]:
+    """
+    Recompute the reports of the configured windows that are due and cache them in Redis
+
+    The shortest windows are recomputed on every run, longer ones once their report is older
+    than LATENCY_REPORT_REFRESH_FRACTION of the window. Returns the recomputed reports.
+    """
+    reports = []
+    now = datetime.utcnow()
+    for window in settings.LATENCY_REPORT_WINDOWS:
+        if _is_fresh(window, now):
+            continue
+        report = compute_latency_report(db, window)
+        try:
+            get_redis().set(_cache_key(window), json.dumps(report, default=str), ex=int(_refresh_interval(window) * 3))
+        except Exception as e:
+            logger.warning(f"Failed to cache latency report for window {window}s: {str(e)}")
+        reports.append(report)
+    return reports
+
+def get_latency_report(db: Session, window_seconds: int) -> Dict:
+    """
+    Latest report of a window, computed on demand when the cache is cold
+    """
+    try:
+        cached = get_redis().get(_cache_key(window_seconds))
+        if cached:
+            return json.loads(cached)
+    except Exception as e:
+        logger.warning(f"Failed to read cached latency report: {str(e)}")
+    return compute_latency_report(db, window_seconds)
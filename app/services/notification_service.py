@@ -1,15 +1,28 @@
+from celery import group
+from sqlalchemy import any_, cast, func, update
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
 from sqlalchemy.orm import Session
-from typing import List, Optional, Tuple
+from typing import Iterator, List, Optional, Tuple
+import time
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 from sqlalchemy.exc import SQLAlchemyError
 from fastapi import HTTPException
 
 import logging
 
+from app.core.config import settings
+from app.core.metrics import PRIORITY_HEADER
+from app.db.leases import clear_task_ids
 from app.db.models import Notification, User, NotificationStatus, NotificationType
+from app.db.replicas import mark_recent_write
 from app.schemas.notification import NotificationCreate
+from app.services.content_service import store_message
+from app.services.lifecycle_service import ENQUEUED_AT_HEADER
+from app.services.revocation_service import revocation_set
+from app.services.template_service import TemplateError, resolve_template
+from app.services.version_service import bump_user_versions
 from app.services.tasks.notification_tasks import (
     send_email_notification,
     send_sms_notification,
@@ -18,6 +31,68 @@ from app.services.tasks.notification_tasks import (
 
 logger = logging.getLogger(__name__)
 
+DELIVERY_TASKS = {
+    NotificationType.EMAIL: send_email_notification,
+    NotificationType.SMS: send_sms_notification,
+    NotificationType.IN_APP: send_in_app_notification,
+}
+
+def queue_notification(notification: Notification, eta: Optional[datetime] = None) -> Optional[str]:
+    """
+    Queue the delivery task of a stored notification and return the Celery task ID
+
+    The payload only carries IDs; workers load the content by message or template ID from their cache.
+    A task_id already assigned to the notification is reused, so it can be stored up front.
+    """
+    kwargs = {"message_id": notification.message_id, "template_id": notification.template_id}
+    options = {}
+    if getattr(notification, "broadcast_id", None):
+        # Broadcast deliveries stay revocable by broadcast and off the transactional queues
+        kwargs["broadcast_id"] = str(notification.broadcast_id)
+        options["queue"] = settings.BROADCAST_QUEUE
+    task = DELIVERY_TASKS[notification.type].apply_async(
+        args=[str(notification.id), str(notification.user_id)],
+        kwargs=kwargs,
+        eta=eta,
+        task_id=notification.task_id,
+        headers={
+            PRIORITY_HEADER: getattr(notification.priority, "value", notification.priority),
+            ENQUEUED_AT_HEADER: time.time(),
+        },
+        **options
+    )
+    return task.id
+
+def queue_notifications(notifications: List, queue: Optional[str] = None) -> None:
+    """
+    Publish the delivery tasks of many stored notifications as one batch, under their assigned task IDs
+
+    Rows only need the attributes queue_notification reads, e.g. app.db.leases.REQUEUE_COLUMNS.
+    """
+    enqueued_at = time.time()
+    signatures = []
+    for notification in notifications:
+        kwargs = {"message_id": notification.message_id, "template_id": notification.template_id}
+        if notification.broadcast_id:
+            kwargs["broadcast_id"] = str(notification.broadcast_id)
+        signature = DELIVERY_TASKS[notification.type].signature(
+            args=[str(notification.id), str(notification.user_id)],
+            kwargs=kwargs
+        ).set(
+            task_id=notification.task_id,
+            headers={
+                PRIORITY_HEADER: getattr(notification.priority, "value", notification.priority),
+                ENQUEUED_AT_HEADER: enqueued_at,
+            }
+        )
+        if queue:
+            signature.set(queue=queue)
+        elif notification.broadcast_id:
+            signature.set(queue=settings.BROADCAST_QUEUE)
+        signatures.append(signature)
+    if signatures:
+        group(signatures).apply_async()
+
 def create_notification(
     db: Session, 
     notification_data: NotificationCreate
@@ -25,13 +100,36 @@ def create_notification(
     """
     Create notifications and queue them using Celery tasks
     """
+    schedule_time = notification_data.schedule_time
+    if schedule_time is not None:
+        # Cancellations are only remembered for the schedule horizon
+        if schedule_time.tzinfo is None:
+            schedule_time = schedule_time.replace(tzinfo=timezone.utc)
+        if schedule_time > datetime.now(timezone.utc) + timedelta(days=settings.SCHEDULE_HORIZON_DAYS):
+            raise HTTPException(
+                status_code=400,
+                detail=f"schedule_time must be within {settings.SCHEDULE_HORIZON_DAYS} days"
+            )
+    
+    template_id = template_version = None
+    if notification_data.template_id is not None:
+        # Pin the current version, workers render it with the recipient's variables at send time
+        try:
+            template_id, template_version = resolve_template(
+                db, notification_data.template_id, notification_data.template_vars
+            )
+        except LookupError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except TemplateError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
     try:
         # Check if user exists
         user = db.query(User).filter(User.id == notification_data.user_id).first()
         if not user:
             # raise ValueError(f"User with ID {notification_data.user_id} not found")
             # Create new user if doesn't exist
-            logger.info(f"User with ID {notification_data.user_id} not found, creating new user")
+            logger.info("User with ID %s not found, creating new user", notification_data.user_id)
             
             # Generate default email from user_id if not provided
             default_email = f"user_{str(notification_data.user_id)}@example.com"
@@ -49,11 +147,18 @@ def create_notification(
             # Add to database
             db.add(user)
             db.flush()  # Flush to get the ID without committing transaction
-            logger.info(f"Created new user with ID {user.id}")
+            logger.info("Created new user with ID %s", user.id)
         
         notification_records = []
         task_ids = []
         
+        # Every channel of the send shares one deduplicated copy of the content
+        message_id = None
+        if notification_data.message is not None:
+            message_id = store_message(
+                db, notification_data.message.subject, notification_data.message.body
+            )
+        
         for channel in notification_data.channels:
             # Check if the channel is enabled for the user
             if channel == NotificationType.EMAIL and not user.email_enabled:
@@ -63,57 +168,56 @@ def create_notification(
             if channel == NotificationType.IN_APP and not user.in_app_enabled:
                 continue
             
-            # Create notification record
+            # Create notification record, with its task ID assigned up front so it is stored
+            # in the same commit as the notification
             notification = Notification(
                 id=uuid.uuid4(),
                 user_id=user.id,
                 type=channel,
-                subject=notification_data.message.subject,
-                body=notification_data.message.body,
+                message_id=message_id,
+                template_id=template_id,
+                template_version=template_version,
+                template_vars=notification_data.template_vars,
                 status=NotificationStatus.QUEUED,
                 priority=notification_data.metadata.get("priority", "medium"),
+                task_id=str(uuid.uuid4()),
             )
-            
-            db.add(notification)
             notification_records.append(notification)
+        
+        # One batched insert; the records stay detached, so queueing them after the commit
+        # does not reload every row
+        db.bulk_save_objects(notification_records)
+        user_id = user.id
     
     except SQLAlchemyError as e:  # More specific database exception
-        logger.error(f"Database error: {str(e)}")
+        logger.error("Database error: %s", e)
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
+        logger.error("Unexpected error: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error occurred")
     
     db.commit()
     
     # Queue notifications using Celery tasks
+    unqueued = []
     for notification in notification_records:
         try:
-            task = None
-            if notification.type == NotificationType.EMAIL:
-                task = send_email_notification.apply_async(
-                    args=[str(notification.id), str(user.id), notification.subject, notification.body],
-                    eta=notification_data.schedule_time
-                )
-            elif notification.type == NotificationType.SMS:
-                task = send_sms_notification.apply_async(
-                    args=[str(notification.id), str(user.id), notification.body],
-                    eta=notification_data.schedule_time
-                )
-            elif notification.type == NotificationType.IN_APP:
-                task = send_in_app_notification.apply_async(
-                    args=[str(notification.id), str(user.id), notification.subject, notification.body],
-                    eta=notification_data.schedule_time
-                )
-                
-            if task:
-                notification.task_id = task.id
-                task_ids.append(task.id)
+            task_ids.append(queue_notification(notification, eta=notification_data.schedule_time))
         except Exception as e:
-            logger.error(f"Failed to queue task for notification {notification.id}: {str(e)}")
+            logger.error(
+                "Failed to queue task for notification %s: %s", notification.id, e,
+                extra={"notification_id": notification.id, "user_id": notification.user_id}
+            )
+            unqueued.append(notification.id)
     
-    # Commit task IDs back to the database
-    db.commit()
+    # Only notifications that never reached the broker lose their task ID, the reaper queues them later
+    clear_task_ids(db, unqueued)
+    
+    # Keep the sender's follow-up reads on the primary until replicas catch up (bumping the
+    # user's version pins the user itself)
+    mark_recent_write(*[notification.id for notification in notification_records])
+    if notification_records:
+        bump_user_versions([user_id])
     
     return notification_records[0].id if notification_records else None, "queued", task_ids[0] if task_ids else None
 
@@ -123,13 +227,46 @@ def get_notification_by_id(db: Session, notification_id: uuid.UUID) -> Optional[
     """
     return db.query(Notification).filter(Notification.id == notification_id).first()
 
+# Columns returned by the batch status lookups
+STATUS_COLUMNS = (
+    Notification.id,
+    Notification.type,
+    Notification.status,
+    Notification.created_at,
+    Notification.delivered_at,
+    Notification.read_at,
+    Notification.cancelled_at,
+)
+
+def get_notification_statuses(db: Session, notification_ids: List[uuid.UUID]) -> List[Tuple]:
+    """
+    Get the status columns of many notifications with one `id = ANY(:ids)` query
+
+    The IDs travel as a single array parameter, so every batch size shares one statement.
+    """
+    if not notification_ids:
+        return []
+    return db.query(*STATUS_COLUMNS).filter(
+        Notification.id == any_(cast(list(notification_ids), ARRAY(UUID(as_uuid=True))))
+    ).all()
+
+def iter_broadcast_statuses(db: Session, broadcast_id: uuid.UUID, batch_size: int = 1000) -> Iterator[Tuple]:
+    """
+    Stream the status columns of every notification of a broadcast through a server-side cursor
+    """
+    return db.query(*STATUS_COLUMNS).filter(
+        Notification.broadcast_id == broadcast_id
+    ).execution_options(stream_results=True).yield_per(batch_size)
+
 def get_user_notifications(
     db: Session, 
     user_id: uuid.UUID, 
     status_filter: str = "all",
     type_filter: str = "all",
     page: int = 1, 
-    limit: int = 20
+    limit: int = 20,
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None
 ) -> Tuple[List[Notification], int, int]:
     """
     Get notifications for a specific user with pagination and filtering
@@ -143,17 +280,23 @@ def get_user_notifications(
     if type_filter != "all":
         query = query.filter(Notification.type == type_filter)
     
-    # Sort by created_at descending (newest first)
-    query = query.order_by(Notification.created_at.desc())
+    # Date bounds on created_at let Postgres prune partitions outside the range
+    if from_date:
+        query = query.filter(Notification.created_at >= from_date)
     
-    # Count total for pagination
+    if to_date:
+        query = query.filter(Notification.created_at < to_date)
+    
+    # Count total for pagination (before ordering, the sort is not needed for a count)
     total = query.count()
     
     # Calculate total pages
     pages = (total + limit - 1) // limit
     
-    # Apply pagination
-    notifications = query.offset((page - 1) * limit).limit(limit).all()
+    # Sort by created_at descending (newest first) and apply pagination
+    notifications = query.order_by(
+        Notification.created_at.desc()
+    ).offset((page - 1) * limit).limit(limit).all()
     
     return notifications, total, pages
 
@@ -190,3 +333,82 @@ def mark_notification_as_read(db: Session, notification_id: uuid.UUID) -> bool:
     
     db.commit()
     return True
+
+def mark_notifications_as_read(db: Session, user_id: uuid.UUID, notification_ids: List[uuid.UUID]) -> List[uuid.UUID]:
+    """
+    Mark delivered notifications of a user as read with one UPDATE and return the IDs changed
+
+    IDs of other users, unknown IDs and notifications not delivered yet are left untouched.
+    """
+    if not notification_ids:
+        return []
+    result = db.execute(
+        update(Notification)
+        .where(
+            Notification.user_id == user_id,
+            Notification.id.in_(notification_ids),
+            Notification.status == NotificationStatus.DELIVERED
+        )
+        .values(status=NotificationStatus.READ, read_at=func.now(), updated_at=func.now())
+        .returning(Notification.id)
+        .execution_options(synchronize_session=False)
+    )
+    updated = [row[0] for row in result]
+    db.commit()
+    if updated:
+        mark_recent_write(*updated)
+        bump_user_versions([user_id])
+    return updated
+
+def mark_all_notifications_as_read(db: Session, user_id: uuid.UUID, before: datetime) -> int:
+    """
+    Mark every delivered notification of a user created before a timestamp as read, in one UPDATE
+    """
+    result = db.execute(
+        update(Notification)
+        .where(
+            Notification.user_id == user_id,
+            Notification.created_at < before,
+            Notification.status == NotificationStatus.DELIVERED
+        )
+        .values(status=NotificationStatus.READ, read_at=func.now(), updated_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    if result.rowcount:
+        bump_user_versions([user_id])
+    return result.rowcount
+
+# Statuses a notification can be cancelled in
+CANCELLABLE_STATUSES = (NotificationStatus.QUEUED, NotificationStatus.SENDING)
+
+def cancel_notifications(db: Session, notification_ids: List[uuid.UUID]) -> List[uuid.UUID]:
+    """
+    Cancel the given notifications that are still queued or sending, and return their IDs
+
+    The IDs are revoked before the status change commits, so their queued (or scheduled) tasks
+    are dropped by workers before claiming them. A send already past that check still goes out.
+    Raises if the revocation cannot be stored; nothing is changed then.
+    """
+    if not notification_ids:
+        return []
+    rows = db.execute(
+        update(Notification.__table__).where(
+            Notification.id == any_(cast(list(notification_ids), ARRAY(UUID(as_uuid=True)))),
+            Notification.status.in_(CANCELLABLE_STATUSES)
+        ).values(status=NotificationStatus.FAILED, cancelled_at=func.now(), updated_at=func.now()).returning(
+            Notification.id, Notification.user_id
+        )
+    ).fetchall()
+    try:
+        revocation_set.revoke(row.id for row in rows)
+    except Exception:
+        db.rollback()
+        raise
+    db.commit()
+    
+    cancelled = [row.id for row in rows]
+    mark_recent_write(*cancelled)
+    bump_user_versions(row.user_id for row in rows)
+    logger.info("Cancelled %d of %d notifications", len(cancelled), len(notification_ids))
+    return cancelled
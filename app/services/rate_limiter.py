@@ -0,0 +1,189 @@
+import logging
+import math
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Token bucket hash of one provider and sender identity, and the prefix of its daily counters
+# (suffixed with the UTC date, YYYYMMDD)
+BUCKET_KEY = "ratelimit:{}:{}"
+DAILY_KEY = "ratelimit:{}:{}:day:"
+
+# Tokens taken from Redis expire if the process does not spend them in time, so an idle
+# worker never sits on quota that busy ones could use
+LOCAL_TOKEN_TTL = 1.0
+
+# Takes up to the requested number of tokens at once, after giving back the unspent tokens of
+# an expired batch to the daily counter they were charged to. Time and date come from the Redis
+# clock so workers with skewed clocks share one bucket and one day. Returns {granted,
+# milliseconds until the next token, UTC date the tokens were charged to, 1 when the daily
+# quota is used up (the wait then runs until midnight)}.
+_ACQUIRE = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local requested, daily_limit, day_ttl = tonumber(ARGV[3]), tonumber(ARGV[4]), tonumber(ARGV[5])
+local refund, refund_date = tonumber(ARGV[6]), ARGV[7]
+
+-- Days since the epoch to a proleptic Gregorian date (H. Hinnant's civil_from_days)
+local day = math.floor(now / 86400)
+local z = day + 719468
+local era = math.floor(z / 146097)
+local doe = z - era * 146097
+local yoe = math.floor((doe - math.floor(doe / 1460) + math.floor(doe / 36524) - math.floor(doe / 146096)) / 365)
+local doy = doe - (365 * yoe + math.floor(yoe / 4) - math.floor(yoe / 100))
+local mp = math.floor((5 * doy + 2) / 153)
+local month = mp < 10 and mp + 3 or mp - 9
+local year = yoe + era * 400 + (month <= 2 and 1 or 0)
+local date = string.format('%04d%02d%02d', year, month, doy - math.floor((153 * mp + 2) / 5) + 1)
+local daily_key = KEYS[2] .. date
+
+if refund > 0 and redis.call('EXISTS', KEYS[2] .. refund_date) == 1 then
+    redis.call('DECRBY', KEYS[2] .. refund_date, refund)
+end
+
+local granted = requested
+local tokens = burst
+if rate > 0 then
+    tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens') or burst)
+    local updated = tonumber(redis.call('HGET', KEYS[1], 'updated') or now)
+    tokens = math.min(burst, tokens + math.max(now - updated, 0) * rate)
+    granted = math.min(granted, math.floor(tokens))
+end
+if daily_limit > 0 then
+    local used = tonumber(redis.call('GET', daily_key) or '0')
+    if used >= daily_limit then
+        return {0, math.ceil(((day + 1) * 86400 - now) * 1000), date, 1}
+    end
+    granted = math.min(granted, daily_limit - used)
+end
+if granted > 0 and daily_limit > 0 then
+    redis.call('INCRBY', daily_key, granted)
+    redis.call('EXPIRE', daily_key, day_ttl)
+end
+if rate > 0 then
+    tokens = tokens - math.max(granted, 0)
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+    if granted <= 0 then
+        return {0, math.ceil((1 - tokens) / rate * 1000), date, 0}
+    end
+end
+return {granted, 0, date, 0}
+"""
+
+def _quota(provider: str) -> Optional[Tuple[str, float, int, int]]:
+    """
+    (sender identity, tokens per second, burst, daily quota) of a provider, None when unlimited
+    """
+    if provider == "gmail":
+        limits = (settings.GMAIL_SENDER, settings.GMAIL_RATE_PER_SECOND, settings.GMAIL_RATE_BURST, settings.GMAIL_DAILY_QUOTA)
+    elif provider == "twilio":
+        limits = (settings.TWILIO_FROM_NUMBER, settings.TWILIO_RATE_PER_SECOND, settings.TWILIO_RATE_BURST, settings.TWILIO_DAILY_QUOTA)
+    else:
+        return None
+    if limits[1] <= 0 and limits[3] <= 0:
+        return None
+    return limits
+
+class RateLimiter:
+    """
+    Cluster-wide token buckets per provider and sender, plus a daily quota per UTC day
+
+    Each worker process takes tokens from Redis in batches of up to RATE_LIMIT_BATCH_SIZE (no
+    more than the burst or a second's worth of rate) and spends them locally, so most sends cost
+    no Redis round trip. Tokens left when a batch expires are refunded to the daily quota with the
+    next round trip, so the quota only counts sends; tasks that exit without calling the provider
+    put their token back with refund(). After a refusal the process waits out the returned delay
+    before asking Redis again. Redis errors never block deliveries: the limiter then lets every call through.
+    """
+    def __init__(self):
+        self._script = None
+        self._lock = threading.Lock()
+        # provider -> [tokens left, expiry on the monotonic clock, UTC date they were charged to]
+        self._local: Dict[str, list] = {}
+        # provider -> monotonic time before which Redis is not asked again after a refusal
+        self._blocked: Dict[str, float] = {}
+        # Providers whose last acquire in this thread spent a token charged to Redis
+        self._taken = threading.local()
+
+    def _acquire_script(self):
+        if self._script is None:
+            self._script = get_redis().register_script(_ACQUIRE)
+        return self._script
+
+    def _taken_providers(self) -> set:
+        if not hasattr(self._taken, "providers"):
+            self._taken.providers = set()
+        return self._taken.providers
+
+    def acquire(self, provider: str) -> Tuple[bool, float]:
+        """
+        Take one token for a provider call; if none is left, the seconds until one should be
+        """
+        taken = self._taken_providers()
+        taken.discard(provider)
+        quota = _quota(provider)
+        if quota is None:
+            return True, 0.0
+        identity, rate, burst, daily_limit = quota
+
+        with self._lock:
+            local = self._local.get(provider)
+            if local and local[0] > 0 and local[1] > time.monotonic():
+                local[0] -= 1
+                taken.add(provider)
+                return True, 0.0
+
+            blocked_for = self._blocked.get(provider, 0) - time.monotonic()
+            if blocked_for > 0:
+                return False, blocked_for
+
+            batch = settings.RATE_LIMIT_BATCH_SIZE
+            if rate > 0:
+                # No more than the process can spend before its tokens expire
+                batch = min(batch, burst, math.ceil(rate * LOCAL_TOKEN_TTL))
+            batch = max(batch, 1)
+            # Tokens of an expired batch were charged to the daily quota but never spent
+            refund, refund_date = (local[0], local[2]) if local and local[0] > 0 else (0, "")
+            try:
+                granted, wait_ms, date, exhausted = self._acquire_script()(
+                    keys=[BUCKET_KEY.format(provider, identity), DAILY_KEY.format(provider, identity)],
+                    args=[rate, max(burst, 1), batch, daily_limit, 2 * 24 * 3600, refund, refund_date]
+                )
+            except Exception as e:
+                logger.warning(f"Rate limiter unavailable for {provider}, allowing the call: {str(e)}")
+                return True, 0.0
+
+            if granted > 0:
+                self._local[provider] = [granted - 1, time.monotonic() + LOCAL_TOKEN_TTL, date]
+                taken.add(provider)
+                return True, 0.0
+            self._local.pop(provider, None)
+            if exhausted:
+                logger.warning(f"Daily {provider} quota of {daily_limit} used up for {identity}")
+            wait = wait_ms / 1000
+            self._blocked[provider] = time.monotonic() + wait
+            return False, wait
+
+    def refund(self, provider: str):
+        """
+        Give back the token of this thread's last acquire when the provider was not called after all
+        """
+        taken = self._taken_providers()
+        if provider not in taken:
+            return
+        taken.discard(provider)
+        with self._lock:
+            # An expired batch still holds the token, and the next acquire refunds it to Redis
+            local = self._local.get(provider)
+            if local:
+                local[0] += 1
+
+# Create a singleton instance
+rate_limiter = RateLimiter()
@@ -0,0 +1,152 @@
+import hashlib
+import hmac
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.services.version_service import bump_user_versions
+
+logger = logging.getLogger(__name__)
+
+# Redis list buffering receipts between the API and the flush task
+RECEIPT_BUFFER_KEY = "read_receipts"
+# Held by the flush task so only one worker drains the buffer at a time
+FLUSH_LOCK_KEY = "read_receipts:flush_lock"
+
+# Deletes the flush lock only if it still holds the caller's token, atomically: a separate GET
+# and DEL could delete a lock another worker acquired after ours expired in between
+_RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# 1x1 transparent GIF returned by the open-tracking pixel
+TRACKING_PIXEL = (
+    b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00"
+    b",\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;"
+)
+
+# Receipts only move delivered notifications to READ; the earliest read time of a batch wins
+_APPLY_RECEIPTS = text("""
+    UPDATE notifications AS n
+    SET status = 'READ', read_at = r.read_at, updated_at = now()
+    FROM (
+        SELECT id, user_id, min(read_at) AS read_at
+        FROM unnest(CAST(:ids AS uuid[]), CAST(:user_ids AS uuid[]), CAST(:read_ats AS timestamptz[]))
+            AS t(id, user_id, read_at)
+        GROUP BY id, user_id
+    ) AS r
+    WHERE n.id = r.id AND n.user_id = r.user_id AND n.status = 'DELIVERED'
+    RETURNING n.user_id
+""")
+
+def record_receipts(receipts: Iterable[Tuple[uuid.UUID, uuid.UUID, Optional[datetime], str]]) -> int:
+    """
+    Buffer (notification ID, user ID, read at, source) receipts in Redis with one round trip
+
+    Receipts are applied to the database in batches by the flush_read_receipts task.
+    """
+    now = time.time()
+    entries = [
+        json.dumps([str(notification_id), str(user_id), read_at.timestamp() if read_at else now, source])
+        for notification_id, user_id, read_at, source in receipts
+    ]
+    if entries:
+        get_redis().rpush(RECEIPT_BUFFER_KEY, *entries)
+    return len(entries)
+
+def apply_receipts(db: Session, entries: List[bytes]) -> int:
+    """
+    Apply buffered receipts with a single set-based UPDATE and return the rows changed
+    """
+    ids, user_ids, read_ats = [], [], []
+    for entry in entries:
+        try:
+            notification_id, user_id, read_at, _ = json.loads(entry)
+            ids.append(str(uuid.UUID(notification_id)))
+            user_ids.append(str(uuid.UUID(user_id)))
+            read_ats.append(datetime.fromtimestamp(float(read_at), tz=timezone.utc))
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Dropping malformed read receipt {entry!r}: {str(e)}")
+    if not ids:
+        return 0
+    result = db.execute(_APPLY_RECEIPTS, {"ids": ids, "user_ids": user_ids, "read_ats": read_ats})
+    changed_users = [row[0] for row in result]
+    db.commit()
+    bump_user_versions(changed_users)
+    return len(changed_users)
+
+def flush_receipts(db: Session) -> Dict[str, int]:
+    """
+    Drain the receipt buffer in batches of READ_RECEIPT_BATCH_SIZE
+
+    A batch is removed from the buffer only after its UPDATE commits, so a crash replays it;
+    replays are harmless because receipts only touch notifications that are still DELIVERED.
+    """
+    redis_client = get_redis()
+    lock_token = uuid.uuid4().hex
+    if not redis_client.set(FLUSH_LOCK_KEY, lock_token, nx=True, ex=settings.READ_RECEIPT_FLUSH_INTERVAL * 10):
+        return {"receipts": 0, "updated": 0}
+
+    processed = updated = 0
+    try:
+        deadline = time.monotonic() + settings.READ_RECEIPT_FLUSH_INTERVAL * 5
+        while time.monotonic() < deadline:
+            entries = redis_client.lrange(RECEIPT_BUFFER_KEY, 0, settings.READ_RECEIPT_BATCH_SIZE - 1)
+            if not entries:
+                break
+            updated += apply_receipts(db, entries)
+            redis_client.ltrim(RECEIPT_BUFFER_KEY, len(entries), -1)
+            processed += len(entries)
+    finally:
+        # Release the lock only if it is still ours
+        redis_client.register_script(_RELEASE_LOCK)(keys=[FLUSH_LOCK_KEY], args=[lock_token])
+    return {"receipts": processed, "updated": updated}
+
+def _signature(notification_id: str, user_id: str) -> str:
+    key = settings.RECEIPT_SIGNING_KEY.encode()
+    return hmac.new(key, f"{notification_id}.{user_id}".encode(), hashlib.sha256).hexdigest()[:32]
+
+def open_tracking_token(notification_id: uuid.UUID, user_id: uuid.UUID) -> str:
+    """
+    Signed token identifying a notification in its open-tracking pixel URL
+    """
+    notification_id, user_id = uuid.UUID(str(notification_id)).hex, uuid.UUID(str(user_id)).hex
+    return f"{notification_id}.{user_id}.{_signature(notification_id, user_id)}"
+
+def parse_open_tracking_token(token: str) -> Optional[Tuple[uuid.UUID, uuid.UUID]]:
+    """
+    (notification ID, user ID) of a valid token, None for forged or malformed ones
+    """
+    if not settings.RECEIPT_SIGNING_KEY:
+        return None
+    try:
+        notification_id, user_id, signature = token.split(".")
+        # Compared as bytes: compare_digest rejects non-ASCII str with a TypeError
+        if not hmac.compare_digest(signature.encode(), _signature(notification_id, user_id).encode()):
+            return None
+        return uuid.UUID(notification_id), uuid.UUID(user_id)
+    except ValueError:
+        return None
+
+def add_open_tracking_pixel(body: str, notification_id: uuid.UUID, user_id: uuid.UUID) -> str:
+    """
+    Append the open-tracking pixel to an HTML email body when tracking is configured
+    """
+    if not (settings.EMAIL_OPEN_TRACKING and settings.RECEIPT_SIGNING_KEY and settings.PUBLIC_BASE_URL):
+        return body
+    url = (
+        f"{settings.PUBLIC_BASE_URL.rstrip('/')}{settings.API_PREFIX}/v2/receipts/open/"
+        f"{open_tracking_token(notification_id, user_id)}.gif"
+    )
+    return f'{body}<img src="{url}" width="1" height="1" alt="" style="display:none">'
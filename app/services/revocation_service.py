@@ -0,0 +1,80 @@
+import logging
+import time
+import uuid
+from typing import Iterable, Optional, Union
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Set of revoked notification and broadcast IDs (16 raw bytes each) per generation
+REVOKED_KEY = "revoked:{}"
+
+# IDs added per SADD, so revoking a large broadcast never sends one huge command
+REVOKE_BATCH_SIZE = 10000
+
+IdLike = Union[str, uuid.UUID]
+
+def _member(value: IdLike) -> bytes:
+    return (value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))).bytes
+
+class RevocationSet:
+    """
+    Cancelled notification and broadcast IDs, checked by delivery tasks before they claim a row
+
+    IDs are added to the set of the current generation, one schedule horizon long, and lookups
+    read the current and previous generations. An ID therefore stays revoked for at least
+    SCHEDULE_HORIZON_DAYS (at most twice that), longer than any scheduled task can wait, and a
+    lookup costs two SISMEMBER per ID in one round trip whatever the number of revocations.
+    Redis errors never block deliveries: lookups then report nothing revoked.
+    """
+    @staticmethod
+    def _generation(now: float) -> int:
+        return int(now // (settings.SCHEDULE_HORIZON_DAYS * 86400))
+
+    def revoke(self, ids: Iterable[IdLike]) -> int:
+        """
+        Revoke notification or broadcast IDs and return how many were added
+        """
+        horizon = settings.SCHEDULE_HORIZON_DAYS * 86400
+        key = REVOKED_KEY.format(self._generation(time.time()))
+        redis_client = get_redis()
+        pipe = redis_client.pipeline(transaction=False)
+        added = 0
+        batch = []
+        for value in ids:
+            batch.append(_member(value))
+            if len(batch) >= REVOKE_BATCH_SIZE:
+                pipe.sadd(key, *batch)
+                added += len(batch)
+                batch = []
+        if batch:
+            pipe.sadd(key, *batch)
+            added += len(batch)
+        if added:
+            # The generation's set outlives its last additions by one horizon
+            pipe.expire(key, 2 * horizon)
+            pipe.execute()
+        return added
+
+    def is_revoked(self, notification_id: IdLike, broadcast_id: Optional[IdLike] = None) -> bool:
+        """
+        Whether a notification, or the broadcast it belongs to, was cancelled
+        """
+        generation = self._generation(time.time())
+        members = [_member(notification_id)]
+        if broadcast_id:
+            members.append(_member(broadcast_id))
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for key in (REVOKED_KEY.format(generation), REVOKED_KEY.format(generation - 1)):
+                for member in members:
+                    pipe.sismember(key, member)
+            return any(pipe.execute())
+        except Exception as e:
+            logger.warning(f"Revocation set unavailable, treating {notification_id} as not cancelled: {str(e)}")
+            return False
+
+# Create a singleton instance
+revocation_set = RevocationSet()
@@ -0,0 +1,118 @@
+import base64
+import json
+import logging
+from datetime import datetime
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import and_, any_, cast, func, literal, or_, select, tuple_
+from sqlalchemy.dialects.postgresql import REAL, TSVECTOR
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import Notification, NotificationMessage
+
+logger = logging.getLogger(__name__)
+
+SEARCH_SORTS = ("relevance", "recent")
+
+def encode_search_cursor(sort: str, rank: float, created_at: datetime, notification_id: UUID) -> str:
+    """
+    Opaque keyset cursor pointing after the given result
+    """
+    key = [created_at.isoformat(), str(notification_id)]
+    if sort == "relevance":
+        key.insert(0, rank)
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def decode_search_cursor(sort: str, cursor: str) -> tuple:
+    """
+    Keyset values of a cursor, ValueError when it is malformed or from another sort order
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort == "relevance":
+            rank, created_at, notification_id = key
+            return float(rank), datetime.fromisoformat(created_at), UUID(notification_id)
+        created_at, notification_id = key
+        return datetime.fromisoformat(created_at), UUID(notification_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid search cursor: {str(e)}")
+
+def search_user_notifications(
+    db: Session,
+    user_id: UUID,
+    query_text: str,
+    sort: str = "relevance",
+    type_filter: Optional[str] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None
+) -> Tuple[List[Tuple[Notification, float]], Optional[str]]:
+    """
+    Full-text search of a user's notifications, returns (notification, rank) pairs and the next cursor
+
+    Queries use web search syntax ("quoted phrases", or, -exclusions). A row is searched on its
+    own vector and that of its deduplicated message. Candidates come from the (user_id,
+    search_vector) GIN index, so only the user's own postings are visited, and from the
+    (user_id, message_id) index for the matching messages, looked up once.
+    """
+    ts_query = func.websearch_to_tsquery(settings.SEARCH_TEXT_CONFIG, query_text)
+    empty = cast(literal(""), TSVECTOR)
+    # Message content first, then the row's own: the layout of a vector computed per row
+    vector = func.coalesce(NotificationMessage.search_vector, empty).op("||")(
+        func.coalesce(Notification.search_vector, empty)
+    )
+    rank = func.ts_rank_cd(vector, ts_query)
+    # A row matches on its own vector, on its message's, or on both together ("invoice april",
+    # from the message and a variable). Both together needs a positive term of the query in each
+    # vector; querytree() is 'T' when there is none (only exclusions), then every row is a candidate.
+    terms = func.querytree(ts_query)
+    any_term = func.tsquery(func.regexp_replace(terms, r"<(\d+|-)>|&", "|", "g"))
+
+    def messages_matching(tsquery):
+        # ARRAY(SELECT ...), evaluated once; = ANY() of it can be an index condition
+        return func.array(
+            select(NotificationMessage.id).where(NotificationMessage.search_vector.op("@@")(tsquery)).scalar_subquery()
+        )
+
+    query = db.query(Notification, rank).outerjoin(
+        NotificationMessage, NotificationMessage.id == Notification.message_id
+    ).filter(
+        Notification.user_id == user_id,
+        or_(
+            Notification.search_vector.op("@@")(ts_query),
+            Notification.message_id == any_(messages_matching(ts_query)),
+            and_(
+                Notification.search_vector.op("@@")(any_term),
+                Notification.message_id == any_(messages_matching(any_term))
+            ),
+            terms == "T"
+        ),
+        vector.op("@@")(ts_query)
+    )
+    if type_filter:
+        query = query.filter(Notification.type == type_filter)
+
+    if sort == "relevance":
+        if cursor:
+            cursor_rank, created_at, notification_id = decode_search_cursor(sort, cursor)
+            # ts_rank_cd is a real, compare with the cursor's rank at the same precision
+            query = query.filter(
+                tuple_(rank, Notification.created_at, Notification.id)
+                < tuple_(cast(cursor_rank, REAL), created_at, notification_id)
+            )
+        query = query.order_by(rank.desc(), Notification.created_at.desc(), Notification.id.desc())
+    else:
+        if cursor:
+            created_at, notification_id = decode_search_cursor(sort, cursor)
+            query = query.filter(tuple_(Notification.created_at, Notification.id) < tuple_(created_at, notification_id))
+        query = query.order_by(Notification.created_at.desc(), Notification.id.desc())
+
+    # One extra row tells whether there is a next page
+    results = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        last, last_rank = results[-1]
+        next_cursor = encode_search_cursor(sort, last_rank, last.created_at, last.id)
+    return results, next_cursor
@@ -1,6 +1,8 @@
-from twilio.rest import Client
 import logging
+import threading
 from app.core.config import settings
+from app.core.metrics import track_provider_call
+from app.services.circuit_breaker import circuit_breaker
 
 logger = logging.getLogger(__name__)
 
@@ -9,7 +11,24 @@ class SMSService:
         self.account_sid = settings.TWILIO_ACCOUNT_SID
         self.auth_token = settings.TWILIO_AUTH_TOKEN
         self.from_number = settings.TWILIO_FROM_NUMBER
-        self.client = Client(self.account_sid, self.auth_token)
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """
+        The Twilio client, created on first use so processes that never send SMS skip the import
+        """
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from twilio.rest import Client
+
+                    client = Client(self.account_sid, self.auth_token)
+                    if settings.TWILIO_API_BASE_URL:
+                        client.api.base_url = settings.TWILIO_API_BASE_URL
+                    self._client = client
+        return self._client
 
     def send_sms(self, to_number: str, body: str) -> bool:
         """
@@ -23,11 +42,12 @@ class SMSService:
             bool: True if SMS was sent successfully, False otherwise
         """
         try:
-            message = self.client.messages.create(
-                body=body,
-                from_=self.from_number,
-                to=to_number
-            )
+            with track_provider_call("twilio"), circuit_breaker.track("twilio"):
+                message = self.client.messages.create(
+                    body=body,
+                    from_=self.from_number,
+                    to=to_number
+                )
             
             logger.info(f"SMS sent to {to_number}, SID: {message.sid}")
             return True
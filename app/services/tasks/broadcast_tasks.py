@@ -0,0 +1,184 @@
+import logging
+import time
+import uuid
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from celery import shared_task
+from sqlalchemy import func, insert, select, update
+
+from app.core.celery_app import get_queue_depth
+from app.core.config import settings
+from app.db.database import SessionLocal, engine
+from app.db.leases import clear_task_ids
+from app.db.models import Broadcast, BroadcastStatus, Notification, NotificationStatus, NotificationType, User
+from app.schemas.broadcast import SegmentDefinition
+from app.services.notification_service import queue_notifications
+from app.services.version_service import bump_user_versions
+
+logger = logging.getLogger(__name__)
+
+def segment_filters(segment: Dict) -> List:
+    """
+    Translate a stored segment definition into filters over User
+    """
+    segment = SegmentDefinition(**(segment or {}))
+    filters = []
+    if segment.email_enabled is not None:
+        filters.append(User.email_enabled == segment.email_enabled)
+    if segment.sms_enabled is not None:
+        filters.append(User.sms_enabled == segment.sms_enabled)
+    if segment.in_app_enabled is not None:
+        filters.append(User.in_app_enabled == segment.in_app_enabled)
+    if segment.has_phone is not None:
+        filters.append(User.phone.isnot(None) if segment.has_phone else User.phone.is_(None))
+    if segment.email_domain:
+        filters.append(User.email.endswith(f"@{segment.email_domain}", autoescape=True))
+    if segment.created_after:
+        filters.append(User.created_at >= segment.created_after)
+    if segment.created_before:
+        filters.append(User.created_at < segment.created_before)
+    return filters
+
+def _is_backlogged() -> bool:
+    """
+    Check the broadcast queue depth against the backpressure threshold
+    """
+    try:
+        return get_queue_depth(settings.BROADCAST_QUEUE) >= settings.BROADCAST_MAX_QUEUE_DEPTH
+    except Exception as e:
+        logger.warning(f"Could not read depth of queue {settings.BROADCAST_QUEUE}: {str(e)}")
+        return False
+
+def _fan_out_chunk(db, broadcast: Broadcast, channels: List[NotificationType], recipients, cursor: Optional[UUID]) -> bool:
+    """
+    Create the notifications of one chunk of recipients and queue their deliveries
+
+    Returns False when the broadcast is no longer running or another task advanced its cursor.
+    """
+    import numpy as np
+    from app.services.audience_index import preference_index
+
+    user_ids = [recipient[0] for recipient in recipients]
+
+    # Per-channel eligibility for the whole chunk via bitwise ops on the preference index,
+    # refreshed first if preferences changed since the last chunk
+    preference_index.refresh_if_stale(db)
+    preference_index.ensure_users(db, user_ids)
+    rows = []
+    for channel in channels:
+        for i in np.flatnonzero(preference_index.channel_mask(user_ids, channel)):
+            rows.append({
+                "id": uuid.uuid4(),
+                "user_id": user_ids[i],
+                "type": channel,
+                "message_id": broadcast.message_id,
+                "status": NotificationStatus.QUEUED,
+                "priority": broadcast.priority,
+                "retry_count": 0,
+                "broadcast_id": broadcast.id,
+                "task_id": str(uuid.uuid4()),
+            })
+
+    if rows:
+        db.execute(insert(Notification.__table__), rows)
+
+    # Progress and cursor are saved with the notifications; the cursor guard stops a
+    # second task racing over the same range (e.g. after a quick pause and resume)
+    result = db.execute(
+        update(Broadcast.__table__).where(
+            Broadcast.id == broadcast.id,
+            Broadcast.status == BroadcastStatus.RUNNING,
+            Broadcast.cursor_user_id.is_not_distinct_from(cursor)
+        ).values(
+            cursor_user_id=recipients[-1][0],
+            recipients_processed=Broadcast.recipients_processed + len(recipients),
+            notifications_created=Broadcast.notifications_created + len(rows),
+            updated_at=func.now()
+        )
+    )
+    if result.rowcount == 0:
+        db.rollback()
+        return False
+    db.commit()
+    bump_user_versions(row["user_id"] for row in rows)
+
+    if rows:
+        try:
+            queue_notifications([Notification(**row) for row in rows])
+        except Exception:
+            # The cursor has moved past these recipients: leave the rows to the reaper. Copies of
+            # tasks that did get published lose the claim to whichever runs first.
+            clear_task_ids(db, [row["id"] for row in rows])
+            raise
+    return True
+
+@shared_task(
+    bind=True,
+    name="run_broadcast",
+    max_retries=5,
+    autoretry_for=(Exception,),
+    retry_backoff=True
+)
+def run_broadcast(self, broadcast_id: str):
+    """
+    Fan a broadcast out to its segment, one time-boxed slice per execution
+
+    Matching users are streamed with a server-side cursor in user ID order and processed in
+    chunks, so memory stays constant. The task re-schedules itself to continue after a slice,
+    and backs off while the broadcast queue is deeper than BROADCAST_MAX_QUEUE_DEPTH.
+    """
+    db = SessionLocal()
+
+    try:
+        broadcast = db.query(Broadcast).filter(Broadcast.id == UUID(broadcast_id)).first()
+        if not broadcast or broadcast.status != BroadcastStatus.RUNNING:
+            logger.info(f"Broadcast {broadcast_id} is not running, stopping fan-out")
+            return False
+
+        if _is_backlogged():
+            run_broadcast.apply_async(args=[broadcast_id], countdown=settings.BROADCAST_BACKPRESSURE_DELAY)
+            return True
+
+        channels = [NotificationType(channel) for channel in broadcast.channels]
+        cursor = broadcast.cursor_user_id
+        deadline = time.monotonic() + settings.BROADCAST_SLICE_SECONDS
+        # Imported here: NumPy is only needed by workers running the fan-out, not by the API
+        from app.services.audience_index import preference_index
+        preference_index.refresh_if_stale(db)
+
+        query = select(User.id).where(*segment_filters(broadcast.segment)).order_by(User.id)
+        if cursor:
+            query = query.where(User.id > cursor)
+
+        # Stream on a dedicated connection, chunks are committed through the session
+        with engine.connect() as conn:
+            result = conn.execution_options(
+                stream_results=True, max_row_buffer=settings.BROADCAST_CHUNK_SIZE
+            ).execute(query)
+
+            for recipients in result.partitions(settings.BROADCAST_CHUNK_SIZE):
+                if not _fan_out_chunk(db, broadcast, channels, recipients, cursor):
+                    logger.info(f"Broadcast {broadcast_id} was paused, cancelled or taken over")
+                    return True
+                cursor = recipients[-1][0]
+
+                if _is_backlogged():
+                    run_broadcast.apply_async(args=[broadcast_id], countdown=settings.BROADCAST_BACKPRESSURE_DELAY)
+                    return True
+                if time.monotonic() > deadline:
+                    run_broadcast.apply_async(args=[broadcast_id])
+                    return True
+
+        db.execute(
+            update(Broadcast.__table__).where(
+                Broadcast.id == broadcast.id,
+                Broadcast.status == BroadcastStatus.RUNNING,
+                Broadcast.cursor_user_id.is_not_distinct_from(cursor)
+            ).values(status=BroadcastStatus.COMPLETED, completed_at=func.now(), updated_at=func.now())
+        )
+        db.commit()
+        logger.info(f"Broadcast {broadcast_id} fan-out completed")
+        return True
+    finally:
+        db.close()
@@ -0,0 +1,91 @@
+import logging
+import time
+from datetime import datetime
+from typing import Dict
+
+from celery import shared_task
+
+from app.core.celery_app import get_queue_depth
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import NotificationType
+from app.services.dead_letter_service import restore_dead_letters, take_replay_batch
+from app.services.notification_service import queue_notifications
+from app.services.version_service import bump_user_versions
+
+logger = logging.getLogger(__name__)
+
+def _is_backlogged() -> bool:
+    """
+    Check the replay queue depth against DEAD_LETTER_REPLAY_MAX_QUEUE_DEPTH
+    """
+    try:
+        return get_queue_depth(settings.DEAD_LETTER_REPLAY_QUEUE) >= settings.DEAD_LETTER_REPLAY_MAX_QUEUE_DEPTH
+    except Exception as e:
+        logger.warning(f"Could not read depth of queue {settings.DEAD_LETTER_REPLAY_QUEUE}: {str(e)}")
+        return False
+
+def _replay_filters(filters: Dict) -> Dict:
+    return {
+        "channel": NotificationType(filters["channel"]) if filters.get("channel") else None,
+        "error_class": filters.get("error_class"),
+        "from_date": datetime.fromisoformat(filters["from_date"]) if filters.get("from_date") else None,
+        "to_date": datetime.fromisoformat(filters["to_date"]) if filters.get("to_date") else None,
+    }
+
+@shared_task(
+    bind=True,
+    name="replay_dead_letters",
+    max_retries=5,
+    autoretry_for=(Exception,),
+    retry_backoff=True
+)
+def replay_dead_letters(self, filters: Dict, until: str):
+    """
+    Queue again the notifications of pending dead letters matching `filters` that failed by `until`
+
+    Batches of DEAD_LETTER_REPLAY_BATCH_SIZE are published as one group, at most
+    DEAD_LETTER_REPLAY_RATE notifications per second. Like a broadcast, the task re-schedules
+    itself after a time slice and backs off while the replay queue is too deep, so one call
+    works through any backlog.
+    """
+    if _is_backlogged():
+        replay_dead_letters.apply_async(args=[filters, until], countdown=settings.BROADCAST_BACKPRESSURE_DELAY)
+        return 0
+
+    db = SessionLocal()
+    
+    try:
+        replay_filters = _replay_filters(filters)
+        until_time = datetime.fromisoformat(until)
+        started = time.monotonic()
+        deadline = started + settings.DEAD_LETTER_REPLAY_SLICE_SECONDS
+        replayed = 0
+        while True:
+            taken, rows = take_replay_batch(db, until_time, settings.DEAD_LETTER_REPLAY_BATCH_SIZE, **replay_filters)
+            if not taken:
+                logger.info(f"Dead letter replay until {until} completed, {replayed} notifications in the last slice")
+                return replayed
+            
+            try:
+                queue_notifications(rows, queue=settings.DEAD_LETTER_REPLAY_QUEUE)
+            except Exception:
+                # Put the batch back, the retry of this task takes it again
+                restore_dead_letters(db, [row.id for row in rows])
+                raise
+            bump_user_versions(row.user_id for row in rows)
+            replayed += len(rows)
+            
+            # Hold the publish rate, deliveries are rate limited per provider downstream anyway
+            wait = replayed / settings.DEAD_LETTER_REPLAY_RATE - (time.monotonic() - started)
+            if wait > 0:
+                time.sleep(wait)
+            
+            if _is_backlogged():
+                replay_dead_letters.apply_async(args=[filters, until], countdown=settings.BROADCAST_BACKPRESSURE_DELAY)
+                return replayed
+            if time.monotonic() > deadline:
+                replay_dead_letters.apply_async(args=[filters, until])
+                return replayed
+    finally:
+        db.close()
@@ -3,16 +3,28 @@ from celery import shared_task
 from datetime import datetime
 from uuid import UUID
 
+from app.core.logs import NotificationLogger
 from app.db.database import SessionLocal
+from app.db.leases import claim_notification
 from app.db.models import Notification, User, NotificationStatus
+from app.services.circuit_breaker import circuit_breaker
+from app.services.content_service import get_notification_content
+from app.services.dead_letter_service import DeliveryTask
+from app.services.deferral import defer_task
 from app.services.email_service import email_service
 from app.services.sms_service import sms_service
 from app.services.in_app_service import in_app_service
+from app.services.lifecycle_service import DeliveryTimer
+from app.services.rate_limiter import rate_limiter
+from app.services.receipt_service import add_open_tracking_pixel
+from app.services.revocation_service import revocation_set
+from app.services.version_service import bump_user_versions
 
 logger = logging.getLogger(__name__)
 
 @shared_task(
     bind=True,
+    base=DeliveryTask,
     name="send_email_notification",
     max_retries=3,
     default_retry_delay=60,  # 1 minute
@@ -20,11 +32,34 @@ logger = logging.getLogger(__name__)
     retry_backoff=True,
     retry_backoff_max=600  # 10 minutes
 )
-def send_email_notification(self, notification_id: str, user_id: str, subject: str, body: str):
+def send_email_notification(self, notification_id: str, user_id: str, subject: str = None, body: str = None, message_id: str = None, template_id: str = None, broadcast_id: str = None):
     """
     Task to send email notification
     """
-    logger.info(f"Processing email notification {notification_id} for user {user_id}")
+    log = NotificationLogger(logger, "email", notification_id, user_id, self.request.id)
+    log.info("Processing email notification %s for user %s", notification_id, user_id)
+    
+    # Cancelled: drop the task before it claims the row or calls the provider
+    if revocation_set.is_revoked(notification_id, broadcast_id):
+        log.info("Email notification %s was cancelled, skipping", notification_id)
+        return False
+    
+    # Provider known to be down: come back later without touching the database or the provider
+    allowed, retry_after = circuit_breaker.allow("gmail")
+    if not allowed:
+        defer_task(self, retry_after, "circuit_open")
+        log.info("Email notification %s deferred %.0fs, gmail circuit is open", notification_id, retry_after)
+        return False
+    
+    # Provider quota spent for now: park the task until a token is due instead of holding the slot
+    allowed, retry_after = rate_limiter.acquire("gmail")
+    if not allowed:
+        circuit_breaker.release("gmail")
+        defer_task(self, retry_after, "rate_limited")
+        log.info("Email notification %s deferred %.1fs, gmail quota reached", notification_id, retry_after)
+        return False
+    
+    timer = DeliveryTimer(self.request)
     
     # Get database session
     db = SessionLocal()
@@ -36,44 +71,58 @@ def send_email_notification(self, notification_id: str, user_id: str, subject: s
         ).first()
         
         if not notification:
-            logger.error(f"Notification {notification_id} not found in database")
+            log.error("Notification %s not found in database", notification_id)
             return False
         
         user = db.query(User).filter(User.id == UUID(user_id)).first()
         
         if not user:
-            logger.error(f"User {user_id} not found in database")
+            log.error("User %s not found in database", user_id)
             notification.status = NotificationStatus.FAILED
             db.commit()
             return False
+
+        # Render the template or load the shared content by ID, unless the payload carries it
+        # inline (pre-dedup tasks)
+        if message_id or template_id:
+            subject, body = get_notification_content(db, notification)
             
-        # Update status to sending
-        notification.status = NotificationStatus.SENDING
-        db.commit()
+        # Claim the row under a lease; a duplicate of the task may hold it or have sent it already
+        if not claim_notification(db, notification.id, self.request.id):
+            log.info("Email notification %s is claimed or already finished, skipping", notification_id)
+            return False
+        bump_user_versions([notification.user_id])
         
         # Send email
-        success = email_service.send_email(user.email, subject, body)
+        body = add_open_tracking_pixel(body, notification.id, notification.user_id)
+        with timer.provider_call():
+            success = email_service.send_email(user.email, subject, body)
             
         # Update notification status based on result
         if success:
             notification.status = NotificationStatus.DELIVERED
+            notification.claimed_until = None
             notification.delivered_at = datetime.utcnow()
+            timer.stamp(notification)
             db.commit()
-            logger.info(f"Email notification {notification_id} delivered successfully")
+            log.info("Email notification %s delivered successfully", notification_id)
             return True
         else:
             # Mark as failed (will be retried by Celery automatically)
             notification.status = NotificationStatus.FAILED
+            notification.claimed_until = None
+            timer.stamp(notification)
             db.commit()
-            logger.warning(f"Email notification {notification_id} failed, will retry")
+            log.warning("Email notification %s failed, will retry", notification_id)
             raise Exception("Failed to send email")
             
     except Exception as e:
-        logger.error(f"Error processing email notification {notification_id}: {str(e)}")
+        log.error("Error processing email notification %s: %s", notification_id, e)
         # Update notification status to failed
         try:
             if notification:
                 notification.status = NotificationStatus.FAILED
+                notification.claimed_until = None
                 db.commit()
         except:
             pass
@@ -82,9 +131,15 @@ def send_email_notification(self, notification_id: str, user_id: str, subject: s
         raise
     finally:
         db.close()
+        # Give back the half-open probe slot on every exit that did not reach gmail
+        circuit_breaker.release_unless_called("gmail")
+        # The token was spent on a task that never reached gmail
+        if not timer.provider_called:
+            rate_limiter.refund("gmail")
 
 @shared_task(
     bind=True,
+    base=DeliveryTask,
     name="send_sms_notification",
     max_retries=3,
     default_retry_delay=60,
@@ -92,11 +147,34 @@ def send_email_notification(self, notification_id: str, user_id: str, subject: s
     retry_backoff=True,
     retry_backoff_max=600
 )
-def send_sms_notification(self, notification_id: str, user_id: str, body: str):
+def send_sms_notification(self, notification_id: str, user_id: str, body: str = None, message_id: str = None, template_id: str = None, broadcast_id: str = None):
     """
     Task to send SMS notification
     """
-    logger.info(f"Processing SMS notification {notification_id} for user {user_id}")
+    log = NotificationLogger(logger, "sms", notification_id, user_id, self.request.id)
+    log.info("Processing SMS notification %s for user %s", notification_id, user_id)
+    
+    # Cancelled: drop the task before it claims the row or calls the provider
+    if revocation_set.is_revoked(notification_id, broadcast_id):
+        log.info("SMS notification %s was cancelled, skipping", notification_id)
+        return False
+    
+    # Provider known to be down: come back later without touching the database or the provider
+    allowed, retry_after = circuit_breaker.allow("twilio")
+    if not allowed:
+        defer_task(self, retry_after, "circuit_open")
+        log.info("SMS notification %s deferred %.0fs, twilio circuit is open", notification_id, retry_after)
+        return False
+    
+    # Provider quota spent for now: park the task until a token is due instead of holding the slot
+    allowed, retry_after = rate_limiter.acquire("twilio")
+    if not allowed:
+        circuit_breaker.release("twilio")
+        defer_task(self, retry_after, "rate_limited")
+        log.info("SMS notification %s deferred %.1fs, twilio quota reached", notification_id, retry_after)
+        return False
+    
+    timer = DeliveryTimer(self.request)
     
     # Get database session
     db = SessionLocal()
@@ -108,50 +186,63 @@ def send_sms_notification(self, notification_id: str, user_id: str, body: str):
         ).first()
         
         if not notification:
-            logger.error(f"Notification {notification_id} not found in database")
+            log.error("Notification %s not found in database", notification_id)
             return False
         
         user = db.query(User).filter(User.id == UUID(user_id)).first()
         
         if not user:
-            logger.error(f"User {user_id} not found in database")
+            log.error("User %s not found in database", user_id)
             notification.status = NotificationStatus.FAILED
             db.commit()
             return False
             
         if not user.phone:
-            logger.error(f"User {user_id} does not have a phone number")
+            log.error("User %s does not have a phone number", user_id)
             notification.status = NotificationStatus.FAILED
             db.commit()
             return False
+
+        # Render the template or load the shared content by ID, unless the payload carries it
+        # inline (pre-dedup tasks)
+        if message_id or template_id:
+            _, body = get_notification_content(db, notification)
             
-        # Update status to sending
-        notification.status = NotificationStatus.SENDING
-        db.commit()
+        # Claim the row under a lease; a duplicate of the task may hold it or have sent it already
+        if not claim_notification(db, notification.id, self.request.id):
+            log.info("SMS notification %s is claimed or already finished, skipping", notification_id)
+            return False
+        bump_user_versions([notification.user_id])
         
         # Send SMS
-        success = sms_service.send_sms(user.phone, body)
+        with timer.provider_call():
+            success = sms_service.send_sms(user.phone, body)
             
         # Update notification status based on result
         if success:
             notification.status = NotificationStatus.DELIVERED
+            notification.claimed_until = None
             notification.delivered_at = datetime.utcnow()
+            timer.stamp(notification)
             db.commit()
-            logger.info(f"SMS notification {notification_id} delivered successfully")
+            log.info("SMS notification %s delivered successfully", notification_id)
             return True
         else:
             # Mark as failed
             notification.status = NotificationStatus.FAILED
+            notification.claimed_until = None
+            timer.stamp(notification)
             db.commit()
-            logger.warning(f"SMS notification {notification_id} failed, will retry")
+            log.warning("SMS notification %s failed, will retry", notification_id)
             raise Exception("Failed to send SMS")
             
     except Exception as e:
-        logger.error(f"Error processing SMS notification {notification_id}: {str(e)}")
+        log.error("Error processing SMS notification %s: %s", notification_id, e)
         # Update notification status to failed
         try:
             if notification:
                 notification.status = NotificationStatus.FAILED
+                notification.claimed_until = None
                 db.commit()
         except:
             pass
@@ -160,20 +251,41 @@ def send_sms_notification(self, notification_id: str, user_id: str, body: str):
         raise
     finally:
         db.close()
+        # Give back the half-open probe slot on every exit that did not reach twilio
+        circuit_breaker.release_unless_called("twilio")
+        # The token was spent on a task that never reached twilio
+        if not timer.provider_called:
+            rate_limiter.refund("twilio")
 
 @shared_task(
     bind=True,
+    base=DeliveryTask,
     name="send_in_app_notification",
     max_retries=2,
     default_retry_delay=30,
     autoretry_for=(Exception,),
     retry_backoff=True
 )
-def send_in_app_notification(self, notification_id: str, user_id: str, subject: str, body: str):
+def send_in_app_notification(self, notification_id: str, user_id: str, subject: str = None, body: str = None, message_id: str = None, template_id: str = None, broadcast_id: str = None):
     """
     Task to send in-app notification
     """
-    logger.info(f"Processing in-app notification {notification_id} for user {user_id}")
+    log = NotificationLogger(logger, "in-app", notification_id, user_id, self.request.id)
+    log.info("Processing in-app notification %s for user %s", notification_id, user_id)
+    
+    # Cancelled: drop the task before it claims the row or calls the provider
+    if revocation_set.is_revoked(notification_id, broadcast_id):
+        log.info("In-app notification %s was cancelled, skipping", notification_id)
+        return False
+    
+    # Provider known to be down: come back later without touching the database or the provider
+    allowed, retry_after = circuit_breaker.allow("redis_pubsub")
+    if not allowed:
+        defer_task(self, retry_after, "circuit_open")
+        log.info("In-app notification %s deferred %.0fs, redis_pubsub circuit is open", notification_id, retry_after)
+        return False
+    
+    timer = DeliveryTimer(self.request)
     
     # Get database session
     db = SessionLocal()
@@ -185,39 +297,52 @@ def send_in_app_notification(self, notification_id: str, user_id: str, subject:
         ).first()
         
         if not notification:
-            logger.error(f"Notification {notification_id} not found in database")
+            log.error("Notification %s not found in database", notification_id)
             return False
+
+        # Render the template or load the shared content by ID, unless the payload carries it
+        # inline (pre-dedup tasks)
+        if message_id or template_id:
+            subject, body = get_notification_content(db, notification)
             
-        # Update status to sending
-        notification.status = NotificationStatus.SENDING
-        db.commit()
+        # Claim the row under a lease; a duplicate of the task may hold it or have sent it already
+        if not claim_notification(db, notification.id, self.request.id):
+            log.info("In-app notification %s is claimed or already finished, skipping", notification_id)
+            return False
+        bump_user_versions([notification.user_id])
         
         # Send in-app notification
-        success = in_app_service.send_in_app_notification(
-            user_id, 
-            {"id": notification_id, "subject": subject, "body": body}
-        )
+        with timer.provider_call():
+            success = in_app_service.send_in_app_notification(
+                user_id, 
+                {"id": notification_id, "subject": subject, "body": body}
+            )
             
         # Update notification status based on result
         if success:
             notification.status = NotificationStatus.DELIVERED
+            notification.claimed_until = None
             notification.delivered_at = datetime.utcnow()
+            timer.stamp(notification)
             db.commit()
-            logger.info(f"In-app notification {notification_id} delivered successfully")
+            log.info("In-app notification %s delivered successfully", notification_id)
             return True
         else:
             # Mark as failed
             notification.status = NotificationStatus.FAILED
+            notification.claimed_until = None
+            timer.stamp(notification)
             db.commit()
-            logger.warning(f"In-app notification {notification_id} failed, will retry")
+            log.warning("In-app notification %s failed, will retry", notification_id)
             raise Exception("Failed to send in-app notification")
             
     except Exception as e:
-        logger.error(f"Error processing in-app notification {notification_id}: {str(e)}")
+        log.error("Error processing in-app notification %s: %s", notification_id, e)
         # Update notification status to failed
         try:
             if notification:
                 notification.status = NotificationStatus.FAILED
+                notification.claimed_until = None
                 db.commit()
         except:
             pass
@@ -226,3 +351,5 @@ def send_in_app_notification(self, notification_id: str, user_id: str, subject:
         raise
     finally:
         db.close()
+        # Give back the half-open probe slot on every exit that did not reach redis_pubsub
+        circuit_breaker.release_unless_called("redis_pubsub")
@@ -1,16 +1,29 @@
 import logging
+import uuid
 from datetime import datetime, timedelta
+from itertools import groupby
 from celery import shared_task
 from sqlalchemy import func
-from typing import List
 
 from app.core.celery_app import celery_app
+from app.core.config import settings
 from app.db.database import SessionLocal
-from app.db.models import Notification, User, NotificationStatus, NotificationPriority, NotificationType
-from app.services.tasks.notification_tasks import send_email_notification
+from app.db.leases import clear_task_ids, requeue_expired_claims, requeue_unqueued
+from app.db.partitions import ensure_notification_partitions, drop_expired_notification_partitions
+from app.db.models import Notification, NotificationMessage, User, NotificationStatus, NotificationPriority, NotificationType
+from app.services.archive_service import archive_notifications
+from app.services.content_service import render_text
+from app.services.lifecycle_service import refresh_latency_reports
+from app.services.notification_service import queue_notifications
+from app.services.receipt_service import flush_receipts
+from app.services.template_service import prefetch_templates, render_template, resolve_template
+from app.services.version_service import bump_global_version, bump_user_versions
 
 logger = logging.getLogger(__name__)
 
+# System template of the digest email, see template_service.SYSTEM_TEMPLATES
+DIGEST_TEMPLATE = "daily_digest"
+
 @shared_task(name="send_daily_digest")
 def send_daily_digest():
     """
@@ -25,50 +38,71 @@ def send_daily_digest():
         # Get users who have unread notifications from the last 24 hours
         yesterday = datetime.utcnow() - timedelta(days=1)
         
-        # Find users with unread notifications
-        users_with_notifications = db.query(User).join(
-            Notification, User.id == Notification.user_id
+        # Fetch every unread notification of the window in one pass, grouped by user.
+        # The created_at bound keeps the scan inside the most recent partition(s).
+        rows = db.query(
+            Notification.user_id,
+            func.coalesce(NotificationMessage.subject, Notification.subject),
+            func.substr(func.coalesce(NotificationMessage.body, Notification.body), 1, 100),
+            Notification.template_vars,
+            Notification.template_id,
+            Notification.template_version
+        ).join(
+            User, User.id == Notification.user_id
+        ).outerjoin(
+            NotificationMessage, NotificationMessage.id == Notification.message_id
         ).filter(
             Notification.created_at >= yesterday,
             Notification.status != NotificationStatus.READ,
             User.email_enabled == True  # Only send to users with email enabled
-        ).distinct().all()
+        ).order_by(Notification.user_id).all()
         
-        logger.info(f"Found {len(users_with_notifications)} users with unread notifications")
+        prefetch_templates(db, [(row[4], row[5]) for row in rows])
+        template_id, template_version = resolve_template(db, DIGEST_TEMPLATE, None)
         
-        for user in users_with_notifications:
-            # Get unread notifications for this user
-            notifications = db.query(Notification).filter(
-                Notification.user_id == user.id,
-                Notification.created_at >= yesterday,
-                Notification.status != NotificationStatus.READ
-            ).all()
-            
-            # If user has notifications, send a digest
-            if notifications:
-                # Create a digest notification
-                notification = Notification(
-                    user_id=user.id,
-                    type=NotificationType.EMAIL,
-                    subject="Your Daily Notification Digest",
-                    body=_create_digest_body(notifications),
-                    status=NotificationStatus.QUEUED,
-                    priority=NotificationPriority.LOW,
-                )
-                
-                db.add(notification)
-                db.commit()
-                
-                # Queue the digest email
-                send_email_notification.delay(
-                    str(notification.id),
-                    str(user.id),
-                    notification.subject,
-                    notification.body
-                )
-                
-                logger.info(f"Scheduled digest email for user {user.id}")
+        # Each digest only stores its items, the worker renders the shared compiled template
+        digests = []
+        for user_id, user_rows in groupby(rows, key=lambda row: row[0]):
+            items = []
+            for _, subject, snippet, template_vars, item_template_id, item_template_version in user_rows:
+                if item_template_id is not None:
+                    # Plain text, the digest template escapes its items
+                    subject, body = render_template(db, item_template_id, item_template_version, template_vars, html=False)
+                    snippet = body[:100]
+                else:
+                    subject, snippet = render_text(subject, template_vars), render_text(snippet, template_vars)
+                items.append({"subject": subject, "snippet": snippet})
+            digests.append(Notification(
+                id=uuid.uuid4(),
+                user_id=user_id,
+                type=NotificationType.EMAIL,
+                template_id=template_id,
+                template_version=template_version,
+                template_vars={"items": items},
+                status=NotificationStatus.QUEUED,
+                priority=NotificationPriority.LOW,
+                task_id=str(uuid.uuid4()),
+            ))
+        
+        # Store every digest notification in bulk rather than per user
+        db.bulk_save_objects(digests)
         
+        logger.info(f"Found {len(digests)} users with unread notifications")
+        db.commit()
+        bump_user_versions(notification.user_id for notification in digests)
+        
+        # Published in batches; on a broker error the unpublished digests lose their task IDs,
+        # so the reaper queues them instead of leaving committed rows without a message
+        batch_size = settings.DIGEST_PUBLISH_BATCH_SIZE
+        for start in range(0, len(digests), batch_size):
+            try:
+                queue_notifications(digests[start:start + batch_size])
+            except Exception as e:
+                logger.error(f"Failed to queue {len(digests) - start} digest emails, left to the reaper: {str(e)}")
+                clear_task_ids(db, [notification.id for notification in digests[start:]])
+                return False
+        
+        logger.info(f"Scheduled {len(digests)} digest emails")
         return True
     except Exception as e:
         logger.error(f"Error sending daily digests: {str(e)}")
@@ -79,7 +113,7 @@ def send_daily_digest():
 @shared_task(name="cleanup_old_notifications")
 def cleanup_old_notifications():
     """
-    Clean up old notifications (older than 90 days)
+    Clean up old notifications (older than NOTIFICATION_RETENTION_DAYS), archiving them first if enabled
     """
     logger.info("Starting cleanup of old notifications")
     
@@ -87,22 +121,37 @@ def cleanup_old_notifications():
     db = SessionLocal()
     
     try:
-        # Define cutoff date (90 days ago)
-        cutoff_date = datetime.utcnow() - timedelta(days=90)
-        
-        # Get count of old notifications
-        count = db.query(func.count(Notification.id)).filter(
-            Notification.created_at < cutoff_date
-        ).scalar()
+        # Define cutoff date (90 days ago by default)
+        cutoff_date = datetime.utcnow() - timedelta(days=settings.NOTIFICATION_RETENTION_DAYS)
         
-        logger.info(f"Found {count} old notifications to cleanup")
+        # With partitioning, retention is a metadata-only partition drop
+        if settings.NOTIFICATIONS_PARTITIONED:
+            if settings.ARCHIVE_ENABLED:
+                # Only whole months are dropped, so only whole months are archived
+                archived = archive_notifications(
+                    db,
+                    datetime(cutoff_date.year, cutoff_date.month, 1),
+                    delete=False,
+                    skip_archived_months=True
+                )
+                logger.info(f"Archived {archived['rows']} notifications from {archived['months']} months")
+            dropped = drop_expired_notification_partitions(db, cutoff_date)
+            if dropped:
+                bump_global_version()
+            logger.info(f"Dropped {len(dropped)} expired notification partitions")
+            return True
         
-        # Delete old notifications
-        if count > 0:
-            db.query(Notification).filter(
+        if settings.ARCHIVE_ENABLED:
+            # Rows are deleted month by month as their archive segments are committed
+            count = archive_notifications(db, cutoff_date)["rows"]
+        else:
+            # Delete old notifications in one statement, the row count comes back with it
+            count = db.query(Notification).filter(
                 Notification.created_at < cutoff_date
             ).delete(synchronize_session=False)
             db.commit()
+        if count:
+            bump_global_version()
         
         logger.info(f"Cleaned up {count} old notifications")
         return True
@@ -112,29 +161,114 @@ def cleanup_old_notifications():
     finally:
         db.close()
 
-def _create_digest_body(notifications: List[Notification]) -> str:
+@shared_task(name="maintain_notification_partitions")
+def maintain_notification_partitions():
     """
-    Create the HTML body for the daily digest email
+    Create upcoming monthly partitions of the notifications table ahead of time
     """
-    html_body = f"""
+    if not settings.NOTIFICATIONS_PARTITIONED:
+        return True
     
-        Your Daily Notification Digest
-        You have the following unread notifications:
-        
-    """
+    logger.info("Starting notification partition maintenance")
     
-    for notification in notifications:
-        html_body += f"""
-        
-{notification.subject}: {notification.body[:100]}...
-        
-"""
+    # Get database session
+    db = SessionLocal()
     
-    html_body += """
-        
-        Login to your account to view all notifications.
+    try:
+        created = ensure_notification_partitions(db)
+        logger.info(f"Created {len(created)} notification partitions")
+        return True
+    except Exception as e:
+        logger.error(f"Error maintaining notification partitions: {str(e)}")
+        return False
+    finally:
+        db.close()
+
+@shared_task(name="report_delivery_latency")
+def report_delivery_latency():
+    """
+    Recompute the delivery latency percentiles of the rolling windows that are due
+    """
+    # Get database session
+    db = SessionLocal()
     
+    try:
+        for report in refresh_latency_reports(db):
+            for group in report["groups"]:
+                logger.info(
+                    f"Delivery latency over {report['window_seconds']}s for {group['channel']}/{group['priority']} "
+                    f"({group['count']} notifications): total p95 {group['stages']['total']['p95']} ms, "
+                    f"queue wait p95 {group['stages']['queue_wait']['p95']} ms, "
+                    f"provider p95 {group['stages']['provider']['p95']} ms"
+                )
+        return True
+    except Exception as e:
+        logger.error(f"Error reporting delivery latency: {str(e)}")
+        return False
+    finally:
+        db.close()
+
+@shared_task(name="flush_read_receipts")
+def flush_read_receipts():
+    """
+    Apply the read receipts buffered by the API in batches
+    """
+    # Get database session
+    db = SessionLocal()
     
+    try:
+        result = flush_receipts(db)
+        if result["receipts"]:
+            logger.info(f"Applied {result['receipts']} read receipts, {result['updated']} notifications marked read")
+        return True
+    except Exception as e:
+        logger.error(f"Error flushing read receipts: {str(e)}")
+        return False
+    finally:
+        db.close()
+
+@shared_task(name="reap_notifications")
+def reap_notifications():
     """
+    Queue again the notifications left behind by crashed workers or failed publishes
+
+    Sending notifications whose lease expired and queued ones that never got a task are found
+    through partial indexes and re-published in batches, up to REAPER_MAX_BATCHES per run.
+    """
+    # Get database session
+    db = SessionLocal()
     
-    return html_body
+    try:
+        counts = {"expired": 0, "unqueued": 0, "failed": 0}
+        for kind, requeue in (("expired", requeue_expired_claims), ("unqueued", requeue_unqueued)):
+            for _ in range(settings.REAPER_MAX_BATCHES):
+                rows = requeue(db, settings.REAPER_BATCH_SIZE)
+                if not rows:
+                    break
+                queued = [row for row in rows if row.status == NotificationStatus.QUEUED]
+                counts["failed"] += len(rows) - len(queued)
+                published = True
+                try:
+                    # One broker round trip per batch
+                    queue_notifications(queued)
+                    counts[kind] += len(queued)
+                except Exception as e:
+                    logger.error(f"Failed to re-queue {len(queued)} notifications: {str(e)}")
+                    clear_task_ids(db, [row.id for row in queued])
+                    published = False
+                bump_user_versions(row.user_id for row in rows)
+                if not published or len(rows) < settings.REAPER_BATCH_SIZE:
+                    # Broker trouble, or nothing left: try again on the next run
+                    break
+        
+        if any(counts.values()):
+            logger.warning(
+                f"Reaper re-queued {counts['expired']} notifications with expired claims and "
+                f"{counts['unqueued']} never published, failed {counts['failed']} claimed too often"
+            )
+        return counts
+    except Exception as e:
+        logger.error(f"Error reaping notifications: {str(e)}")
+        return False
+    finally:
+        db.close()
@@ -0,0 +1,209 @@
+import logging
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import MessageTemplate
+from app.services.content_service import MessageCache
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_ID_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_.-]{0,99}$")
+
+# Templates owned by the service itself, compiled from code rather than loaded from the database.
+# Bump a version whenever its text changes, queued notifications keep rendering their own version.
+SYSTEM_TEMPLATES = {
+    "daily_digest": {
+        "version": 1,
+        "subject": "Your Daily Notification Digest",
+        "body": """
+
+        Your Daily Notification Digest
+        You have the following unread notifications:
+
+    {% for item in items %}
+
+{{ item.subject }}: {{ item.snippet }}...
+
+{% endfor %}
+
+        Login to your account to view all notifications.
+
+
+    """,
+        "html": True,
+    },
+}
+
+class TemplateError(ValueError):
+    """
+    A template that does not compile, or a render request it cannot satisfy
+    """
+
+class CompiledTemplate:
+    """
+    Compiled subject and body of one template version
+    """
+    def __init__(self, template_id: str, version: int, subject: str, body: str, html: bool):
+        self.template_id = template_id
+        self.version = version
+        self.html = html
+        self._source = body or ""
+        try:
+            # Subjects are plain text headers, only bodies are escaped
+            self.subject = _environment(False).from_string(subject or "")
+            self.body = _environment(html).from_string(self._source)
+        except Exception as e:
+            raise TemplateError(f"Template {template_id} v{version} does not compile: {str(e)}")
+        self._text_body = None if html else self.body
+
+    def render(self, variables: Optional[Dict], html: bool = True) -> Tuple[str, str]:
+        """
+        Render (subject, body); html=False never escapes the body, for plain-text channels
+        """
+        variables = variables or {}
+        body = self.body
+        if not html:
+            # Compiled on first use, most templates only ever go out by email
+            if self._text_body is None:
+                self._text_body = _environment(False).from_string(self._source)
+            body = self._text_body
+        return self.subject.render(variables), body.render(variables)
+
+template_cache = MessageCache(settings.TEMPLATE_CACHE_SIZE)
+
+_environments: Dict[bool, object] = {}
+_environments_lock = threading.Lock()
+
+def _environment(html: bool):
+    """
+    Sandboxed Jinja2 environment (templates are registered through the API), created on first use
+    """
+    if html not in _environments:
+        with _environments_lock:
+            if html not in _environments:
+                # Imported here, only processes that compile templates pay for it
+                from jinja2.sandbox import SandboxedEnvironment
+
+                _environments[html] = SandboxedEnvironment(autoescape=html, auto_reload=False)
+    return _environments[html]
+
+def template_variables(subject: str, body: str) -> List[str]:
+    """
+    Names of the variables referenced by a template
+    """
+    from jinja2 import meta
+
+    environment = _environment(False)
+    try:
+        names = meta.find_undeclared_variables(environment.parse(subject or ""))
+        names |= meta.find_undeclared_variables(environment.parse(body or ""))
+    except Exception as e:
+        raise TemplateError(f"Template does not compile: {str(e)}")
+    return sorted(names)
+
+def register_template(db: Session, template_id: str, subject: str, body: str, html: bool = True) -> MessageTemplate:
+    """
+    Store a new version of a template, compiled first so broken templates never reach workers
+    """
+    if not TEMPLATE_ID_PATTERN.match(template_id):
+        raise TemplateError(f"Invalid template ID '{template_id}'")
+    if template_id in SYSTEM_TEMPLATES:
+        raise TemplateError(f"Template ID '{template_id}' is reserved")
+
+    variables = template_variables(subject, body)
+    latest = db.query(func.max(MessageTemplate.version)).filter(
+        MessageTemplate.id == template_id
+    ).scalar()
+    template = MessageTemplate(
+        id=template_id,
+        version=(latest or 0) + 1,
+        subject=subject,
+        body=body,
+        html=html,
+        variables=variables
+    )
+    CompiledTemplate(template.id, template.version, subject, body, html)
+    db.add(template)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise TemplateError(f"Template {template_id} was registered concurrently, retry")
+    logger.info(f"Registered template {template.id} v{template.version}")
+    return template
+
+def get_template(db: Session, template_id: str, version: Optional[int] = None) -> Optional[MessageTemplate]:
+    """
+    Get a version of a registered template, the latest one by default
+    """
+    query = db.query(MessageTemplate).filter(MessageTemplate.id == template_id)
+    if version is not None:
+        return query.filter(MessageTemplate.version == version).first()
+    return query.order_by(MessageTemplate.version.desc()).first()
+
+def resolve_template(db: Session, template_id: str, template_vars: Optional[Dict]) -> Tuple[str, int]:
+    """
+    Pin the latest version of a template for a new notification, checking its variables are given
+    """
+    system = SYSTEM_TEMPLATES.get(template_id)
+    if system is not None:
+        return template_id, system["version"]
+
+    template = get_template(db, template_id)
+    if template is None:
+        raise LookupError(f"Template {template_id} not found")
+    missing = set(template.variables or []) - set(template_vars or {})
+    if missing:
+        raise TemplateError(f"Missing variables for template {template_id}: {', '.join(sorted(missing))}")
+    return template.id, template.version
+
+def prefetch_templates(db: Session, keys: Iterable[Tuple[str, int]]) -> None:
+    """
+    Load and compile every uncached (template ID, version) of the given keys with a single query
+    """
+    missing = set()
+    for key in keys:
+        if key[0] is None or template_cache.get(key) is not None:
+            continue
+        system = SYSTEM_TEMPLATES.get(key[0])
+        if system is not None and system["version"] == key[1]:
+            template_cache.put(key, CompiledTemplate(key[0], key[1], system["subject"], system["body"], system["html"]))
+        else:
+            missing.add(key)
+    if not missing:
+        return
+    rows = db.query(MessageTemplate).filter(
+        tuple_(MessageTemplate.id, MessageTemplate.version).in_(list(missing))
+    ).all()
+    for row in rows:
+        template_cache.put((row.id, row.version), CompiledTemplate(row.id, row.version, row.subject, row.body, row.html))
+
+def get_compiled_template(db: Session, template_id: str, version: int) -> CompiledTemplate:
+    """
+    Get a compiled template version, compiled once per process and then served from the LRU
+    """
+    key = (template_id, version)
+    compiled = template_cache.get(key)
+    if compiled is None:
+        prefetch_templates(db, [key])
+        compiled = template_cache.get(key)
+        if compiled is None:
+            raise LookupError(f"Template {template_id} v{version} not found")
+    return compiled
+
+def render_template(
+    db: Session, template_id: str, version: int, variables: Optional[Dict], html: bool = True
+) -> Tuple[str, str]:
+    """
+    Render the (subject, body) of a template version with per-recipient variables
+
+    Pass html=False for channels that are not HTML (SMS, in-app): the body is then rendered
+    unescaped even when the template escapes variables for email.
+    """
+    return get_compiled_template(db, template_id, version).render(variables, html)
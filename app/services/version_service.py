@@ -0,0 +1,145 @@
+import hashlib
+import itertools
+import logging
+import time
+from typing import Iterable, Optional
+from uuid import UUID
+
+from sqlalchemy import event
+from starlette.requests import Request
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.db.models import Notification
+from app.db.replicas import mark_recent_write
+
+logger = logging.getLogger(__name__)
+
+# Bumped on every change to a user's notifications
+USER_VERSION_KEY = "user_version:{}"
+# Bumped by changes that touch many users at once (retention cleanup, partition drops)
+GLOBAL_VERSION_KEY = "notifications_version"
+
+# Bumped on every preference change; workers refresh their preference index when it moves
+PREFERENCE_VERSION_KEY = "preference_index_version"
+
+# Notification owners changed in the current transaction, bumped once it commits
+_PENDING_USERS = "changed_notification_users"
+
+def _initial_version() -> int:
+    # Versions restart from the clock when a key is lost (eviction, expiry, flush), so an
+    # ETag issued before can never match again
+    return time.time_ns()
+
+def bump_user_versions(user_ids: Iterable) -> None:
+    """
+    Record a change to the notifications of the given users, invalidating their ETags
+
+    Also pins the users' reads to the primary for the read-your-writes window, whether or not
+    ETags are enabled, so a client never reads (or caches) replica data older than its write.
+    """
+    user_ids = {str(user_id) for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return
+    # Read-your-writes does not depend on ETags, only the version bump does
+    mark_recent_write(*user_ids)
+    if not settings.ETAGS_ENABLED:
+        return
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for user_id in user_ids:
+            key = USER_VERSION_KEY.format(user_id)
+            pipe.set(key, _initial_version(), nx=True, ex=settings.USER_VERSION_TTL)
+            pipe.incr(key)
+            pipe.expire(key, settings.USER_VERSION_TTL)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to bump user versions: {str(e)}")
+
+def bump_global_version() -> None:
+    """
+    Invalidate every user's ETags, for changes too wide to bump user by user
+    """
+    if not settings.ETAGS_ENABLED:
+        return
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.set(GLOBAL_VERSION_KEY, _initial_version(), nx=True)
+        pipe.incr(GLOBAL_VERSION_KEY)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to bump the global notifications version: {str(e)}")
+
+def bump_preference_version() -> None:
+    """
+    Tell workers that user preferences changed so their preference index refreshes before
+    the next fan-out chunk instead of on its refresh interval
+    """
+    try:
+        get_redis().incr(PREFERENCE_VERSION_KEY)
+    except Exception as e:
+        logger.warning(f"Failed to bump the preference version: {str(e)}")
+
+def user_notifications_etag(user_id: UUID, request: Request) -> Optional[str]:
+    """
+    ETag of a user's notification list for this exact URL, read in one Redis round trip
+
+    Read it before querying Postgres: a change racing with the query then only ever pairs
+    newer data with an older ETag, which the next poll corrects. None when Redis is down.
+    """
+    if not settings.ETAGS_ENABLED:
+        return None
+    key = USER_VERSION_KEY.format(user_id)
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.set(GLOBAL_VERSION_KEY, _initial_version(), nx=True)
+        pipe.set(key, _initial_version(), nx=True, ex=settings.USER_VERSION_TTL)
+        pipe.mget(GLOBAL_VERSION_KEY, key)
+        global_version, user_version = pipe.execute()[-1]
+    except Exception as e:
+        logger.warning(f"Failed to read user version: {str(e)}")
+        return None
+    if global_version is None or user_version is None:
+        return None
+    url = hashlib.sha1(f"{request.url.path}?{request.url.query}".encode()).hexdigest()[:12]
+    return f'W/"{int(global_version):x}.{int(user_version):x}.{url}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Weak comparison of an If-None-Match header against an ETag
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any(
+        (candidate.strip()[2:] if candidate.strip().startswith("W/") else candidate.strip()) == opaque
+        for candidate in if_none_match.split(",")
+    )
+
+def _collect_changed_users(session, flush_context) -> None:
+    pending = session.info.setdefault(_PENDING_USERS, set())
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Notification) and obj.user_id is not None:
+            pending.add(obj.user_id)
+
+def _bump_committed_users(session) -> None:
+    pending = session.info.pop(_PENDING_USERS, None)
+    if pending:
+        bump_user_versions(pending)
+
+def _discard_changed_users(session, previous_transaction=None) -> None:
+    session.info.pop(_PENDING_USERS, None)
+
+def setup_version_tracking(session_factory) -> None:
+    """
+    Bump user versions after commits that change Notification objects through the ORM
+
+    Bulk statements (bulk_save_objects, update(), raw SQL) do not go through the unit of work,
+    so their callers bump explicitly.
+    """
+    if not event.contains(session_factory, "after_flush", _collect_changed_users):
+        event.listen(session_factory, "after_flush", _collect_changed_users)
+        event.listen(session_factory, "after_commit", _bump_committed_users)
+        event.listen(session_factory, "after_rollback", _discard_changed_users)
@@ -0,0 +1,128 @@
+"""
+Local stand-ins for the Gmail and Twilio HTTP APIs
+
+Both APIs are served from one port with configurable latency and error rate, so the delivery
+pipeline can be load tested without touching real providers:
+
+    python benchmarks/fake_providers.py --port 8090 --latency-ms 80 --jitter-ms 40 --error-rate 0.01
+
+Point the service at it with GMAIL_API_ENDPOINT=http://host:8090/ and
+TWILIO_API_BASE_URL=http://host:8090; benchmarks/fake_token.json refreshes against POST /token.
+GET /stats returns request counters.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+GMAIL_SEND_PATH = re.compile(r"^/gmail/v1/users/[^/]+/messages/send")
+TWILIO_MESSAGES_PATH = re.compile(r"^/2010-04-01/Accounts/([^/]+)/Messages\.json")
+
+class ProviderStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {"gmail_ok": 0, "gmail_error": 0, "twilio_ok": 0, "twilio_error": 0}
+
+    def incr(self, key: str) -> None:
+        with self._lock:
+            self.counts[key] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Set by make_server
+    latency = 0.0
+    jitter = 0.0
+    error_rate = 0.0
+    stats: ProviderStats = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _simulate(self) -> bool:
+        """
+        Sleep for the configured latency and decide whether this call fails
+        """
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        return random.random() >= self.error_rate
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send_json(200, self.stats.snapshot())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path == "/token":
+            # OAuth token refresh for the benchmark credentials
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            self._send_json(200, {"access_token": "benchmark-access-token", "expires_in": 3600, "token_type": "Bearer"})
+            return
+
+        if GMAIL_SEND_PATH.match(self.path):
+            if self._simulate():
+                self.stats.incr("gmail_ok")
+                self._send_json(200, {"id": uuid.uuid4().hex, "labelIds": ["SENT"]})
+            else:
+                self.stats.incr("gmail_error")
+                self._send_json(503, {"error": {"code": 503, "message": "Backend Error"}})
+            return
+
+        match = TWILIO_MESSAGES_PATH.match(self.path)
+        if match:
+            if self._simulate():
+                self.stats.incr("twilio_ok")
+                self._send_json(201, {
+                    "sid": "SM" + uuid.uuid4().hex,
+                    "account_sid": match.group(1),
+                    "status": "queued"
+                })
+            else:
+                self.stats.incr("twilio_error")
+                self._send_json(503, {"code": 20503, "message": "Service unavailable", "status": 503})
+            return
+
+        self._send_json(404, {"error": "not found"})
+
+def make_server(host: str, port: int, latency_ms: float, jitter_ms: float, error_rate: float) -> ThreadingHTTPServer:
+    handler = type("ConfiguredFakeProviderHandler", (FakeProviderHandler,), {
+        "latency": latency_ms / 1000.0,
+        "jitter": jitter_ms / 1000.0,
+        "error_rate": error_rate,
+        "stats": ProviderStats(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Gmail and Twilio APIs for load testing")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency_ms, args.jitter_ms, args.error_rate)
+    print(f"Fake providers listening on {args.host}:{args.port}", flush=True)
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Task payload size and encode/decode cost per serializer
+
+Builds the message bodies Celery publishes for the service's tasks and compares the
+accepted serializers (json and msgpack-zlib) on broker bytes and per-task CPU cost:
+
+    python benchmarks/serialization_benchmark.py --iterations 20000 --output serialization.json
+
+Needs no broker; payloads are encoded with kombu exactly as the producer would.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kombu.serialization import dumps, loads, prepare_accept_content
+
+from app.core.celery_app import celery_app
+from app.core.serialization import MSGPACK_ZLIB
+
+SERIALIZERS = ["json", MSGPACK_ZLIB]
+ACCEPT = prepare_accept_content(SERIALIZERS)
+
+def _html_email(paragraphs: int) -> str:
+    rows = "".join(
+        f'<tr><td style="padding:12px;font-family:Arial,sans-serif;font-size:14px;color:#333333">'
+        f"Order #{1000 + i}: your item has shipped and will arrive within {i % 5 + 2} business days. "
+        f'<a href="https://example.com/orders/{1000 + i}?utm_source=email&utm_medium=notification">Track it</a>'
+        f"</td></tr>"
+        for i in range(paragraphs)
+    )
+    return f'<html><body><table width="600" cellpadding="0" cellspacing="0">{rows}</table></body></html>'
+
+def scenarios() -> Dict[str, tuple]:
+    """
+    (task name, args, kwargs) of representative publishes
+    """
+    notification_id, user_id = str(uuid.uuid4()), str(uuid.uuid4())
+    message_id = "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08"
+    return {
+        # Current delivery tasks carry IDs only
+        "delivery_by_id": ("send_email_notification", [notification_id, user_id], {"message_id": message_id, "template_id": None}),
+        "delivery_by_template": ("send_in_app_notification", [notification_id, user_id], {"message_id": None, "template_id": "payment_received"}),
+        # Tasks published with inline content (pre-dedup producers, direct task calls)
+        "inline_sms": ("send_sms_notification", [notification_id, user_id], {"body": "Your verification code is 481516. It expires in 10 minutes."}),
+        "inline_html_email_4kb": ("send_email_notification", [notification_id, user_id], {"subject": "Your orders have shipped", "body": _html_email(15)}),
+        "inline_html_email_40kb": ("send_email_notification", [notification_id, user_id], {"subject": "Your orders have shipped", "body": _html_email(150)}),
+        "run_broadcast": ("run_broadcast", [str(uuid.uuid4())], {}),
+    }
+
+def task_body(name: str, args: List, kwargs: Dict):
+    """
+    The body Celery serializes for a publish (protocol 2: args, kwargs, embed)
+    """
+    return celery_app.amqp.as_task_v2(str(uuid.uuid4()), name, args, kwargs).body
+
+def round_trip(body, serializer: str):
+    content_type, encoding, data = dumps(body, serializer=serializer)
+    return loads(data, content_type, encoding, accept=ACCEPT)
+
+def measure(body, serializer: str, iterations: int) -> Dict:
+    content_type, encoding, data = dumps(body, serializer=serializer)
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        dumps(body, serializer=serializer)
+    encode_us = (time.perf_counter() - started) / iterations * 1e6
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        loads(data, content_type, encoding, accept=ACCEPT)
+    decode_us = (time.perf_counter() - started) / iterations * 1e6
+
+    return {"bytes": len(data), "encode_us": round(encode_us, 2), "decode_us": round(decode_us, 2)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Celery task serializer benchmark")
+    parser.add_argument("--iterations", type=int, default=10000)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'scenario':<26}{'serializer':<14}{'bytes':>8}{'ratio':>8}{'encode us':>11}{'decode us':>11}")
+    for scenario, (name, task_args, task_kwargs) in scenarios().items():
+        body = task_body(name, task_args, task_kwargs)
+        expected = round_trip(body, "json")
+        results[scenario] = {}
+        for serializer in SERIALIZERS:
+            # Tasks must receive the same arguments whichever serializer published them
+            assert round_trip(body, serializer) == expected, f"{serializer} round trip differs for {scenario}"
+            result = measure(body, serializer, args.iterations)
+            result["ratio"] = round(result["bytes"] / results[scenario]["json"]["bytes"], 3) if serializer != "json" else 1.0
+            results[scenario][serializer] = result
+            print(
+                f"{scenario:<26}{serializer:<14}{result['bytes']:>8}{result['ratio']:>8}"
+                f"{result['encode_us']:>11}{result['decode_us']:>11}"
+            )
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+if __name__ == "__main__":
+    main()
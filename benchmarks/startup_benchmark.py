@@ -0,0 +1,103 @@
+"""
+Cold start benchmark for the API and the Celery worker
+
+Each measurement runs in a fresh interpreter, so nothing is cached in-process:
+
+- api: import app.main and run the startup handlers (what a new API pod does before serving)
+- worker: import the Celery app and every task module it includes
+
+    python benchmarks/startup_benchmark.py --runs 5 --max-seconds 1.0 --top-imports 15
+
+Reports median and max per phase: import, startup, boot (import + startup, the part the
+service controls) and wall (process wall time, interpreter start included), plus the slowest
+imports of the API with --top-imports. Exits with 1 when a median boot exceeds --max-seconds.
+Uses the service's normal environment (.env / environment variables) and needs no running
+database, broker or provider.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    "api": """
+import asyncio, time
+started = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+asyncio.run(app.router.startup())
+ready = time.perf_counter()
+print({"import": imported - started, "startup": ready - imported})
+""",
+    "worker": """
+import time
+started = time.perf_counter()
+from app.core.celery_app import celery_app
+imported = time.perf_counter()
+celery_app.loader.import_default_modules()
+ready = time.perf_counter()
+print({"import": imported - started, "startup": ready - imported})
+""",
+}
+
+def run_once(code: str) -> Dict[str, float]:
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    wall = time.perf_counter() - started
+    phases = eval(output.strip().splitlines()[-1])
+    return {"wall": wall, "boot": phases["import"] + phases["startup"], **phases}
+
+def top_imports(limit: int) -> List[Dict]:
+    """
+    Slowest modules (cumulative) when importing the API, from -X importtime
+    """
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        rows.append({"module": module.strip(), "cumulative_ms": int(cumulative) / 1000})
+    return sorted(rows, key=lambda row: row["cumulative_ms"], reverse=True)[:limit]
+
+def main():
+    parser = argparse.ArgumentParser(description="API and worker cold start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, help="Fail when a median boot exceeds this")
+    parser.add_argument("--top-imports", type=int, default=0, help="List the N slowest API imports")
+    args = parser.parse_args()
+
+    results = {}
+    for target, code in TARGETS.items():
+        runs = [run_once(code) for _ in range(args.runs)]
+        results[target] = {
+            phase: {
+                "median_s": round(statistics.median(run[phase] for run in runs), 3),
+                "max_s": round(max(run[phase] for run in runs), 3),
+            }
+            for phase in ("import", "startup", "boot", "wall")
+        }
+    if args.top_imports:
+        results["api_top_imports"] = top_imports(args.top_imports)
+
+    print(json.dumps(results, indent=2))
+
+    if args.max_seconds is not None:
+        slow = [target for target in TARGETS if results[target]["boot"]["median_s"] > args.max_seconds]
+        if slow:
+            print(f"Cold start above {args.max_seconds}s: {', '.join(slow)}", file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import pytest
+
+from app.core.config import settings
+from app.services import circuit_breaker as circuit_breaker_module
+from app.services.circuit_breaker import CIRCUIT_KEY, CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker_module, "time", clock)
+    return clock
+
+@pytest.fixture
+def breaker(redis_client, clock, monkeypatch):
+    monkeypatch.setattr(settings, "CIRCUIT_BREAKER_ENABLED", True)
+    monkeypatch.setattr(settings, "CIRCUIT_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(settings, "CIRCUIT_FAILURE_RATE", 0.5)
+    monkeypatch.setattr(settings, "CIRCUIT_WINDOW_SECONDS", 30)
+    monkeypatch.setattr(settings, "CIRCUIT_OPEN_SECONDS", 30)
+    monkeypatch.setattr(settings, "CIRCUIT_HALF_OPEN_PROBES", 2)
+    return CircuitBreaker()
+
+def _open(breaker: CircuitBreaker) -> None:
+    for _ in range(settings.CIRCUIT_FAILURE_THRESHOLD):
+        breaker.record("gmail", False)
+
+def _half_open(breaker: CircuitBreaker, clock: Clock) -> None:
+    _open(breaker)
+    clock.now += settings.CIRCUIT_OPEN_SECONDS
+
+def test_closed_circuit_allows_calls(breaker):
+    assert breaker.allow("gmail") == (True, 0.0)
+    assert breaker.record("gmail", True) == CLOSED
+
+def test_failures_below_the_rate_keep_the_circuit_closed(breaker):
+    for _ in range(4):
+        breaker.record("gmail", True)
+    # 3 failures of 7 calls
+    assert [breaker.record("gmail", False) for _ in range(3)] == [CLOSED] * 3
+
+def test_failures_open_the_circuit(breaker, clock):
+    _open(breaker)
+
+    clock.now += 10
+    allowed, wait = breaker.allow("gmail")
+    assert not allowed
+    assert wait == pytest.approx(20)
+    assert breaker.state("gmail")["state"] == OPEN
+
+def test_failures_of_an_old_window_do_not_count(breaker, clock):
+    breaker.record("gmail", False)
+    breaker.record("gmail", False)
+    clock.now += settings.CIRCUIT_WINDOW_SECONDS + 1
+
+    assert breaker.record("gmail", False) == CLOSED
+
+def test_half_open_admits_a_limited_number_of_probes(breaker, clock):
+    _half_open(breaker, clock)
+
+    assert breaker.allow("gmail")[0]
+    assert breaker.allow("gmail")[0]
+    allowed, wait = breaker.allow("gmail")
+    assert not allowed
+    assert wait == pytest.approx(settings.CIRCUIT_OPEN_SECONDS)
+    assert breaker.state("gmail")["state"] == HALF_OPEN
+
+def test_released_probe_slots_are_given_back(breaker, clock):
+    _half_open(breaker, clock)
+    breaker.allow("gmail")
+    breaker.allow("gmail")
+
+    breaker.release("gmail")
+    assert breaker.allow("gmail")[0]
+
+def test_lost_probes_are_written_off_after_an_open_period(breaker, clock):
+    _half_open(breaker, clock)
+    breaker.allow("gmail")
+    breaker.allow("gmail")
+
+    clock.now += settings.CIRCUIT_OPEN_SECONDS
+    assert breaker.allow("gmail")[0]
+
+def test_successful_probes_close_the_circuit(breaker, clock):
+    _half_open(breaker, clock)
+
+    breaker.allow("gmail")
+    assert breaker.record("gmail", True) == HALF_OPEN
+    breaker.allow("gmail")
+    assert breaker.record("gmail", True) == CLOSED
+    assert breaker.state("gmail")["state"] == CLOSED
+
+def test_failed_probe_opens_the_circuit_again(breaker, clock):
+    _half_open(breaker, clock)
+
+    breaker.allow("gmail")
+    assert breaker.record("gmail", False) == OPEN
+    assert not breaker.allow("gmail")[0]
+
+def test_release_does_nothing_to_a_closed_circuit(breaker, redis_client):
+    breaker.release("gmail")
+    assert redis_client.hgetall(CIRCUIT_KEY.format("gmail")) == {}
+
+def test_calls_that_never_reach_the_provider_release_their_probe(breaker, clock):
+    _half_open(breaker, clock)
+    breaker.allow("gmail")
+    breaker.allow("gmail")
+
+    # The second call skipped the provider (say, its claim was lost)
+    breaker.release_unless_called("gmail")
+    assert breaker.state("gmail")["probes"] == 1
+
+def test_calls_that_reached_the_provider_keep_their_probe(breaker, clock):
+    _half_open(breaker, clock)
+    breaker.allow("gmail")
+    breaker.allow("gmail")
+    # The second probe succeeded, the first one is still out
+    breaker.record("gmail", True)
+
+    breaker.release_unless_called("gmail")
+    assert breaker.state("gmail")["probes"] == 1
+
+def test_redis_errors_allow_the_call(clock, monkeypatch):
+    import app.core.redis_client
+
+    monkeypatch.setattr(settings, "CIRCUIT_BREAKER_ENABLED", True)
+    monkeypatch.setattr(settings, "REDIS_URL", "redis://127.0.0.1:1/0")
+    monkeypatch.setattr(app.core.redis_client, "_redis_client", None)
+    assert CircuitBreaker().allow("gmail") == (True, 0.0)
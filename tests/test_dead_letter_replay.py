@@ -0,0 +1,93 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db.models import DeadLetter, Notification, NotificationStatus, NotificationType, User
+from app.services import dead_letter_service
+from app.services.tasks import dead_letter_tasks
+
+class ReplayTestError(Exception):
+    """
+    Error class of this module's dead letters, so replays only take them
+    """
+
+FILTERS = {"error_class": "ReplayTestError"}
+
+@pytest.fixture
+def failed_notification(db, redis_client, monkeypatch):
+    """
+    A failed email notification with its dead letter
+    """
+    monkeypatch.setattr(dead_letter_tasks, "_is_backlogged", lambda: False)
+    user = User(id=uuid.uuid4(), email=f"{uuid.uuid4().hex}@example.com")
+    db.add(user)
+    db.commit()
+    notification = Notification(
+        id=uuid.uuid4(),
+        user_id=user.id,
+        type=NotificationType.EMAIL,
+        subject="Subject",
+        body="Body",
+        status=NotificationStatus.FAILED,
+        task_id=str(uuid.uuid4())
+    )
+    db.add(notification)
+    db.commit()
+    dead_letter_service.record_dead_letter(
+        db, "send_email_notification", notification.task_id, str(notification.id), str(user.id),
+        ReplayTestError("provider said no"), []
+    )
+    yield notification
+    db.rollback()
+    db.query(DeadLetter).filter(DeadLetter.notification_id == notification.id).delete()
+    db.query(Notification).filter(Notification.id == notification.id).delete()
+    db.query(User).filter(User.id == user.id).delete()
+    db.commit()
+
+def _until() -> str:
+    return (datetime.utcnow() + timedelta(minutes=1)).isoformat()
+
+def _entry(db, notification) -> DeadLetter:
+    db.expire_all()
+    return db.query(DeadLetter).filter(DeadLetter.notification_id == notification.id).one()
+
+def test_replay_queues_the_notification_again(db, failed_notification, monkeypatch):
+    published = []
+    monkeypatch.setattr(dead_letter_tasks, "queue_notifications", lambda rows, queue=None: published.extend(rows))
+
+    assert dead_letter_tasks.replay_dead_letters(FILTERS, _until()) == 1
+    assert [row.id for row in published] == [failed_notification.id]
+    entry = _entry(db, failed_notification)
+    assert entry.replayed_at is not None
+    assert entry.replay_count == 1
+    db.refresh(failed_notification)
+    assert failed_notification.status == NotificationStatus.QUEUED
+    # A new task ID retires any older task of the notification still in the broker
+    assert failed_notification.task_id == published[0].task_id != entry.task_id
+
+def test_failed_publish_restores_the_batch(db, failed_notification, monkeypatch):
+    def fail(rows, queue=None):
+        raise ConnectionError("broker unavailable")
+
+    monkeypatch.setattr(dead_letter_tasks, "queue_notifications", fail)
+
+    with pytest.raises(ConnectionError):
+        dead_letter_tasks.replay_dead_letters(FILTERS, _until())
+    entry = _entry(db, failed_notification)
+    assert entry.replayed_at is None
+    assert entry.replay_count == 0
+    db.refresh(failed_notification)
+    assert failed_notification.status == NotificationStatus.FAILED
+    assert failed_notification.task_id is None
+
+def test_cancelled_notifications_are_not_replayed(db, failed_notification, monkeypatch):
+    published = []
+    monkeypatch.setattr(dead_letter_tasks, "queue_notifications", lambda rows, queue=None: published.extend(rows))
+    failed_notification.cancelled_at = datetime.utcnow()
+    db.commit()
+
+    assert dead_letter_tasks.replay_dead_letters(FILTERS, _until()) == 0
+    assert published == []
+    db.refresh(failed_notification)
+    assert failed_notification.status == NotificationStatus.FAILED
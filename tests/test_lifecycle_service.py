@@ -0,0 +1,46 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.services import lifecycle_service
+
+@pytest.fixture
+def computed(monkeypatch, redis_client):
+    """
+    Windows whose report was computed, in order; computing needs no database
+    """
+    windows = []
+
+    def compute(db, window_seconds):
+        windows.append(window_seconds)
+        return {"window_seconds": window_seconds, "generated_at": datetime.utcnow().isoformat(), "groups": []}
+
+    monkeypatch.setattr(lifecycle_service, "compute_latency_report", compute)
+    monkeypatch.setattr(settings, "LATENCY_REPORT_WINDOWS", [300, 3600, 86400])
+    monkeypatch.setattr(settings, "LATENCY_REPORT_INTERVAL", 60)
+    monkeypatch.setattr(settings, "LATENCY_REPORT_REFRESH_FRACTION", 0.05)
+    return windows
+
+def _age_reports(redis_client, seconds: float) -> None:
+    for window in settings.LATENCY_REPORT_WINDOWS:
+        key = lifecycle_service._cache_key(window)
+        report = json.loads(redis_client.get(key))
+        report["generated_at"] = (datetime.fromisoformat(report["generated_at"]) - timedelta(seconds=seconds)).isoformat()
+        redis_client.set(key, json.dumps(report))
+
+def test_long_windows_are_refreshed_less_often(redis_client, computed):
+    lifecycle_service.refresh_latency_reports(None)
+    assert computed == [300, 3600, 86400]
+
+    # One beat later only the shortest window is due, the hour is due every third run
+    _age_reports(redis_client, 60)
+    assert [r["window_seconds"] for r in lifecycle_service.refresh_latency_reports(None)] == [300]
+    _age_reports(redis_client, 120)
+    assert [r["window_seconds"] for r in lifecycle_service.refresh_latency_reports(None)] == [300, 3600]
+
+def test_cached_long_window_is_served(redis_client, computed):
+    lifecycle_service.refresh_latency_reports(None)
+    assert lifecycle_service.get_latency_report(None, 86400)["window_seconds"] == 86400
+    assert computed == [300, 3600, 86400]
@@ -0,0 +1,85 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.core.config import settings
+from app.services.rate_limiter import DAILY_KEY, RateLimiter
+
+@pytest.fixture
+def gmail_limits(monkeypatch):
+    monkeypatch.setattr(settings, "GMAIL_RATE_PER_SECOND", 100.0)
+    monkeypatch.setattr(settings, "GMAIL_RATE_BURST", 100)
+    monkeypatch.setattr(settings, "GMAIL_DAILY_QUOTA", 50)
+    monkeypatch.setattr(settings, "RATE_LIMIT_BATCH_SIZE", 10)
+
+def _daily_key() -> str:
+    return DAILY_KEY.format("gmail", settings.GMAIL_SENDER) + datetime.now(timezone.utc).strftime("%Y%m%d")
+
+def _daily_used(redis_client) -> int:
+    return int(redis_client.get(_daily_key()) or 0)
+
+def _expire_batch(limiter: RateLimiter) -> None:
+    limiter._local["gmail"][1] = 0
+
+def test_batch_is_charged_to_the_daily_quota(redis_client, gmail_limits):
+    limiter = RateLimiter()
+    assert limiter.acquire("gmail") == (True, 0.0)
+    assert _daily_used(redis_client) == 10
+
+def test_daily_quota_only_counts_sends(redis_client, gmail_limits):
+    limiter = RateLimiter()
+    for _ in range(3):
+        assert limiter.acquire("gmail")[0]
+    _expire_batch(limiter)
+
+    # The 7 unspent tokens go back before the next batch of 10 is charged
+    assert limiter.acquire("gmail")[0]
+    assert _daily_used(redis_client) == 3 + 10
+
+def test_refund_makes_room_in_a_used_up_quota(redis_client, gmail_limits):
+    limiter = RateLimiter()
+    limiter.acquire("gmail")
+    _expire_batch(limiter)
+    redis_client.set(_daily_key(), 58)
+
+    # 58 charged minus the 9 refunded leaves room for a send
+    assert limiter.acquire("gmail")[0]
+
+def test_used_up_quota_defers_until_utc_midnight(redis_client, gmail_limits):
+    redis_client.set(_daily_key(), 50)
+    limiter = RateLimiter()
+
+    allowed, wait = limiter.acquire("gmail")
+    now = datetime.now(timezone.utc)
+    midnight = (now - now.replace(hour=0, minute=0, second=0, microsecond=0)).total_seconds()
+    assert not allowed
+    assert wait == pytest.approx(86400 - midnight, abs=5)
+    # Blocked locally, without asking Redis again
+    assert limiter.acquire("gmail")[0] is False
+
+def test_redis_errors_allow_the_call(monkeypatch, gmail_limits):
+    import app.core.redis_client
+
+    monkeypatch.setattr(settings, "REDIS_URL", "redis://127.0.0.1:1/0")
+    monkeypatch.setattr(app.core.redis_client, "_redis_client", None)
+    assert RateLimiter().acquire("gmail") == (True, 0.0)
+
+def test_refunded_token_is_spent_again(redis_client, gmail_limits):
+    limiter = RateLimiter()
+    limiter.acquire("gmail")
+    limiter.refund("gmail")
+    assert limiter._local["gmail"][0] == 10
+
+    # A refund without a token taken since is ignored
+    limiter.refund("gmail")
+    assert limiter._local["gmail"][0] == 10
+
+def test_refund_after_expiry_reaches_the_daily_quota(redis_client, gmail_limits):
+    limiter = RateLimiter()
+    limiter.acquire("gmail")
+    _expire_batch(limiter)
+    limiter.refund("gmail")
+
+    # All 10 tokens go back before the next batch is charged
+    limiter.acquire("gmail")
+    assert _daily_used(redis_client) == 10
@@ -0,0 +1,24 @@
+import uuid
+
+import pytest
+
+from app.core.config import settings
+from app.services.receipt_service import open_tracking_token, parse_open_tracking_token
+
+@pytest.fixture
+def signing_key(monkeypatch):
+    monkeypatch.setattr(settings, "RECEIPT_SIGNING_KEY", "test-signing-key")
+
+def test_token_round_trip(signing_key):
+    notification_id, user_id = uuid.uuid4(), uuid.uuid4()
+    assert parse_open_tracking_token(open_tracking_token(notification_id, user_id)) == (notification_id, user_id)
+
+def test_forged_and_malformed_tokens_are_rejected(signing_key):
+    token = open_tracking_token(uuid.uuid4(), uuid.uuid4())
+    assert parse_open_tracking_token(token[:-1] + ("0" if token[-1] != "0" else "1")) is None
+    assert parse_open_tracking_token("not-a-token") is None
+
+def test_non_ascii_signature_is_rejected(signing_key):
+    notification_id, user_id, _ = open_tracking_token(uuid.uuid4(), uuid.uuid4()).split(".")
+    assert parse_open_tracking_token(f"{notification_id}.{user_id}.ééé") is None
+    assert parse_open_tracking_token(f"é.{user_id}.abc") is None
@@ -0,0 +1,56 @@
+import uuid
+
+import pytest
+
+from app.db.models import Notification, NotificationStatus, NotificationType, User
+from app.services.tasks import scheduled_tasks
+
+@pytest.fixture
+def unread_user(db, redis_client):
+    """
+    A user with an unread notification from today
+    """
+    user = User(id=uuid.uuid4(), email=f"{uuid.uuid4().hex}@example.com", email_enabled=True)
+    db.add(user)
+    db.commit()
+    db.add(Notification(
+        id=uuid.uuid4(),
+        user_id=user.id,
+        type=NotificationType.IN_APP,
+        subject="Subject",
+        body="Body",
+        status=NotificationStatus.DELIVERED
+    ))
+    db.commit()
+    yield user
+    db.rollback()
+    db.query(Notification).filter(Notification.user_id == user.id).delete()
+    db.query(User).filter(User.id == user.id).delete()
+    db.commit()
+
+def _digests(db, user):
+    db.expire_all()
+    return db.query(Notification).filter(
+        Notification.user_id == user.id, Notification.template_id == scheduled_tasks.DIGEST_TEMPLATE
+    ).all()
+
+def test_digests_are_published_with_their_task_ids(db, unread_user, monkeypatch):
+    published = []
+    monkeypatch.setattr(scheduled_tasks, "queue_notifications", published.extend)
+
+    assert scheduled_tasks.send_daily_digest() is True
+    digest, = _digests(db, unread_user)
+    assert digest.status == NotificationStatus.QUEUED
+    assert digest.task_id in {notification.task_id for notification in published}
+
+def test_unpublished_digests_are_left_to_the_reaper(db, unread_user, monkeypatch):
+    def fail(notifications):
+        raise ConnectionError("broker unavailable")
+
+    monkeypatch.setattr(scheduled_tasks, "queue_notifications", fail)
+
+    assert scheduled_tasks.send_daily_digest() is False
+    digest, = _digests(db, unread_user)
+    # requeue_unqueued picks up queued rows without a task ID
+    assert digest.status == NotificationStatus.QUEUED
+    assert digest.task_id is None
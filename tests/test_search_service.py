@@ -0,0 +1,57 @@
+import uuid
+
+import pytest
+
+from app.db.models import Notification, NotificationMessage, NotificationStatus, NotificationType, User
+from app.services.content_service import store_message
+from app.services.search_service import search_user_notifications
+
+@pytest.fixture
+def inbox(db):
+    """
+    A user with two notifications sharing a stored message and one with inline content
+    """
+    user = User(id=uuid.uuid4(), email=f"{uuid.uuid4().hex}@example.com")
+    db.add(user)
+    db.commit()
+    message_id = store_message(db, f"Invoice {user.id.hex}", "Your invoice for {{ month }} is ready")
+    rows = {
+        "march": Notification(message_id=message_id, template_vars={"month": "March"}),
+        "april": Notification(message_id=message_id, template_vars={"month": "April"}),
+        "inline": Notification(subject="Password changed", body="Your password was changed"),
+    }
+    for row in rows.values():
+        row.id, row.user_id, row.type, row.status = uuid.uuid4(), user.id, NotificationType.IN_APP, NotificationStatus.DELIVERED
+        db.add(row)
+    db.commit()
+    yield user, message_id, {name: row.id for name, row in rows.items()}
+    db.rollback()
+    db.query(Notification).filter(Notification.user_id == user.id).delete()
+    db.query(NotificationMessage).filter(NotificationMessage.id == message_id).delete()
+    db.query(User).filter(User.id == user.id).delete()
+    db.commit()
+
+def _ids(results):
+    return {notification.id for notification, _ in results}
+
+def test_message_content_is_indexed_once(db, inbox):
+    user, message_id, ids = inbox
+    row_vector = db.query(Notification.search_vector).filter(Notification.id == ids["march"]).scalar()
+    message_vector = db.query(NotificationMessage.search_vector).filter(NotificationMessage.id == message_id).scalar()
+    assert "invoic" not in row_vector
+    assert "invoic" in message_vector
+
+def test_matches_through_the_message_the_variables_and_inline_content(db, inbox):
+    user, _, ids = inbox
+    assert _ids(search_user_notifications(db, user.id, "invoice")[0]) == {ids["march"], ids["april"]}
+    assert _ids(search_user_notifications(db, user.id, "invoice april")[0]) == {ids["april"]}
+    assert _ids(search_user_notifications(db, user.id, "password")[0]) == {ids["inline"]}
+    assert _ids(search_user_notifications(db, user.id, "-invoice")[0]) == {ids["inline"]}
+
+def test_pages_follow_the_rank(db, inbox):
+    user, _, ids = inbox
+    first, cursor = search_user_notifications(db, user.id, "invoice or march", limit=1)
+    second, cursor = search_user_notifications(db, user.id, "invoice or march", limit=1, cursor=cursor)
+    assert _ids(first) == {ids["march"]}
+    assert _ids(second) == {ids["april"]}
+    assert cursor is None
@@ -0,0 +1,33 @@
+import uuid
+
+import pytest
+
+from app.core.config import settings
+from app.db import replicas
+from app.services.version_service import USER_VERSION_KEY, bump_user_versions
+
+@pytest.fixture
+def replica(monkeypatch):
+    # Any router enables read-your-writes; no replica is connected to
+    monkeypatch.setattr(replicas, "replica_router", object())
+    monkeypatch.setattr(settings, "READ_YOUR_WRITES_WINDOW", 5)
+
+def test_writes_pin_reads_to_the_primary_without_etags(redis_client, replica, monkeypatch):
+    monkeypatch.setattr(settings, "ETAGS_ENABLED", False)
+    user_id = uuid.uuid4()
+
+    bump_user_versions([user_id])
+
+    assert replicas.has_recent_write(str(user_id).upper())
+    assert redis_client.get(USER_VERSION_KEY.format(user_id)) is None
+
+def test_writes_bump_the_version_with_etags(redis_client, replica, monkeypatch):
+    monkeypatch.setattr(settings, "ETAGS_ENABLED", True)
+    user_id = uuid.uuid4()
+
+    bump_user_versions([user_id])
+    first = int(redis_client.get(USER_VERSION_KEY.format(user_id)))
+    bump_user_versions([user_id])
+
+    assert replicas.has_recent_write(user_id)
+    assert int(redis_client.get(USER_VERSION_KEY.format(user_id))) == first + 1